@@ -3,5 +3,6 @@
 API路由包
 """
 from backend.api.clothes import router as clothes_router
+from backend.api.outfits import router as outfits_router
 
-__all__ = ["clothes_router"]
\ No newline at end of file
+__all__ = ["clothes_router", "outfits_router"]
\ No newline at end of file
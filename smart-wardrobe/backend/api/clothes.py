@@ -2,15 +2,32 @@
 """
 衣服管理API路由
 """
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Form
-from fastapi.responses import FileResponse
+import asyncio
+import mimetypes
+import os
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Form, Request
+from fastapi.responses import FileResponse, Response, JSONResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-
-from backend.models import get_db, ClothingItem
-from backend.services import ClothingService, save_uploaded_image, classifier_service, OutfitService
-from backend.config import TRANSPARENT_DIR, IMAGES_DIR
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import get_async_read_db, ClothingItem
+from backend.models.search_index import highlight_snippet
+from backend.services import save_uploaded_image, classifier_service, classification_cache, OutfitService
+from backend.services import AsyncClothingService, AsyncOutfitService
+from backend.services import upload_job_manager, background_removal, wardrobe_version
+from backend.services import recommendation_cache
+from backend.services.classifier_service import pick_classification_fields
+from backend.services.clothing_service import encode_cursor, resolve_fields
+from backend.services.image_derivatives import derivative_cache, snap_width, negotiate_format, file_etag
+from backend.config import TRANSPARENT_DIR, IMAGES_DIR, UPLOAD_BATCH_MAX_FILES, IMAGE_CACHE_MAX_AGE, BULK_MAX_IDS
+
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:  # orjson 是可选依赖，未安装时使用标准库json
+    FastJSONResponse = JSONResponse
 
 router = APIRouter(prefix="/clothes", tags=["衣服管理"])
 
@@ -72,10 +89,72 @@ class ClothingUpdate(BaseModel):
     is_archived: Optional[bool] = None
 
 
+class BulkFilter(BaseModel):
+    """批量操作的筛选条件（与列表接口的筛选参数相同）"""
+    category: Optional[str] = None
+    color: Optional[str] = None
+    style: Optional[str] = None
+    season: Optional[str] = None
+    is_favorite: Optional[bool] = None
+    is_archived: Optional[bool] = None
+    search: Optional[str] = None
+
+
+class BulkSelection(BaseModel):
+    """批量操作的目标：ID列表或筛选条件，二选一"""
+    ids: Optional[List[int]] = None
+    filter: Optional[BulkFilter] = None
+
+
+class BulkUpdate(BulkSelection):
+    """批量更新请求"""
+    data: ClothingUpdate
+
+
+def _bulk_target(selection: BulkSelection) -> Tuple[Optional[List[int]], Optional[Dict[str, Any]]]:
+    """校验批量操作的目标，返回 (ids, filters)"""
+    if (selection.ids is None) == (selection.filter is None):
+        raise HTTPException(status_code=400, detail="请指定 ids 或 filter 其中之一")
+    if selection.ids is not None:
+        if len(selection.ids) > BULK_MAX_IDS:
+            raise HTTPException(status_code=400, detail=f"单次最多操作 {BULK_MAX_IDS} 件衣服")
+        return selection.ids, None
+    filters = selection.filter.dict(exclude_none=True)
+    if not filters:
+        # 避免空条件误操作整个衣柜
+        raise HTTPException(status_code=400, detail="筛选条件不能为空")
+    return None, filters
+
+
+def _conditional(request: Request, response: Response, scope: str) -> Optional[Response]:
+    """
+    条件请求：由衣柜版本、接口和查询参数生成ETag/Last-Modified。
+    客户端缓存仍然有效时返回304响应（不查询数据库），否则把校验头写入response并返回None
+    """
+    params = "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
+    headers = wardrobe_version.validators(scope, params)
+    if wardrobe_version.is_fresh(headers, request.headers.get("if-none-match"),
+                                 request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def _json_response(response: Response, content: Dict[str, Any]) -> Response:
+    """
+    直接序列化已是JSON基本类型的内容（跳过FastAPI逐项检查的 jsonable_encoder），
+    带上 _conditional 写入 response 的校验头
+    """
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return FastJSONResponse(content, headers=headers)
+
+
 # ==================== API端点 ====================
 
-@router.get("/", summary="获取衣服列表")
+@router.get("/", summary="获取衣服列表", response_class=FastJSONResponse)
 async def get_clothes(
+    request: Request,
+    response: Response,
     category: Optional[str] = Query(None, description="服装类别"),
     color: Optional[str] = Query(None, description="颜色"),
     style: Optional[str] = Query(None, description="风格"),
@@ -83,35 +162,66 @@ async def get_clothes(
     is_favorite: Optional[bool] = Query(None, description="是否收藏"),
     is_archived: Optional[bool] = Query(None, description="是否归档"),
     search: Optional[str] = Query(None, description="搜索关键词"),
-    skip: int = Query(0, ge=0, description="跳过数量"),
+    skip: int = Query(0, ge=0, description="跳过数量（兼容旧分页，建议使用cursor）"),
     limit: int = Query(50, ge=1, le=100, description="返回数量"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="翻页游标（上一页返回的next_cursor）"),
+    fields: Optional[str] = Query(None, description="返回字段：逗号分隔的字段名或预设（card/full），默认全部"),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """获取衣服列表，支持多条件筛选"""
-    service = ClothingService(db)
-    items = service.get_all(
-        category=category,
-        color=color,
-        style=style,
-        season=season,
-        is_favorite=is_favorite,
-        is_archived=is_archived,
-        search=search,
-        skip=skip,
-        limit=limit
-    )
-    return {
+    """
+    获取衣服列表，支持多条件筛选；不带搜索词时返回下一页游标
+
+    - fields=card 只返回卡片展示需要的字段，数据库只查询这些列
+    """
+    try:
+        selected = resolve_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    not_modified = _conditional(request, response, "list")
+    if not_modified:
+        return not_modified
+    service = AsyncClothingService(db)
+    try:
+        items = await service.get_all(
+            category=category,
+            color=color,
+            style=style,
+            season=season,
+            is_favorite=is_favorite,
+            is_archived=is_archived,
+            search=search,
+            skip=skip,
+            limit=limit,
+            cursor=None if search else cursor,
+            fields=selected
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    data = [item.to_dict(selected) for item in items]
+    if search:
+        # 搜索结果附带高亮摘要（命中的关键词用<mark>包裹）
+        for entry, item in zip(data, items):
+            entry["snippet"] = highlight_snippet(item, search)
+    next_cursor = None
+    if not search and len(items) == limit and items[-1].created_at:
+        next_cursor = encode_cursor(items[-1])
+    return _json_response(response, {
         "success": True,
-        "data": [item.to_dict() for item in items],
-        "count": len(items)
-    }
+        "data": data,
+        "count": len(items),
+        "next_cursor": next_cursor
+    })
 
 
 @router.get("/statistics", summary="获取衣柜统计")
-async def get_statistics(db: Session = Depends(get_db)):
+async def get_statistics(request: Request, response: Response, db: AsyncSession = Depends(get_async_read_db)):
     """获取衣柜统计信息"""
-    service = ClothingService(db)
-    stats = service.get_statistics()
+    # "超过30天未穿"随日期变化，ETag按天区分
+    not_modified = _conditional(request, response, f"statistics:{date.today().isoformat()}")
+    if not_modified:
+        return not_modified
+    service = AsyncClothingService(db)
+    stats = await service.get_statistics()
     return {
         "success": True,
         "data": stats
@@ -119,26 +229,44 @@ async def get_statistics(db: Session = Depends(get_db)):
 
 
 @router.get("/filters", summary="获取筛选选项")
-async def get_filter_options(db: Session = Depends(get_db)):
+async def get_filter_options(request: Request, response: Response, db: AsyncSession = Depends(get_async_read_db)):
     """获取所有可用的筛选选项（类别、颜色、风格）"""
-    service = ClothingService(db)
+    not_modified = _conditional(request, response, "filters")
+    if not_modified:
+        return not_modified
+    service = AsyncClothingService(db)
     return {
         "success": True,
-        "data": {
-            "categories": service.get_categories(),
-            "colors": service.get_colors(),
-            "styles": service.get_styles()
-        }
+        "data": await service.get_filter_options()
+    }
+
+
+@router.get("/classification-cache", summary="获取分类缓存统计")
+async def get_classification_cache_stats():
+    """获取AI分类结果缓存的条目数、命中率等统计"""
+    stats = await asyncio.to_thread(classification_cache.get_stats)
+    return {
+        "success": True,
+        "data": stats
+    }
+
+
+@router.get("/recommendation-cache", summary="获取推荐缓存统计")
+async def get_recommendation_cache_stats():
+    """获取搭配推荐结果缓存的条目数、命中率等统计"""
+    return {
+        "success": True,
+        "data": recommendation_cache.get_stats()
     }
 
 
 @router.post("/confirm", summary="确认并保存衣服信息")
-async def confirm_clothing(data: ClothingCreate, db: Session = Depends(get_db)):
+async def confirm_clothing(data: ClothingCreate):
     """
     用户确认后保存衣服记录
     """
-    service = ClothingService(db)
-    item = service.create(data.dict(exclude_unset=True))
+    service = AsyncClothingService()
+    item = await service.create(data.dict(exclude_unset=True))
     return {
         "success": True,
         "data": item.to_dict(),
@@ -146,12 +274,54 @@ async def confirm_clothing(data: ClothingCreate, db: Session = Depends(get_db)):
     }
 
 
+@router.patch("/bulk", summary="批量更新衣服")
+async def bulk_update_clothing(payload: BulkUpdate):
+    """
+    按ID列表或筛选条件批量更新衣服（如批量收藏、归档、改类别），在一个事务中完成
+    - 返回每个ID的处理结果，不存在的ID单独标出
+    """
+    ids, filters = _bulk_target(payload)
+    data = payload.data.dict(exclude_unset=True)
+    if not any(value is not None for value in data.values()):
+        raise HTTPException(status_code=400, detail="没有需要更新的字段")
+    result = await AsyncClothingService().bulk_update(data, ids=ids, filters=filters)
+    return {
+        "success": True,
+        "data": result,
+        "message": f"已更新 {result['affected']} 件衣服"
+    }
+
+
+@router.post("/bulk/wear", summary="批量记录穿着")
+async def bulk_record_wear(payload: BulkSelection):
+    """为一组衣服各记录一次穿着"""
+    ids, filters = _bulk_target(payload)
+    result = await AsyncClothingService().bulk_record_wear(ids=ids, filters=filters)
+    return {
+        "success": True,
+        "data": result,
+        "message": f"已记录 {result['affected']} 件衣服的穿着"
+    }
+
+
+@router.post("/bulk/delete", summary="批量删除衣服")
+async def bulk_delete_clothing(payload: BulkSelection):
+    """批量删除衣服记录及关联图片"""
+    ids, filters = _bulk_target(payload)
+    result = await AsyncClothingService().bulk_delete(ids=ids, filters=filters)
+    return {
+        "success": True,
+        "data": result,
+        "message": f"已删除 {result['affected']} 件衣服"
+    }
+
+
 @router.get("/outfit/occasion", summary="根据场合推荐搭配")
 async def get_outfit_by_occasion(
     occasion: str = Query(..., description="场合"),
     season: Optional[str] = Query(None, description="季节"),
     style: Optional[str] = Query(None, description="风格偏好"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     根据场合推荐完整搭配组合
@@ -160,9 +330,9 @@ async def get_outfit_by_occasion(
     - 考虑颜色协调和风格一致
     - 返回多个搭配方案供选择
     """
-    outfit_service = OutfitService(db)
+    outfit_service = AsyncOutfitService(db)
     style_list = [style] if style else None
-    result = outfit_service.recommend_for_occasion(
+    result = await outfit_service.recommend_for_occasion(
         occasion=occasion,
         season=season,
         style_preference=style_list
@@ -200,13 +370,13 @@ async def get_outfit_recommendation(
     occasion: Optional[str] = Query(None, description="场合"),
     season: Optional[str] = Query(None, description="季节"),
     limit: int = Query(5, ge=1, le=10, description="每类推荐数量"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     基于某件衣服推荐完整搭配组合
     """
-    outfit_service = OutfitService(db)
-    result = outfit_service.recommend_outfit(
+    outfit_service = AsyncOutfitService(db)
+    result = await outfit_service.recommend_outfit(
         base_item_id=item_id,
         occasion=occasion,
         season=season,
@@ -220,10 +390,10 @@ async def get_outfit_recommendation(
 
 
 @router.get("/{item_id}", summary="获取单件衣服详情")
-async def get_clothing_item(item_id: int, db: Session = Depends(get_db)):
+async def get_clothing_item(item_id: int, db: AsyncSession = Depends(get_async_read_db)):
     """根据ID获取衣服详情"""
-    service = ClothingService(db)
-    item = service.get_by_id(item_id)
+    service = AsyncClothingService(db)
+    item = await service.get_by_id(item_id)
     if not item:
         raise HTTPException(status_code=404, detail="衣服不存在")
     return {
@@ -233,10 +403,10 @@ async def get_clothing_item(item_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/", summary="创建衣服记录")
-async def create_clothing(data: ClothingCreate, db: Session = Depends(get_db)):
+async def create_clothing(data: ClothingCreate):
     """创建新的衣服记录"""
-    service = ClothingService(db)
-    item = service.create(data.dict(exclude_unset=True))
+    service = AsyncClothingService()
+    item = await service.create(data.dict(exclude_unset=True))
     return {
         "success": True,
         "data": item.to_dict(),
@@ -247,8 +417,7 @@ async def create_clothing(data: ClothingCreate, db: Session = Depends(get_db)):
 @router.post("/upload", summary="上传并分类衣服图片")
 async def upload_clothing(
     file: UploadFile = File(..., description="衣服图片"),
-    auto_classify: bool = Form(True, description="是否自动AI分类"),
-    db: Session = Depends(get_db)
+    auto_classify: bool = Form(True, description="是否自动AI分类")
 ):
     """
     上传衣服图片并自动分类
@@ -265,10 +434,13 @@ async def upload_clothing(
     
     # 保存原始图片
     try:
-        original_path = save_uploaded_image(content, file.filename)
+        original_path = await asyncio.to_thread(save_uploaded_image, content, file.filename)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
+    # 后台生成透明背景图
+    background_removal.submit(original_path)
+    
     # 准备数据
     data = {
         "filename": file.filename,
@@ -278,16 +450,9 @@ async def upload_clothing(
     
     # AI自动分类
     if auto_classify:
-        classification = classifier_service.classify_image(original_path)
+        classification = await classifier_service.classify_image_async(original_path)
         # 映射分类结果到数据字段
-        for key in ["category", "type", "color", "color_tone", "style", "material", 
-                    "thickness", "features", "season", "suitable_weather", 
-                    "suitable_occasions", "suitable_age_group", "body_type_tips",
-                    "matching_tops", "matching_bottoms", "matching_shoes",
-                    "matching_accessories", "matching_colors", "outfit_tags",
-                    "description", "confidence"]:
-            if key in classification:
-                data[key] = classification[key]
+        data.update(pick_classification_fields(classification))
     
     return {
         "success": True,
@@ -296,6 +461,55 @@ async def upload_clothing(
     }
 
 
+@router.post("/upload-batch", summary="批量上传衣服图片")
+async def upload_clothing_batch(
+    files: List[UploadFile] = File(..., description="衣服图片（可多张）"),
+    auto_classify: bool = Form(True, description="是否自动AI分类"),
+):
+    """
+    批量上传衣服图片
+    - 图片保存后立即返回任务ID，AI分类在后台并发进行
+    - 通过 GET /clothes/upload-batch/{job_id} 轮询进度和每张图片的分类结果
+    - 单张图片保存失败不影响其他图片
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="请选择要上传的图片")
+    if len(files) > UPLOAD_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"单次最多上传 {UPLOAD_BATCH_MAX_FILES} 张图片")
+    
+    entries = []
+    for file in files:
+        filename = file.filename or ""
+        content = await file.read()
+        try:
+            if not filename:
+                raise ValueError("文件名不能为空")
+            original_path = await asyncio.to_thread(save_uploaded_image, content, filename)
+            entries.append({"filename": filename, "original_path": original_path})
+            background_removal.submit(original_path)
+        except ValueError as e:
+            entries.append({"filename": filename, "error": str(e)})
+    
+    job = upload_job_manager.submit(entries, auto_classify=auto_classify)
+    return {
+        "success": True,
+        "data": job.to_dict(),
+        "message": "上传成功，正在后台分类"
+    }
+
+
+@router.get("/upload-batch/{job_id}", summary="查询批量上传进度")
+async def get_upload_batch(job_id: str):
+    """查询批量上传任务的进度和每张图片的分类结果"""
+    job = upload_job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return {
+        "success": True,
+        "data": job.to_dict()
+    }
+
+
 @router.post("/preview-classify", summary="预览AI分类结果")
 async def preview_classify(
     file: UploadFile = File(..., description="衣服图片")
@@ -312,12 +526,12 @@ async def preview_classify(
     
     # 保存原始图片（临时）
     try:
-        original_path = save_uploaded_image(content, file.filename)
+        original_path = await asyncio.to_thread(save_uploaded_image, content, file.filename)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
     # AI分类
-    classification = classifier_service.classify_image(original_path)
+    classification = await classifier_service.classify_image_async(original_path)
     
     # 合并结果
     result = {
@@ -326,14 +540,7 @@ async def preview_classify(
         "temp_id": original_path
     }
     
-    for key in ["category", "type", "color", "color_tone", "style", "material", 
-                "thickness", "features", "season", "suitable_weather", 
-                "suitable_occasions", "suitable_age_group", "body_type_tips",
-                "matching_tops", "matching_bottoms", "matching_shoes",
-                "matching_accessories", "matching_colors", "outfit_tags",
-                "description", "confidence"]:
-        if key in classification:
-            result[key] = classification[key]
+    result.update(pick_classification_fields(classification))
     
     return {
         "success": True,
@@ -343,10 +550,10 @@ async def preview_classify(
 
 
 @router.put("/{item_id}", summary="更新衣服信息")
-async def update_clothing(item_id: int, data: ClothingUpdate, db: Session = Depends(get_db)):
+async def update_clothing(item_id: int, data: ClothingUpdate):
     """更新衣服信息"""
-    service = ClothingService(db)
-    item = service.update(item_id, data.dict(exclude_unset=True))
+    service = AsyncClothingService()
+    item = await service.update(item_id, data.dict(exclude_unset=True))
     if not item:
         raise HTTPException(status_code=404, detail="衣服不存在")
     return {
@@ -357,10 +564,10 @@ async def update_clothing(item_id: int, data: ClothingUpdate, db: Session = Depe
 
 
 @router.delete("/{item_id}", summary="删除衣服")
-async def delete_clothing(item_id: int, db: Session = Depends(get_db)):
+async def delete_clothing(item_id: int):
     """删除衣服记录及关联图片"""
-    service = ClothingService(db)
-    success = service.delete(item_id)
+    service = AsyncClothingService()
+    success = await service.delete(item_id)
     if not success:
         raise HTTPException(status_code=404, detail="衣服不存在")
     return {
@@ -370,10 +577,10 @@ async def delete_clothing(item_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/{item_id}/favorite", summary="切换收藏状态")
-async def toggle_favorite(item_id: int, db: Session = Depends(get_db)):
+async def toggle_favorite(item_id: int):
     """切换衣服的收藏状态"""
-    service = ClothingService(db)
-    item = service.toggle_favorite(item_id)
+    service = AsyncClothingService()
+    item = await service.toggle_favorite(item_id)
     if not item:
         raise HTTPException(status_code=404, detail="衣服不存在")
     return {
@@ -384,10 +591,10 @@ async def toggle_favorite(item_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/{item_id}/archive", summary="切换归档状态")
-async def toggle_archive(item_id: int, db: Session = Depends(get_db)):
+async def toggle_archive(item_id: int):
     """切换衣服的归档状态"""
-    service = ClothingService(db)
-    item = service.toggle_archive(item_id)
+    service = AsyncClothingService()
+    item = await service.toggle_archive(item_id)
     if not item:
         raise HTTPException(status_code=404, detail="衣服不存在")
     return {
@@ -398,24 +605,28 @@ async def toggle_archive(item_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/{item_id}/wear", summary="记录穿着")
-async def record_wear(item_id: int, db: Session = Depends(get_db)):
-    """记录一次穿着"""
-    service = ClothingService(db)
-    item = service.record_wear(item_id)
-    if not item:
+async def record_wear(item_id: int):
+    """记录一次穿着（先进入写缓冲，合并后批量写库）"""
+    recorded = await AsyncClothingService.buffer_wear(item_id)
+    if recorded is None:
         raise HTTPException(status_code=404, detail="衣服不存在")
+    wear_count, worn_at = recorded
     return {
         "success": True,
-        "data": {"wear_count": item.wear_count, "last_worn_date": item.last_worn_date.isoformat() if item.last_worn_date else None},
+        "data": {"wear_count": wear_count, "last_worn_date": worn_at.isoformat()},
         "message": "记录成功"
     }
 
 
 @router.post("/{item_id}/reclassify", summary="重新AI分类")
-async def reclassify_clothing(item_id: int, db: Session = Depends(get_db)):
+async def reclassify_clothing(
+    item_id: int,
+    force: bool = Query(False, description="跳过分类缓存，强制重新调用AI"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
     """重新使用AI对衣服进行分类"""
-    service = ClothingService(db)
-    item = service.get_by_id(item_id)
+    service = AsyncClothingService(db)
+    item = await service.get_by_id(item_id)
     if not item:
         raise HTTPException(status_code=404, detail="衣服不存在")
     
@@ -423,20 +634,14 @@ async def reclassify_clothing(item_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="该衣服没有原始图片")
     
     # 重新分类
-    classification = classifier_service.classify_image(item.original_path)
+    classification = await classifier_service.classify_image_async(item.original_path, force=force)
     
     # 更新数据
-    update_data = {}
-    for key in ["category", "type", "color", "color_tone", "style", "material", 
-                "thickness", "features", "season", "suitable_weather", 
-                "suitable_occasions", "suitable_age_group", "body_type_tips",
-                "matching_tops", "matching_bottoms", "matching_shoes",
-                "matching_accessories", "matching_colors", "outfit_tags",
-                "description", "confidence"]:
-        if key in classification:
-            update_data[key] = classification[key]
+    update_data = pick_classification_fields(classification)
     
-    item = service.update(item_id, update_data)
+    item = await service.update(item_id, update_data)
+    if not item:
+        raise HTTPException(status_code=404, detail="衣服不存在")
     
     return {
         "success": True,
@@ -447,24 +652,53 @@ async def reclassify_clothing(item_id: int, db: Session = Depends(get_db)):
 
 @router.get("/{item_id}/image", summary="获取衣服图片")
 async def get_clothing_image(
+    request: Request,
     item_id: int, 
     transparent: bool = Query(False, description="是否获取透明背景图片"),
-    db: Session = Depends(get_db)
+    w: Optional[int] = Query(None, ge=1, description="缩略图宽度（取不小于该值的最近档位）"),
+    v: Optional[str] = Query(None, description="图片版本号，带版本号时允许长期缓存"),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """获取衣服图片"""
-    service = ClothingService(db)
-    item = service.get_by_id(item_id)
+    """
+    获取衣服图片
+    - 指定w时返回缩略图，按Accept头优先返回AVIF/WebP，生成后缓存在磁盘上
+    - 支持ETag条件请求
+    """
+    service = AsyncClothingService(db)
+    item = await service.get_by_id(item_id)
     if not item:
         raise HTTPException(status_code=404, detail="衣服不存在")
     
     image_path = item.transparent_path if transparent else item.original_path
-    if not image_path:
+    if not image_path or not os.path.exists(image_path):
         raise HTTPException(status_code=404, detail="图片不存在")
     
-    return FileResponse(
-        image_path,
-        media_type="image/png" if transparent else "image/jpeg",
-        filename=item.filename
-    )
+    headers = {
+        # 同一件衣服的图片生成后不再变化，带版本号的URL可以长期缓存
+        "Cache-Control": f"public, max-age={IMAGE_CACHE_MAX_AGE}, immutable" if v else "public, max-age=86400"
+    }
+    
+    if w is None:
+        headers["ETag"] = file_etag(image_path)
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+        media_type = mimetypes.guess_type(image_path)[0]
+        return FileResponse(
+            image_path,
+            media_type=media_type or ("image/png" if transparent else "image/jpeg"),
+            filename=item.filename,
+            headers=headers
+        )
+    
+    fmt = negotiate_format(request.headers.get("accept"))
+    try:
+        derivative = await asyncio.to_thread(derivative_cache.get, image_path, snap_width(w), fmt)
+    except OSError:
+        raise HTTPException(status_code=404, detail="图片无法读取")
+    headers["ETag"] = derivative.etag
+    headers["Vary"] = "Accept"
+    if request.headers.get("if-none-match") == derivative.etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(derivative.path, media_type=derivative.media_type, headers=headers)
 
 
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+穿搭记录API路由
+"""
+from datetime import date, datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import get_async_read_db
+from backend.services import AsyncOutfitLogService
+
+router = APIRouter(prefix="/outfits", tags=["穿搭记录"])
+
+
+# ==================== Pydantic模型 ====================
+
+class OutfitRecordCreate(BaseModel):
+    """记录穿搭请求"""
+    clothing_ids: List[int] = Field(..., min_length=1)
+    date: Optional[datetime] = None
+    outfit_name: Optional[str] = None
+    weather: Optional[str] = None
+    temperature: Optional[float] = None
+    occasion: Optional[str] = None
+    mood: Optional[str] = None
+    rating: Optional[int] = Field(None, ge=1, le=5)
+    notes: Optional[str] = None
+
+
+class OutfitRecordUpdate(BaseModel):
+    """修改穿搭记录请求"""
+    outfit_name: Optional[str] = None
+    weather: Optional[str] = None
+    temperature: Optional[float] = None
+    occasion: Optional[str] = None
+    mood: Optional[str] = None
+    rating: Optional[int] = Field(None, ge=1, le=5)
+    notes: Optional[str] = None
+
+
+# ==================== API端点 ====================
+
+@router.post("/", summary="记录穿搭")
+async def create_outfit_record(data: OutfitRecordCreate):
+    """
+    记录一套穿搭
+    - 穿搭中每件衣服的穿着次数加一、更新最后穿着日期，与记录在同一个事务中完成
+    """
+    try:
+        record = await AsyncOutfitLogService().create(data.dict(exclude_unset=True))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "success": True,
+        "data": record.to_dict(),
+        "message": "记录成功"
+    }
+
+
+@router.get("/", summary="获取穿搭记录")
+async def get_outfit_records(
+    start: Optional[date] = Query(None, description="开始日期（含）"),
+    end: Optional[date] = Query(None, description="结束日期（含）"),
+    limit: int = Query(50, ge=1, le=200, description="返回数量"),
+    cursor: Optional[str] = Query(None, description="翻页游标（上一页返回的next_cursor）"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """按日期倒序获取穿搭记录，可按日期区间筛选（日历视图）"""
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="开始日期不能晚于结束日期")
+    try:
+        records, next_cursor = await AsyncOutfitLogService(db).list_records(start, end, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "success": True,
+        "data": [record.to_dict() for record in records],
+        "count": len(records),
+        "next_cursor": next_cursor
+    }
+
+
+@router.get("/items/{item_id}", summary="获取单品穿搭历史")
+async def get_item_outfit_history(
+    item_id: int,
+    limit: int = Query(50, ge=1, le=200, description="返回数量"),
+    cursor: Optional[str] = Query(None, description="翻页游标（上一页返回的next_cursor）"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """按日期倒序获取包含某件衣服的穿搭记录"""
+    try:
+        records, next_cursor = await AsyncOutfitLogService(db).item_history(item_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "success": True,
+        "data": [record.to_dict() for record in records],
+        "count": len(records),
+        "next_cursor": next_cursor
+    }
+
+
+@router.get("/{record_id}", summary="获取穿搭记录详情")
+async def get_outfit_record(record_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    """根据ID获取穿搭记录"""
+    record = await AsyncOutfitLogService(db).get_by_id(record_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="穿搭记录不存在")
+    return {
+        "success": True,
+        "data": record.to_dict()
+    }
+
+
+@router.put("/{record_id}", summary="修改穿搭记录")
+async def update_outfit_record(record_id: int, data: OutfitRecordUpdate):
+    """修改穿搭记录的名称、天气、心情、评分等信息"""
+    record = await AsyncOutfitLogService().update(record_id, data.dict(exclude_unset=True))
+    if not record:
+        raise HTTPException(status_code=404, detail="穿搭记录不存在")
+    return {
+        "success": True,
+        "data": record.to_dict(),
+        "message": "更新成功"
+    }
+
+
+@router.delete("/{record_id}", summary="删除穿搭记录")
+async def delete_outfit_record(record_id: int):
+    """删除穿搭记录（已累加的穿着次数不回退）"""
+    success = await AsyncOutfitLogService().delete(record_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="穿搭记录不存在")
+    return {
+        "success": True,
+        "message": "删除成功"
+    }
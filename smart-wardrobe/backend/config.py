@@ -12,25 +12,82 @@ IMAGES_DIR = DATA_DIR / "images"
 PHOTO_DIR = BASE_DIR / "photo"
 OUTPUT_DIR = BASE_DIR / "output"
 TRANSPARENT_DIR = OUTPUT_DIR / "transparent"
+DERIVATIVES_DIR = DATA_DIR / "derivatives"  # 缩略图等派生图片缓存
 
 # 确保目录存在
 DATA_DIR.mkdir(exist_ok=True)
 IMAGES_DIR.mkdir(exist_ok=True)
 OUTPUT_DIR.mkdir(exist_ok=True)
 TRANSPARENT_DIR.mkdir(exist_ok=True)
+DERIVATIVES_DIR.mkdir(exist_ok=True)
 
 # 数据库配置
 DATABASE_URL = f"sqlite:///{DATA_DIR / 'wardrobe.db'}"
 
+# SQLite存储参数：WAL模式下读写互不阻塞，写入由单个连接串行执行，读取使用只读连接池
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # WAL下NORMAL只在断电时可能丢失最近提交的事务
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))  # 每个连接的页缓存大小（KB）
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 内存映射读取上限（字节），0表示关闭
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # 遇到其他进程持有写锁时的等待时间（毫秒）
+SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")  # 排序、临时表放在内存中
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))  # 只读连接池大小
+
 # 阿里云通义千问API配置
 DASHSCOPE_API_KEY = os.getenv("DASHSCOPE_API_KEY", "sk-475537d9b1634c5487b87e81b9d44230")
 DASHSCOPE_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+CLASSIFIER_MODEL = os.getenv("CLASSIFIER_MODEL", "qwen-vl-max")
+CLASSIFIER_TIMEOUT = float(os.getenv("CLASSIFIER_TIMEOUT", "60"))  # 单次识别请求超时（秒）
+CLASSIFIER_CONNECT_TIMEOUT = float(os.getenv("CLASSIFIER_CONNECT_TIMEOUT", "10"))  # 建立连接超时（秒）
+CLASSIFIER_MAX_CONCURRENCY = int(os.getenv("CLASSIFIER_MAX_CONCURRENCY", "4"))  # 同时进行的识别请求上限
+CLASSIFIER_MAX_KEEPALIVE = int(os.getenv("CLASSIFIER_MAX_KEEPALIVE", "4"))  # 连接池保留的长连接数
+
+# 批量上传配置
+UPLOAD_BATCH_WORKERS = int(os.getenv("UPLOAD_BATCH_WORKERS", str(CLASSIFIER_MAX_CONCURRENCY)))  # 后台分类协程数
+UPLOAD_BATCH_MAX_FILES = int(os.getenv("UPLOAD_BATCH_MAX_FILES", "300"))  # 单次批量上传的最大文件数
+UPLOAD_JOB_RETENTION = int(os.getenv("UPLOAD_JOB_RETENTION", "50"))  # 内存中保留的已完成任务数
+
+# 背景透明化配置（需要安装 rembg）
+BACKGROUND_REMOVAL_ENABLED = os.getenv("BACKGROUND_REMOVAL_ENABLED", "1") == "1"
+BACKGROUND_REMOVAL_MODEL = os.getenv("BACKGROUND_REMOVAL_MODEL", "u2net")
+BACKGROUND_REMOVAL_WORKERS = int(os.getenv("BACKGROUND_REMOVAL_WORKERS", "1"))  # 工作线程数，每个线程持有一个模型会话
+BACKGROUND_REMOVAL_QUEUE_SIZE = int(os.getenv("BACKGROUND_REMOVAL_QUEUE_SIZE", "200"))  # 排队上限，满了丢弃新任务
+BACKGROUND_REMOVAL_BATCH_SIZE = int(os.getenv("BACKGROUND_REMOVAL_BATCH_SIZE", "8"))  # 攒够多少条结果批量写库
+TRANSPARENT_WEBP_QUALITY = int(os.getenv("TRANSPARENT_WEBP_QUALITY", "90"))
+
+# 分类结果缓存配置
+CLASSIFICATION_CACHE_ENABLED = os.getenv("CLASSIFICATION_CACHE_ENABLED", "1") == "1"
+CLASSIFICATION_CACHE_MAX_ENTRIES = int(os.getenv("CLASSIFICATION_CACHE_MAX_ENTRIES", "5000"))  # 超出后按最近使用时间淘汰
+CLASSIFICATION_CACHE_TTL_DAYS = int(os.getenv("CLASSIFICATION_CACHE_TTL_DAYS", "90"))  # 缓存有效天数，0表示不过期
 
 # 服务配置
 API_HOST = "0.0.0.0"
 API_PORT = 8000
 DEBUG = True
 
+# 搭配搜索配置
+OUTFIT_SEARCH_BUDGET = int(os.getenv("OUTFIT_SEARCH_BUDGET", "2000000"))  # 分支限界搜索最多评估的选项数
+COMPAT_GRAPH_TOP_N = int(os.getenv("COMPAT_GRAPH_TOP_N", "20"))  # 搭配关系图中每件衣服每个类别保留的搭配数
+COMPAT_GRAPH_INCREMENTAL_MAX = int(os.getenv("COMPAT_GRAPH_INCREMENTAL_MAX", "50"))  # 一次写入超过该件数时整体重建关系图
+OUTFIT_COMPUTE_WORKERS = int(os.getenv("OUTFIT_COMPUTE_WORKERS", "1"))  # 执行搭配打分和搜索的线程数，纯Python计算受GIL限制，多开线程不会更快
+
+# 推荐结果缓存配置（衣柜数据变化后自动失效）
+RECOMMENDATION_CACHE_ENABLED = os.getenv("RECOMMENDATION_CACHE_ENABLED", "1") == "1"
+RECOMMENDATION_CACHE_MAX_ENTRIES = int(os.getenv("RECOMMENDATION_CACHE_MAX_ENTRIES", "512"))  # 超出后按最近使用时间淘汰
+RECOMMENDATION_CACHE_TTL_SECONDS = float(os.getenv("RECOMMENDATION_CACHE_TTL_SECONDS", "0"))  # 单条结果有效期（秒），0表示不过期
+
+# 批量操作配置
+BULK_MAX_IDS = int(os.getenv("BULK_MAX_IDS", "1000"))  # 按ID批量操作时单次最多的ID数
+
+# 穿着记录写缓冲配置
+WEAR_BUFFER_FLUSH_INTERVAL = float(os.getenv("WEAR_BUFFER_FLUSH_INTERVAL", "2"))  # 缓冲的穿着记录最多多久写库（秒）
+WEAR_BUFFER_MAX_EVENTS = int(os.getenv("WEAR_BUFFER_MAX_EVENTS", "200"))  # 攒够多少次穿着立即写库
+
 # 图片配置
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
\ No newline at end of file
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1600"))  # 规范化后图片最长边（像素）
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))  # 重新压缩的JPEG质量
+IMAGE_RECOMPRESS_THRESHOLD = int(os.getenv("IMAGE_RECOMPRESS_THRESHOLD", str(512 * 1024)))  # 尺寸合规但超过该大小仍重新压缩
+IMAGE_WIDTH_PRESETS = (128, 256, 512, 1024)  # 缩略图宽度档位，?w= 取不小于请求值的最近档位
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", str(365 * 24 * 3600)))  # 带版本号的图片URL缓存时间（秒）
\ No newline at end of file
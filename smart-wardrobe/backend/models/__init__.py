@@ -3,9 +3,17 @@
 数据库模型包
 """
 from backend.models.database import Base, engine, SessionLocal, get_db, init_db
-from backend.models.database import ClothingItem, OutfitRecord, UserPreference
+from backend.models.database import read_engine, ReadSessionLocal, get_read_db
+from backend.models.database import async_read_engine, AsyncReadSessionLocal, get_async_read_db, dispose_async_engines
+from backend.models.database import ClothingItem, ClothingTag, OutfitRecord, OutfitRecordItem, UserPreference, TAG_FIELDS
+from backend.models.database import ITEM_DICT_FIELDS
+from backend.models.database import ClassificationCacheEntry, WardrobeCounter, CompatEdge
 
 __all__ = [
     "Base", "engine", "SessionLocal", "get_db", "init_db",
-    "ClothingItem", "OutfitRecord", "UserPreference"
+    "read_engine", "ReadSessionLocal", "get_read_db",
+    "async_read_engine", "AsyncReadSessionLocal", "get_async_read_db", "dispose_async_engines",
+    "ClothingItem", "ClothingTag", "OutfitRecord", "OutfitRecordItem", "UserPreference", "TAG_FIELDS",
+    "ITEM_DICT_FIELDS",
+    "ClassificationCacheEntry", "WardrobeCounter", "CompatEdge"
 ]
\ No newline at end of file
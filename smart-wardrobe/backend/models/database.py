@@ -4,20 +4,107 @@
 使用SQLAlchemy ORM
 """
 from datetime import datetime
+from typing import Iterable, Optional
 from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, Boolean, JSON
+from sqlalchemy import ForeignKey, Index, select, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-from backend.config import DATABASE_URL
+from backend.config import (
+    DATABASE_URL, DEBUG, SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE, SQLITE_BUSY_TIMEOUT_MS, SQLITE_TEMP_STORE, DB_READ_POOL_SIZE
+)
+from backend.models.migrations import apply_migrations, check_query_plans
 
-# 创建数据库引擎
-engine = create_engine(DATABASE_URL, echo=False, connect_args={"check_same_thread": False})
+
+def _apply_pragmas(engine, readonly: bool):
+    """每个新连接上设置SQLite存储参数，只读连接额外开启 query_only"""
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        if not readonly:
+            # 日志模式写在数据库文件里，由写连接设置一次即可
+            cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA temp_store = {SQLITE_TEMP_STORE}")
+        if readonly:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+
+def _create_engine(readonly: bool):
+    # SQLite同一时刻只允许一个写事务：写引擎只有一个连接，是进程内唯一的写入者。
+    # API的写操作在写入线程中执行，穿着缓冲、透明图回填、分类缓存等后台任务在各自线程中使用 SessionLocal，
+    # 都在这一个连接处排队，不会在数据库层互相等锁；读引擎按连接池大小并发，WAL模式下不受写入阻塞
+    pool_size = DB_READ_POOL_SIZE if readonly else 1
+    new_engine = create_engine(
+        DATABASE_URL, echo=False, connect_args={"check_same_thread": False},
+        pool_size=pool_size, max_overflow=pool_size if readonly else 0
+    )
+    _apply_pragmas(new_engine, readonly)
+    return new_engine
+
+
+def _create_async_read_engine():
+    # 异步只读引擎走 aiosqlite，数据库IO在驱动线程中执行，不阻塞事件循环；
+    # 连接池规则与同步读引擎相同（aiosqlite 默认不复用连接，这里显式使用连接池）。
+    # 没有异步写引擎：第二个写连接会与写引擎争抢数据库写锁
+    new_engine = create_async_engine(
+        ASYNC_DATABASE_URL, echo=False, poolclass=AsyncAdaptedQueuePool,
+        pool_size=DB_READ_POOL_SIZE, max_overflow=DB_READ_POOL_SIZE
+    )
+    _apply_pragmas(new_engine.sync_engine, readonly=True)
+    return new_engine
+
+
+# 创建数据库引擎（写入 / 只读），API的读操作使用异步只读引擎
+ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+engine = _create_engine(readonly=False)
+read_engine = _create_engine(readonly=True)
+async_read_engine = _create_async_read_engine()
 
 # 创建基类
 Base = declarative_base()
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
+# 需要建立标签索引的JSON列表字段
+TAG_FIELDS = ("style", "season", "suitable_occasions", "suitable_weather", "outfit_tags")
+
+
+def as_tag_list(value) -> list:
+    """把JSON列表字段规整为去重后的字符串列表（AI偶尔会返回单个字符串）"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    return [str(v) for v in dict.fromkeys(value) if v]
+
+
+# ClothingItem.to_dict 输出的字段（按输出顺序）；列表字段空值输出[]，时间字段输出ISO字符串
+ITEM_DICT_FIELDS = (
+    "id", "filename", "original_path", "transparent_path",
+    "category", "type", "color", "color_tone", "style", "material", "thickness",
+    "features", "season", "suitable_weather", "suitable_occasions", "suitable_age_group",
+    "body_type_tips", "matching_tops", "matching_bottoms", "matching_shoes", "matching_accessories",
+    "matching_colors", "outfit_tags", "description", "confidence",
+    "is_favorite", "is_archived", "purchase_date", "price", "brand", "user_notes",
+    "wear_count", "last_worn_date", "created_at", "updated_at",
+)
+_ITEM_LIST_FIELDS = frozenset({
+    "style", "features", "season", "suitable_weather", "suitable_occasions", "matching_tops",
+    "matching_bottoms", "matching_shoes", "matching_accessories", "matching_colors", "outfit_tags",
+})
+_ITEM_TIME_FIELDS = frozenset({"purchase_date", "last_worn_date", "created_at", "updated_at"})
 
 
 class ClothingItem(Base):
@@ -76,45 +163,55 @@ class ClothingItem(Base):
     created_at = Column(DateTime, default=datetime.now, comment="创建时间")
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment="更新时间")
     
-    def to_dict(self):
-        """转换为字典"""
-        return {
-            "id": self.id,
-            "filename": self.filename,
-            "original_path": self.original_path,
-            "transparent_path": self.transparent_path,
-            "category": self.category,
-            "type": self.type,
-            "color": self.color,
-            "color_tone": self.color_tone,
-            "style": self.style or [],
-            "material": self.material,
-            "thickness": self.thickness,
-            "features": self.features or [],
-            "season": self.season or [],
-            "suitable_weather": self.suitable_weather or [],
-            "suitable_occasions": self.suitable_occasions or [],
-            "suitable_age_group": self.suitable_age_group,
-            "body_type_tips": self.body_type_tips,
-            "matching_tops": self.matching_tops or [],
-            "matching_bottoms": self.matching_bottoms or [],
-            "matching_shoes": self.matching_shoes or [],
-            "matching_accessories": self.matching_accessories or [],
-            "matching_colors": self.matching_colors or [],
-            "outfit_tags": self.outfit_tags or [],
-            "description": self.description,
-            "confidence": self.confidence,
-            "is_favorite": self.is_favorite,
-            "is_archived": self.is_archived,
-            "purchase_date": self.purchase_date.isoformat() if self.purchase_date else None,
-            "price": self.price,
-            "brand": self.brand,
-            "user_notes": self.user_notes,
-            "wear_count": self.wear_count,
-            "last_worn_date": self.last_worn_date.isoformat() if self.last_worn_date else None,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
+    # 查询索引（含部分索引）由 migrations.py 创建，已存在的数据库启动时自动补建
+    
+    # 标签索引 (JSON列表字段的镜像，用于索引查询)
+    tags = relationship("ClothingTag", cascade="all, delete-orphan", lazy="select")
+    
+    def sync_tags(self):
+        """根据JSON列表字段同步标签索引，只增删有变化的标签"""
+        desired = {(field, value) for field in TAG_FIELDS for value in as_tag_list(getattr(self, field))}
+        current = {(tag.field, tag.value): tag for tag in self.tags}
+        for key, tag in current.items():
+            if key not in desired:
+                self.tags.remove(tag)
+        for field, value in sorted(desired - current.keys()):
+            self.tags.append(ClothingTag(field=field, value=value))
+    
+    @classmethod
+    def has_tag(cls, field: str, value: str):
+        """标签筛选条件：走 clothing_tags 的 (field, value) 索引"""
+        return cls.id.in_(
+            select(ClothingTag.item_id).where(ClothingTag.field == field, ClothingTag.value == value)
+        )
+    
+    def to_dict(self, fields: Optional[Iterable[str]] = None):
+        """
+        转换为字典
+        fields 指定只输出部分字段（取自 ITEM_DICT_FIELDS），只读取这些属性，
+        列表接口按需加载的列之外的延迟列不会被访问
+        """
+        data = {}
+        for name in fields or ITEM_DICT_FIELDS:
+            value = getattr(self, name)
+            if name in _ITEM_LIST_FIELDS:
+                value = value or []
+            elif value is not None and name in _ITEM_TIME_FIELDS:
+                value = value.isoformat()
+            data[name] = value
+        return data
+
+
+class ClothingTag(Base):
+    """服装标签索引模型 (style/season/场合等JSON列表字段的规范化镜像)"""
+    __tablename__ = "clothing_tags"
+    __table_args__ = (
+        Index("ix_clothing_tags_lookup", "field", "value", "item_id"),
+    )
+    
+    item_id = Column(Integer, ForeignKey("clothing_items.id", ondelete="CASCADE"), primary_key=True, comment="服装ID")
+    field = Column(String(30), primary_key=True, comment="来源字段(style/season/suitable_occasions等)")
+    value = Column(String(100), primary_key=True, comment="标签值")
 
 
 class OutfitRecord(Base):
@@ -134,6 +231,21 @@ class OutfitRecord(Base):
     photo_path = Column(String(500), comment="穿搭照片路径")
     created_at = Column(DateTime, default=datetime.now, comment="创建时间")
     
+    # 记录与衣服的关联 (clothing_ids 的规范化镜像，用于按衣服查询历史)
+    items = relationship("OutfitRecordItem", cascade="all, delete-orphan", lazy="select")
+    
+    def sync_items(self):
+        """根据 clothing_ids 同步关联表，只增删有变化的行，日期随记录更新"""
+        desired = set(int(item_id) for item_id in (self.clothing_ids or []))
+        current = {link.item_id: link for link in self.items}
+        for item_id, link in current.items():
+            if item_id not in desired:
+                self.items.remove(link)
+            else:
+                link.date = self.date
+        for item_id in sorted(desired - current.keys()):
+            self.items.append(OutfitRecordItem(item_id=item_id, date=self.date))
+    
     def to_dict(self):
         """转换为字典"""
         return {
@@ -152,6 +264,27 @@ class OutfitRecord(Base):
         }
 
 
+class OutfitRecordItem(Base):
+    """穿搭记录-衣服关联模型 (冗余记录日期，按衣服查询历史时只需扫描索引)"""
+    __tablename__ = "outfit_record_items"
+    
+    record_id = Column(Integer, ForeignKey("outfit_records.id", ondelete="CASCADE"), primary_key=True, comment="穿搭记录ID")
+    # 衣服删除后保留历史记录，不设外键
+    item_id = Column(Integer, primary_key=True, comment="服装ID")
+    date = Column(DateTime, nullable=False, comment="穿搭日期(同记录)")
+
+
+class CompatEdge(Base):
+    """搭配关系图：每件衣服在每个搭配类别中匹配分数最高的前N件（由 compat_graph 维护）"""
+    __tablename__ = "compat_edges"
+    
+    item_id = Column(Integer, primary_key=True, comment="基础衣服ID")
+    category = Column(String(50), primary_key=True, comment="搭配类别")
+    rank = Column(Integer, primary_key=True, comment="名次(从0开始)")
+    partner_id = Column(Integer, nullable=False, comment="搭配衣服ID")
+    score = Column(Float, nullable=False, comment="匹配分数")
+
+
 class UserPreference(Base):
     """用户偏好设置模型"""
     __tablename__ = "user_preferences"
@@ -163,16 +296,65 @@ class UserPreference(Base):
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment="更新时间")
 
 
+class ClassificationCacheEntry(Base):
+    """AI分类结果缓存模型 (按图片内容哈希+模型+提示词版本寻址)"""
+    __tablename__ = "classification_cache"
+    __table_args__ = (
+        Index("ix_classification_cache_last_used", "last_used_at"),
+    )
+    
+    image_hash = Column(String(64), primary_key=True, comment="图片内容SHA-256")
+    model = Column(String(50), primary_key=True, comment="识别模型")
+    prompt_version = Column(String(20), primary_key=True, comment="提示词版本")
+    result = Column(JSON, nullable=False, comment="分类结果")
+    hit_count = Column(Integer, default=0, comment="命中次数")
+    created_at = Column(DateTime, default=datetime.now, comment="写入时间")
+    last_used_at = Column(DateTime, default=datetime.now, comment="最近使用时间")
+
+
+class WardrobeCounter(Base):
+    """衣柜计数器模型 (统计数据随写入增量维护，读取时无需扫描衣服表)"""
+    __tablename__ = "wardrobe_counters"
+    
+    namespace = Column(String(30), primary_key=True, comment="计数器分组(stats/category等)")
+    key = Column(String(100), primary_key=True, comment="计数项")
+    value = Column(Integer, nullable=False, default=0, comment="计数值")
+
+
 def init_db():
-    """初始化数据库"""
+    """初始化数据库：创建缺失的表，再执行尚未执行的结构迁移"""
     Base.metadata.create_all(bind=engine)
+    apply_migrations(engine)
+    if DEBUG:
+        for problem in check_query_plans(engine):
+            print(f"⚠️ 查询未使用预期索引 - {problem}")
     print("数据库初始化完成！")
 
 
 def get_db():
-    """获取数据库会话"""
+    """获取数据库会话（写入）"""
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    """获取只读数据库会话（只读接口使用，不占用写连接）"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db():
+    """获取异步只读数据库会话"""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engines():
+    """关闭异步引擎的连接池（应用关闭时调用，连接绑定在当前事件循环上）"""
+    await async_read_engine.dispose()
\ No newline at end of file
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+数据库结构版本管理
+create_all 只会创建缺失的表，不会给已存在的表补索引或补数据。
+这里按版本号顺序执行迁移，已执行的版本记录在 schema_version 表中，
+启动时只执行尚未执行的迁移；迁移只做增量修改（建索引、回填），不删除数据
+"""
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from backend.models.search_index import ensure_search_index
+
+
+class Migration(NamedTuple):
+    """一次结构迁移"""
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+
+
+def _create_indexes(*statements: str) -> Callable[[Connection], None]:
+    def apply(conn: Connection):
+        for statement in statements:
+            conn.execute(text(statement))
+    return apply
+
+
+def _backfill_tags(conn: Connection):
+    """为旧数据库中尚未建立标签索引的衣服补建标签"""
+    from sqlalchemy import select
+    from sqlalchemy.orm import Session
+    from backend.models.database import ClothingItem, ClothingTag
+
+    with Session(bind=conn) as db:
+        untagged = db.query(ClothingItem).filter(
+            ~ClothingItem.id.in_(select(ClothingTag.item_id))
+        ).all()
+        for item in untagged:
+            item.sync_tags()
+        db.flush()
+    if untagged:
+        print(f"已为 {len(untagged)} 件衣服补建标签索引")
+
+
+def _rebuild_counters(conn: Connection):
+    """计数器布局与代码不一致时从衣服表重建"""
+    from sqlalchemy.orm import Session
+    from backend.services.wardrobe_counters import wardrobe_counters
+
+    with Session(bind=conn) as db:
+        if wardrobe_counters.ensure_current(db):
+            print("已重建衣柜统计计数器")
+
+
+def _backfill_outfit_items(conn: Connection):
+    """为已有的穿搭记录补建衣服关联"""
+    from sqlalchemy import select
+    from sqlalchemy.orm import Session
+    from backend.models.database import OutfitRecord, OutfitRecordItem
+
+    with Session(bind=conn) as db:
+        unlinked = db.query(OutfitRecord).filter(
+            ~OutfitRecord.id.in_(select(OutfitRecordItem.record_id))
+        ).all()
+        for record in unlinked:
+            record.sync_items()
+        db.flush()
+    if unlinked:
+        print(f"已为 {len(unlinked)} 条穿搭记录补建衣服关联")
+
+
+def _build_compat_graph(conn: Connection):
+    """为已有的衣服构建搭配关系图"""
+    from sqlalchemy.orm import Session
+    from backend.services.compat_graph import compat_graph
+
+    with Session(bind=conn) as db:
+        edges = compat_graph.rebuild(db)
+    if edges:
+        print(f"已构建搭配关系图，共 {edges} 条边")
+
+
+# 迁移列表，只能在末尾追加，已发布的迁移不要修改
+MIGRATIONS: List[Migration] = [
+    Migration(1, "clothing_items 查询索引", _create_indexes(
+        # 列表默认查询：未归档 + 按创建时间倒序（键集分页）
+        "CREATE INDEX IF NOT EXISTS ix_clothing_items_active_created "
+        "ON clothing_items (created_at, id) WHERE is_archived = 0",
+        # 按类别/颜色/收藏筛选，同样只索引未归档的衣服
+        "CREATE INDEX IF NOT EXISTS ix_clothing_items_active_category "
+        "ON clothing_items (category, created_at, id) WHERE is_archived = 0",
+        "CREATE INDEX IF NOT EXISTS ix_clothing_items_active_color "
+        "ON clothing_items (color, created_at, id) WHERE is_archived = 0",
+        "CREATE INDEX IF NOT EXISTS ix_clothing_items_active_favorite "
+        "ON clothing_items (is_favorite, created_at, id) WHERE is_archived = 0",
+        # 统计："30天内穿过"的计数、最近穿着
+        "CREATE INDEX IF NOT EXISTS ix_clothing_items_active_worn "
+        "ON clothing_items (last_worn_date) WHERE is_archived = 0",
+        "CREATE INDEX IF NOT EXISTS ix_clothing_items_last_worn "
+        "ON clothing_items (last_worn_date)",
+        # 导入脚本按文件名查重、透明图按原图路径回填
+        "CREATE INDEX IF NOT EXISTS ix_clothing_items_filename ON clothing_items (filename)",
+        "CREATE INDEX IF NOT EXISTS ix_clothing_items_original_path ON clothing_items (original_path)",
+    )),
+    Migration(2, "outfit_records 日期索引", _create_indexes(
+        "CREATE INDEX IF NOT EXISTS ix_outfit_records_date ON outfit_records (date)",
+    )),
+    Migration(3, "全文检索索引", ensure_search_index),
+    Migration(4, "补建标签索引", _backfill_tags),
+    Migration(5, "重建衣柜计数器", _rebuild_counters),
+    Migration(6, "穿搭记录衣服关联", _create_indexes(
+        # 单品穿搭历史：按衣服取最近的记录，只扫描索引
+        "CREATE INDEX IF NOT EXISTS ix_outfit_record_items_item_date "
+        "ON outfit_record_items (item_id, date, record_id)",
+    )),
+    Migration(7, "补建穿搭记录衣服关联", _backfill_outfit_items),
+    Migration(8, "搭配关系图索引", _create_indexes(
+        # 增量维护：查找列表中含有某件衣服的基础衣服
+        "CREATE INDEX IF NOT EXISTS ix_compat_edges_partner ON compat_edges (partner_id)",
+        # 增量维护：某类别各列表的长度和最低分
+        "CREATE INDEX IF NOT EXISTS ix_compat_edges_category ON compat_edges (category, item_id, score)",
+    )),
+    Migration(9, "构建搭配关系图", _build_compat_graph),
+]
+
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at DATETIME NOT NULL)"
+    ))
+
+
+def current_version(conn: Connection) -> int:
+    """当前数据库已执行到的迁移版本"""
+    _ensure_version_table(conn)
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def apply_migrations(engine: Engine) -> List[int]:
+    """执行尚未执行的迁移，每个迁移单独一个事务，返回本次执行的版本号"""
+    applied = []
+    with engine.begin() as conn:
+        version = current_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        with engine.begin() as conn:
+            migration.apply(conn)
+            conn.execute(
+                text("INSERT INTO schema_version (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                {"version": migration.version, "name": migration.name, "applied_at": datetime.now()}
+            )
+        print(f"已执行数据库迁移 {migration.version}: {migration.name}")
+        applied.append(migration.version)
+    return applied
+
+
+# 关键查询及其应使用的索引，用 EXPLAIN QUERY PLAN 校验（SQL与服务层生成的查询保持一致）
+QUERY_PLAN_CHECKS = [
+    ("衣服列表",
+     "SELECT id FROM clothing_items WHERE is_archived = 0 ORDER BY created_at DESC, id DESC LIMIT 50",
+     "ix_clothing_items_active_created"),
+    ("衣服列表(游标翻页)",
+     "SELECT id FROM clothing_items WHERE is_archived = 0 AND (created_at, id) < ('2100-01-01', 0) "
+     "ORDER BY created_at DESC, id DESC LIMIT 50",
+     "ix_clothing_items_active_created"),
+    ("按类别筛选",
+     "SELECT id FROM clothing_items WHERE category = '上衣' AND is_archived = 0 "
+     "ORDER BY created_at DESC, id DESC LIMIT 50",
+     "ix_clothing_items_active_category"),
+    ("按颜色筛选",
+     "SELECT id FROM clothing_items WHERE color = '黑色' AND is_archived = 0 "
+     "ORDER BY created_at DESC, id DESC LIMIT 50",
+     "ix_clothing_items_active_color"),
+    ("收藏筛选",
+     "SELECT id FROM clothing_items WHERE is_favorite = 1 AND is_archived = 0 "
+     "ORDER BY created_at DESC, id DESC LIMIT 50",
+     "ix_clothing_items_active_favorite"),
+    ("30天内穿过",
+     "SELECT count(*) FROM clothing_items WHERE is_archived = 0 AND last_worn_date >= '2000-01-01'",
+     "ix_clothing_items_active_worn"),
+    ("最近穿着",
+     "SELECT id FROM clothing_items WHERE last_worn_date IS NOT NULL ORDER BY last_worn_date DESC LIMIT 5",
+     "ix_clothing_items_last_worn"),
+    ("按文件名查重",
+     "SELECT id FROM clothing_items WHERE filename = 'a.jpg' LIMIT 1",
+     "ix_clothing_items_filename"),
+    ("透明图回填",
+     "UPDATE clothing_items SET transparent_path = 'b' WHERE original_path = 'a' AND transparent_path IS NULL",
+     "ix_clothing_items_original_path"),
+    ("标签筛选",
+     "SELECT item_id FROM clothing_tags WHERE field = 'style' AND value = '休闲'",
+     "ix_clothing_tags_lookup"),
+    ("穿搭记录按日期",
+     "SELECT id FROM outfit_records WHERE date >= '2000-01-01' ORDER BY date DESC",
+     "ix_outfit_records_date"),
+    ("穿搭记录(游标翻页)",
+     "SELECT id FROM outfit_records WHERE date >= '2000-01-01' AND date < '2100-01-01' "
+     "AND (date, id) < ('2100-01-01', 0) ORDER BY date DESC, id DESC LIMIT 50",
+     "ix_outfit_records_date"),
+    ("搭配关系图查询",
+     "SELECT partner_id FROM compat_edges WHERE item_id = 1 AND category = '上衣' ORDER BY rank LIMIT 5",
+     "sqlite_autoindex_compat_edges_1"),
+    ("搭配关系图反查",
+     "SELECT DISTINCT item_id, category FROM compat_edges WHERE partner_id = 1",
+     "ix_compat_edges_partner"),
+    ("搭配关系图阈值",
+     "SELECT item_id, count(*), min(score) FROM compat_edges WHERE category = '上衣' GROUP BY item_id",
+     "ix_compat_edges_category"),
+    ("单品穿搭历史",
+     "SELECT record_id FROM outfit_record_items WHERE item_id = 1 "
+     "AND (date, record_id) < ('2100-01-01', 0) ORDER BY date DESC, record_id DESC LIMIT 50",
+     "ix_outfit_record_items_item_date"),
+]
+
+
+def check_query_plans(engine: Engine) -> List[str]:
+    """校验关键查询的执行计划，返回未使用预期索引的查询说明（全部通过时为空列表）"""
+    problems = []
+    with engine.connect() as conn:
+        for name, sql, index in QUERY_PLAN_CHECKS:
+            plan = " / ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+            if index not in plan:
+                problems.append(f"{name}: 预期使用 {index}，实际执行计划: {plan}")
+    return problems
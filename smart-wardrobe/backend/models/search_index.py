@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+衣服全文检索索引 (SQLite FTS5)
+FTS5 自带的分词器不切分中文，这里在Python中把中文切成二元组（单字词保留单字），
+英文数字按单词切分，切好的词以空格分隔写入FTS表，由 unicode61 分词器按空格拆开。
+检索行由服务层在写入衣服的同一事务中重写（reindex_items），删除衣服由纯SQL触发器同步，
+数据库中没有自定义函数，其他工具或连接写 clothing_items 不会报错；
+但这些写入不会更新检索词，之后需运行 scripts/rebuild_search_index.py
+"""
+import html
+import re
+from typing import Iterable, Optional
+
+from sqlalchemy import bindparam, text
+
+# 参与检索的字段及BM25权重（类型、品牌命中比描述更重要）
+SEARCH_FIELDS = ("type", "description", "brand", "user_notes")
+SEARCH_WEIGHTS = (3.0, 1.0, 2.0, 1.0)
+
+SEARCH_TABLE = "clothing_search"
+
+# 一次重写的检索行数（受SQLite单条语句参数个数限制）
+_REINDEX_CHUNK = 500
+
+# 中日韩统一表意文字 / 其余字母数字
+_TOKEN_RUN = re.compile(r"([㐀-䶿一-鿿豈-﫿]+)|([0-9a-z]+)")
+
+
+def cjk_tokens(value: Optional[str]) -> str:
+    """把文本切成以空格分隔的检索词：中文二元组，英文数字整词"""
+    if not value:
+        return ""
+    tokens = []
+    for cjk, word in _TOKEN_RUN.findall(value.lower()):
+        if word:
+            tokens.append(word)
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return " ".join(tokens)
+
+
+def build_match_query(search: str) -> Optional[str]:
+    """
+    把搜索关键词转为FTS5 MATCH表达式：空格分隔的每个词作为一个短语，短语之间为AND。
+    短语末尾的英文词或单个汉字做前缀匹配（如"T恤"可匹配"T恤衫"）；
+    单字出现在词首或词中间时二元组无法表达，返回None，由调用方回退到LIKE
+    """
+    phrases = []
+    for term in search.split():
+        tokens = cjk_tokens(term).split()
+        if not tokens:
+            continue
+        single_cjk = [len(token) == 1 and not token.isascii() for token in tokens]
+        if len(term) < 2 or (len(tokens) == 1 and single_cjk[0]) or any(single_cjk[:-1]):
+            return None
+        phrase = '"' + " ".join(tokens) + '"'
+        if tokens[-1].isascii() or single_cjk[-1]:
+            phrase += " *"
+        phrases.append(phrase)
+    return " AND ".join(phrases) if phrases else None
+
+
+def bm25_expression() -> str:
+    """按字段权重排序的BM25表达式（值越小越相关）"""
+    return f"bm25({SEARCH_TABLE}, {', '.join(str(w) for w in SEARCH_WEIGHTS)})"
+
+
+def highlight_snippet(item, search: str, width: int = 24) -> Optional[str]:
+    """
+    生成搜索结果摘要：在第一个命中的字段中截取关键词附近的文本，关键词用<mark>包裹。
+    FTS表中存的是切分后的检索词，摘要从原字段生成，其余文本做HTML转义
+    """
+    terms = [term for term in search.split() if term]
+    if not terms:
+        return None
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    for field in SEARCH_FIELDS:
+        value = getattr(item, field, None)
+        match = pattern.search(value) if value else None
+        if not match:
+            continue
+        start = max(0, match.start() - width)
+        end = min(len(value), match.end() + width)
+        pieces = []
+        cursor = start
+        for hit in pattern.finditer(value, start, end):
+            pieces.append(html.escape(value[cursor:hit.start()]))
+            pieces.append(f"<mark>{html.escape(hit.group())}</mark>")
+            cursor = hit.end()
+        pieces.append(html.escape(value[cursor:end]))
+        return ("…" if start > 0 else "") + "".join(pieces) + ("…" if end < len(value) else "")
+    return None
+
+
+def _write_rows(conn, rows) -> int:
+    """把衣服记录切词后写入FTS表，返回写入行数"""
+    params = [
+        {"rowid": row.id, **{field: cjk_tokens(getattr(row, field)) for field in SEARCH_FIELDS}}
+        for row in rows
+    ]
+    if params:
+        fields = ", ".join(SEARCH_FIELDS)
+        values = ", ".join(f":{field}" for field in SEARCH_FIELDS)
+        conn.execute(text(f"INSERT INTO {SEARCH_TABLE}(rowid, {fields}) VALUES (:rowid, {values})"), params)
+    return len(params)
+
+
+def reindex_items(conn, item_ids: Iterable[int]):
+    """
+    按数据库中的当前值重写这些衣服的检索行（在调用方的事务中执行，写入衣服并flush后调用）。
+    已不存在的衣服只删除检索行
+    """
+    ids = list(dict.fromkeys(item_ids))
+    fields = ", ".join(SEARCH_FIELDS)
+    delete = text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True))
+    select = text(f"SELECT id, {fields} FROM clothing_items WHERE id IN :ids").bindparams(
+        bindparam("ids", expanding=True)
+    )
+    for start in range(0, len(ids), _REINDEX_CHUNK):
+        chunk = ids[start:start + _REINDEX_CHUNK]
+        conn.execute(delete, {"ids": chunk})
+        _write_rows(conn, conn.execute(select, {"ids": chunk}).all())
+
+
+def rebuild_search_index(conn) -> int:
+    """从衣服表整体重建FTS表（在调用方的事务中执行），返回索引的衣服数"""
+    conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    result = conn.execute(text(f"SELECT id, {', '.join(SEARCH_FIELDS)} FROM clothing_items"))
+    indexed = 0
+    while True:
+        rows = result.fetchmany(_REINDEX_CHUNK)
+        if not rows:
+            return indexed
+        indexed += _write_rows(conn, rows)
+
+
+def ensure_search_index(conn) -> bool:
+    """创建FTS表和删除触发器，新建时从衣服表回填，返回是否新建（在调用方的事务中执行）"""
+    fields = ", ".join(SEARCH_FIELDS)
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": SEARCH_TABLE}
+    ).first()
+    if exists:
+        return False
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5({fields}, tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+    # 删除只需按rowid删除检索行，用纯SQL触发器同步；插入和修改需要切词，由服务层写入
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS clothing_search_ad AFTER DELETE ON clothing_items BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+        END
+    """))
+    rebuild_search_index(conn)
+    return True
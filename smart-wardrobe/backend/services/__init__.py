@@ -4,10 +4,35 @@
 """
 from backend.services.clothing_service import ClothingService, save_uploaded_image
 from backend.services.classifier_service import ClassifierService, classifier_service
+from backend.services.classification_cache import ClassificationCache, classification_cache
 from backend.services.outfit_service import OutfitService
+from backend.services.outfit_log_service import OutfitLogService
+from backend.services.async_services import (
+    AsyncClothingService, AsyncOutfitService, AsyncOutfitLogService, start_async_workers, shutdown_async_workers
+)
+from backend.services.wardrobe_snapshot import WardrobeSnapshot, wardrobe_snapshot
+from backend.services.wardrobe_version import WardrobeVersion, wardrobe_version
+from backend.services.wardrobe_counters import WardrobeCounters, wardrobe_counters
+from backend.services.compat_graph import CompatGraph, compat_graph
+from backend.services.recommendation_cache import RecommendationCache, recommendation_cache
+from backend.services.upload_jobs import UploadJobManager, upload_job_manager
+from backend.services.background_removal import BackgroundRemovalService, background_removal
+from backend.services.wear_buffer import WearBuffer, wear_buffer
 
 __all__ = [
     "ClothingService", "save_uploaded_image",
     "ClassifierService", "classifier_service",
-    "OutfitService"
+    "ClassificationCache", "classification_cache",
+    "OutfitService",
+    "OutfitLogService",
+    "AsyncClothingService", "AsyncOutfitService", "AsyncOutfitLogService",
+    "start_async_workers", "shutdown_async_workers",
+    "WardrobeSnapshot", "wardrobe_snapshot",
+    "WardrobeVersion", "wardrobe_version",
+    "WardrobeCounters", "wardrobe_counters",
+    "CompatGraph", "compat_graph",
+    "RecommendationCache", "recommendation_cache",
+    "UploadJobManager", "upload_job_manager",
+    "BackgroundRemovalService", "background_removal",
+    "WearBuffer", "wear_buffer"
 ]
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+异步服务层
+API处理函数使用的异步版本，业务逻辑不重复实现，都调用同步服务（ClothingService / OutfitService）：
+- 读操作通过 AsyncSession.run_sync() 在异步只读会话上调用，数据库IO由aiosqlite在驱动线程中执行，不阻塞事件循环；
+  run_sync() 中的Python代码在事件循环线程上执行，因此只用它做数据库读取
+- 写操作在单个写入线程中用写引擎的同步会话执行（写引擎唯一的连接是进程内唯一的写入者，
+  与后台任务的写入在连接池处排队），提交后同步快照、递增版本后即返回，搭配关系图由后台线程更新
+- 搭配推荐的扫描打分和场合搭配搜索在计算线程池中执行
+线程池在应用启动时预先建好线程（start_async_workers）：请求高峰时新建的线程要等正在计算的线程释放GIL才能启动，
+而事件循环会在 Thread.start() 里一直等到新线程启动，按需建线程反而会卡住事件循环
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.config import OUTFIT_COMPUTE_WORKERS
+from backend.models.database import SessionLocal, ReadSessionLocal, ClothingItem, OutfitRecord
+from backend.services.clothing_service import ClothingService
+from backend.services.outfit_service import OutfitService
+from backend.services.outfit_log_service import OutfitLogService
+from backend.services.recommendation_cache import recommendation_cache
+from backend.services.wardrobe_snapshot import wardrobe_snapshot
+from backend.services.wear_buffer import wear_buffer
+
+T = TypeVar("T")
+
+# 线程池名称 -> 线程数
+_WORKER_SIZES = {"compute": max(1, OUTFIT_COMPUTE_WORKERS), "write": 1, "wear": 1}
+_executors: Dict[str, ThreadPoolExecutor] = {}
+
+
+def _executor(name: str) -> ThreadPoolExecutor:
+    executor = _executors.get(name)
+    if executor is None:
+        executor = _executors[name] = ThreadPoolExecutor(
+            max_workers=_WORKER_SIZES[name], thread_name_prefix=f"wardrobe-{name}"
+        )
+    return executor
+
+
+async def _in_worker(name: str, func: Callable[[], T]) -> T:
+    """在指定线程池中执行同步函数"""
+    return await asyncio.get_running_loop().run_in_executor(_executor(name), func)
+
+
+def start_async_workers():
+    """预先启动所有线程池的线程（应用启动时调用）"""
+    for name, size in _WORKER_SIZES.items():
+        # 每个线程都阻塞在屏障上，线程池只能为每个任务新建一个线程
+        barrier = threading.Barrier(size)
+        futures = [_executor(name).submit(barrier.wait) for _ in range(size)]
+        for future in futures:
+            future.result()
+
+
+def shutdown_async_workers():
+    """等待线程池中的任务完成并停止线程（应用关闭时调用）"""
+    while _executors:
+        _, executor = _executors.popitem()
+        executor.shutdown(wait=True)
+
+
+async def _in_writer(call: Callable[[Session], T]) -> T:
+    """在写入线程中用写引擎的同步会话执行写操作（提交后对象不过期，关闭会话后仍可读取）"""
+    def run():
+        with SessionLocal(expire_on_commit=False) as session:
+            return call(session)
+    return await _in_worker("write", run)
+
+
+class AsyncClothingService:
+    """衣服管理服务（异步），db 为只读会话，只执行写操作时可以不传"""
+
+    def __init__(self, db: Optional[AsyncSession] = None):
+        self.db = db
+
+    async def _run(self, call: Callable[[ClothingService], T]) -> T:
+        return await self.db.run_sync(lambda session: call(ClothingService(session)))
+
+    @staticmethod
+    async def _write(call: Callable[[ClothingService], T]) -> T:
+        return await _in_writer(lambda session: call(ClothingService(session)))
+
+    async def get_all(self, **filters) -> List[ClothingItem]:
+        """获取衣服列表，参数同 ClothingService.get_all"""
+        return await self._run(lambda service: service.get_all(**filters))
+
+    async def get_by_id(self, item_id: int) -> Optional[ClothingItem]:
+        return await self._run(lambda service: service.get_by_id(item_id))
+
+    async def create(self, data: Dict[str, Any]) -> ClothingItem:
+        return await self._write(lambda service: service.create(data))
+
+    async def update(self, item_id: int, data: Dict[str, Any]) -> Optional[ClothingItem]:
+        return await self._write(lambda service: service.update(item_id, data))
+
+    async def delete(self, item_id: int) -> bool:
+        return await self._write(lambda service: service.delete(item_id))
+
+    async def toggle_favorite(self, item_id: int) -> Optional[ClothingItem]:
+        return await self._write(lambda service: service.toggle_favorite(item_id))
+
+    async def toggle_archive(self, item_id: int) -> Optional[ClothingItem]:
+        return await self._write(lambda service: service.toggle_archive(item_id))
+
+    async def record_wear(self, item_id: int) -> Optional[ClothingItem]:
+        return await self._write(lambda service: service.record_wear(item_id))
+
+    @staticmethod
+    async def buffer_wear(item_id: int) -> Optional[Tuple[int, datetime]]:
+        """记录一次穿着（进入写缓冲），返回穿着次数和本次穿着时间，衣服不存在时返回None"""
+        return await _in_worker("wear", lambda: wear_buffer.record(item_id))
+
+    async def bulk_update(self, data: Dict[str, Any], ids: Optional[List[int]] = None,
+                          filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return await self._write(lambda service: service.bulk_update(data, ids=ids, filters=filters))
+
+    async def bulk_record_wear(self, ids: Optional[List[int]] = None,
+                               filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return await self._write(lambda service: service.bulk_record_wear(ids=ids, filters=filters))
+
+    async def bulk_delete(self, ids: Optional[List[int]] = None,
+                          filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return await self._write(lambda service: service.bulk_delete(ids=ids, filters=filters))
+
+    async def get_statistics(self) -> Dict[str, Any]:
+        return await self._run(lambda service: service.get_statistics())
+
+    async def get_filter_options(self) -> Dict[str, List[str]]:
+        return await self._run(lambda service: service.get_filter_options())
+
+
+class AsyncOutfitService:
+    """智能搭配推荐服务（异步），结果经过 recommendation_cache 缓存"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _run(self, call: Callable[[OutfitService], T]) -> T:
+        return await self.db.run_sync(lambda session: call(OutfitService(session)))
+
+    async def _cached(self, key: tuple, compute: Callable[[], Awaitable[T]]) -> T:
+        result = recommendation_cache.get(key)
+        if result is None:
+            result = await compute()
+            recommendation_cache.put(key, result)
+        return result
+
+    @staticmethod
+    async def _ensure_snapshot():
+        """首次使用时在计算线程池中加载快照（加载时在快照锁内查询，不在事件循环线程上等待）"""
+        if not wardrobe_snapshot.loaded:
+            def load():
+                with ReadSessionLocal() as session:
+                    wardrobe_snapshot.ensure_loaded(session)
+            await _in_worker("compute", load)
+
+    @staticmethod
+    async def _compute(call: Callable[[OutfitService], T]) -> T:
+        """在线程池中执行只读快照的计算步骤（不访问数据库）"""
+        return await _in_worker("compute", lambda: call(OutfitService(None)))
+
+    async def recommend_outfit(self, base_item_id: int, occasion: Optional[str] = None,
+                               season: Optional[str] = None, limit: int = 5) -> Dict[str, Any]:
+        async def compute() -> Dict[str, Any]:
+            await self._ensure_snapshot()
+            plan = await self._run(lambda service: service._plan_outfit(base_item_id, occasion, season, limit))
+            if plan is None:
+                return {"success": False, "message": "未找到基础衣服"}
+            ranked = await self._compute(lambda service: service._rank_missing(plan))
+            return await self._run(lambda service: service._assemble_outfit(plan, ranked))
+
+        key = recommendation_cache.key("outfit", base_item_id, occasion, season, limit)
+        return await self._cached(key, compute)
+
+    async def recommend_for_occasion(self, occasion: str, season: Optional[str] = None,
+                                     style_preference: Optional[List[str]] = None) -> Dict[str, Any]:
+        async def compute() -> Dict[str, Any]:
+            await self._ensure_snapshot()
+            outfits = await self._compute(
+                lambda service: service._search_occasion(occasion, season, style_preference)
+            )
+            return await self._run(lambda service: service._occasion_result(occasion, season, outfits))
+
+        key = recommendation_cache.key("occasion", occasion, season, tuple(style_preference or ()))
+        return await self._cached(key, compute)
+
+
+class AsyncOutfitLogService:
+    """穿搭记录服务（异步），db 为只读会话，只执行写操作时可以不传"""
+
+    def __init__(self, db: Optional[AsyncSession] = None):
+        self.db = db
+
+    async def _run(self, call: Callable[[OutfitLogService], T]) -> T:
+        return await self.db.run_sync(lambda session: call(OutfitLogService(session)))
+
+    @staticmethod
+    async def _write(call: Callable[[OutfitLogService], T]) -> T:
+        return await _in_writer(lambda session: call(OutfitLogService(session)))
+
+    async def create(self, data: Dict[str, Any]) -> OutfitRecord:
+        return await self._write(lambda service: service.create(data))
+
+    async def get_by_id(self, record_id: int) -> Optional[OutfitRecord]:
+        return await self._run(lambda service: service.get_by_id(record_id))
+
+    async def update(self, record_id: int, data: Dict[str, Any]) -> Optional[OutfitRecord]:
+        return await self._write(lambda service: service.update(record_id, data))
+
+    async def delete(self, record_id: int) -> bool:
+        return await self._write(lambda service: service.delete(record_id))
+
+    async def list_records(self, start: Optional[date] = None, end: Optional[date] = None,
+                           cursor: Optional[str] = None,
+                           limit: int = 50) -> Tuple[List[OutfitRecord], Optional[str]]:
+        return await self._run(lambda service: service.list_records(start, end, cursor, limit))
+
+    async def item_history(self, item_id: int, cursor: Optional[str] = None,
+                           limit: int = 50) -> Tuple[List[OutfitRecord], Optional[str]]:
+        return await self._run(lambda service: service.item_history(item_id, cursor, limit))
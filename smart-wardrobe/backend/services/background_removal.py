@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+背景透明化服务
+后台线程常驻U²-Net模型会话，为上传的图片异步生成透明背景图。
+输出裁剪到不透明区域并保存为带透明通道的WebP，比整幅PNG小得多
+"""
+import io
+import queue
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from PIL import Image
+from sqlalchemy import update, bindparam
+
+from backend.config import (
+    TRANSPARENT_DIR, BACKGROUND_REMOVAL_ENABLED, BACKGROUND_REMOVAL_MODEL,
+    BACKGROUND_REMOVAL_WORKERS, BACKGROUND_REMOVAL_QUEUE_SIZE, BACKGROUND_REMOVAL_BATCH_SIZE,
+    TRANSPARENT_WEBP_QUALITY
+)
+from backend.models import SessionLocal, ClothingItem
+from backend.services.wardrobe_version import wardrobe_version
+
+try:
+    from rembg import new_session, remove
+except ImportError:  # rembg 是可选依赖，未安装时不生成透明图
+    new_session = remove = None
+
+# 内存中保留的已完成结果数（用于确认保存时回填 transparent_path）
+_RESULT_RETENTION = 1000
+# 结果最多攒多久就写库（秒），避免队列较长时单条结果迟迟不回填
+_FLUSH_INTERVAL = 1.0
+
+
+def save_transparent_webp(cutout: bytes, output_path, quality: int = TRANSPARENT_WEBP_QUALITY) -> str:
+    """把抠图结果裁剪到不透明区域，保存为带透明通道的WebP"""
+    with Image.open(io.BytesIO(cutout)) as image:
+        image = image.convert("RGBA")
+        bbox = image.getchannel("A").getbbox()
+        if bbox:
+            image = image.crop(bbox)
+        image.save(output_path, "WEBP", quality=quality, method=4)
+    return str(output_path)
+
+
+def transparent_path_for(source_path: str) -> Path:
+    """原图对应的透明图路径"""
+    return TRANSPARENT_DIR / f"{Path(source_path).stem}_transparent.webp"
+
+
+class BackgroundRemovalService:
+    """
+    背景透明化服务
+    任务进入有界队列，由工作线程处理，每个线程只加载一次模型会话；
+    完成的结果攒成小批次，按原图路径回填到衣服记录的 transparent_path
+    """
+
+    def __init__(self, enabled: bool = BACKGROUND_REMOVAL_ENABLED, model: str = BACKGROUND_REMOVAL_MODEL,
+                 workers: int = BACKGROUND_REMOVAL_WORKERS, queue_size: int = BACKGROUND_REMOVAL_QUEUE_SIZE,
+                 batch_size: int = BACKGROUND_REMOVAL_BATCH_SIZE):
+        self.enabled = enabled and remove is not None
+        self.model = model
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max(1, queue_size))
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        # 原图路径 -> 透明图路径（None 表示排队或处理中）
+        self._results: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._pending_updates: List[Tuple[str, str]] = []
+        self._last_flush = time.monotonic()
+
+    def submit(self, source_path: Optional[str]) -> bool:
+        """提交一张图片，队列已满或服务不可用时返回False"""
+        if not self.enabled or not source_path:
+            return False
+        with self._lock:
+            if source_path in self._results:
+                return True
+            self._ensure_started()
+            try:
+                self._queue.put_nowait(source_path)
+            except queue.Full:
+                print(f"背景透明化队列已满，跳过: {source_path}")
+                return False
+            self._results[source_path] = None
+        return True
+
+    def result_for(self, source_path: Optional[str]) -> Optional[str]:
+        """查询已完成的透明图路径"""
+        if not source_path:
+            return None
+        return self._results.get(source_path)
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"bg-removal-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self):
+        # 每个线程加载一次模型，之后所有图片共用
+        session = new_session(self.model)
+        while True:
+            source_path = self._queue.get()
+            try:
+                if source_path is None:
+                    self._flush()
+                    return
+                output_path = self._process(session, source_path)
+                with self._lock:
+                    if output_path:
+                        self._results[source_path] = output_path
+                        self._results.move_to_end(source_path)
+                        self._pending_updates.append((source_path, output_path))
+                        self._trim_results()
+                    else:
+                        self._results.pop(source_path, None)
+                    should_flush = (len(self._pending_updates) >= self.batch_size
+                                    or time.monotonic() - self._last_flush >= _FLUSH_INTERVAL)
+                if should_flush or self._queue.empty():
+                    self._flush()
+            finally:
+                self._queue.task_done()
+
+    def _process(self, session, source_path: str) -> Optional[str]:
+        try:
+            with open(source_path, 'rb') as f:
+                cutout = remove(f.read(), session=session)
+            return save_transparent_webp(cutout, transparent_path_for(source_path))
+        except Exception as e:
+            print(f"背景透明化失败: {source_path}: {e}")
+            return None
+
+    def _trim_results(self):
+        while len(self._results) > _RESULT_RETENTION:
+            source_path, output_path = next(iter(self._results.items()))
+            if output_path is None:
+                break
+            self._results.popitem(last=False)
+
+    def _flush(self):
+        """把一批结果回填到已保存的衣服记录（未确认保存的由 ClothingService.create 回填）"""
+        with self._lock:
+            updates, self._pending_updates = self._pending_updates, []
+            self._last_flush = time.monotonic()
+        if not updates:
+            return
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(ClothingItem.__table__)
+                .where(
+                    ClothingItem.__table__.c.original_path == bindparam("source"),
+                    ClothingItem.__table__.c.transparent_path == None
+                )
+                .values(transparent_path=bindparam("output")),
+                [{"source": source, "output": output} for source, output in updates]
+            )
+            db.commit()
+            wardrobe_version.bump()
+        except Exception as e:
+            db.rollback()
+            print(f"回填透明图路径失败: {e}")
+        finally:
+            db.close()
+
+    def shutdown(self, timeout: float = 5.0):
+        """停止工作线程（应用关闭时调用），正在处理的图片最多等待timeout秒"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for thread in threads:
+            thread.join(timeout)
+        self._flush()
+
+
+# 单例实例
+background_removal = BackgroundRemovalService()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+分类结果缓存
+按图片内容的SHA-256、模型名和提示词版本寻址，持久化在SQLite中。
+同一张图片经过预览、上传、重新分类时只需调用一次识别接口
+"""
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+
+from sqlalchemy import func, select, update, delete, bindparam, literal_column
+
+from backend.config import (
+    CLASSIFICATION_CACHE_ENABLED, CLASSIFICATION_CACHE_MAX_ENTRIES, CLASSIFICATION_CACHE_TTL_DAYS
+)
+from backend.models import SessionLocal, ReadSessionLocal, engine, ClassificationCacheEntry
+
+
+def image_digest(content: bytes) -> str:
+    """计算图片内容哈希"""
+    return hashlib.sha256(content).hexdigest()
+
+
+class ClassificationCache:
+    """
+    分类结果缓存
+    命中只读数据库，命中次数和最近使用时间先记在内存中，
+    下次写入缓存时（淘汰之前）或 flush() 时批量写库；
+    写入后超出容量则淘汰最久未使用的条目（LRU），超过有效期的条目视为未命中，写入时删除
+    """
+
+    def __init__(self, enabled: bool = CLASSIFICATION_CACHE_ENABLED,
+                 max_entries: int = CLASSIFICATION_CACHE_MAX_ENTRIES,
+                 ttl_days: int = CLASSIFICATION_CACHE_TTL_DAYS):
+        self.enabled = enabled
+        self.max_entries = max(1, max_entries)
+        self.ttl = timedelta(days=ttl_days) if ttl_days > 0 else None
+        self._lock = threading.Lock()
+        self._table_ready = False
+        # (图片哈希, 模型, 提示词版本) -> (未写库的命中次数, 最近使用时间)
+        self._touches: Dict[Tuple[str, str, str], Tuple[int, datetime]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _ensure_table(self):
+        # 离线脚本不一定执行过 init_db，首次使用时按需建表
+        if not self._table_ready:
+            ClassificationCacheEntry.__table__.create(bind=engine, checkfirst=True)
+            self._table_ready = True
+
+    def _count(self, name: str, delta: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def get(self, digest: str, model: str, prompt_version: str) -> Optional[Dict[str, Any]]:
+        """查询缓存，未命中返回None"""
+        if not self.enabled:
+            return None
+        self._ensure_table()
+        key = (digest, model, prompt_version)
+        db = ReadSessionLocal()
+        try:
+            entry = db.get(ClassificationCacheEntry, key)
+            now = datetime.now()
+            if entry is None or (self.ttl is not None and entry.created_at < now - self.ttl):
+                self._count("misses")
+                return None
+            result = dict(entry.result)
+        finally:
+            db.close()
+
+        with self._lock:
+            hits, _ = self._touches.get(key, (0, now))
+            self._touches[key] = (hits + 1, now)
+            self.hits += 1
+        return result
+
+    def _write_touches(self, db) -> Dict[Tuple[str, str, str], Tuple[int, datetime]]:
+        """把内存中的命中次数和最近使用时间批量写库（不提交），返回写入的记录"""
+        with self._lock:
+            touches, self._touches = self._touches, {}
+        if not touches:
+            return touches
+        table = ClassificationCacheEntry.__table__
+        db.execute(
+            update(table)
+            .where(
+                table.c.image_hash == bindparam("key_hash"),
+                table.c.model == bindparam("key_model"),
+                table.c.prompt_version == bindparam("key_prompt_version")
+            )
+            .values(
+                hit_count=func.coalesce(table.c.hit_count, 0) + bindparam("hits"),
+                last_used_at=func.max(func.coalesce(table.c.last_used_at, bindparam("used_at")), bindparam("used_at"))
+            ),
+            [{"key_hash": digest, "key_model": model, "key_prompt_version": prompt_version,
+              "hits": hits, "used_at": used_at}
+             for (digest, model, prompt_version), (hits, used_at) in touches.items()]
+        )
+        return touches
+
+    def _restore_touches(self, touches: Dict[Tuple[str, str, str], Tuple[int, datetime]]):
+        """写库失败时把命中记录放回内存，与期间新增的记录合并"""
+        with self._lock:
+            for key, (hits, used_at) in touches.items():
+                newer_hits, newer_used_at = self._touches.get(key, (0, used_at))
+                self._touches[key] = (hits + newer_hits, max(used_at, newer_used_at))
+
+    def flush(self):
+        """把未写库的命中记录写库（ClassifierService.close() 时调用）"""
+        if not self.enabled or not self._touches:
+            return
+        self._ensure_table()
+        db = SessionLocal()
+        touches = {}
+        try:
+            touches = self._write_touches(db)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self._restore_touches(touches)
+            print(f"写入分类缓存命中记录失败: {e}")
+        finally:
+            db.close()
+
+    def put(self, digest: str, model: str, prompt_version: str, result: Dict[str, Any]):
+        """写入缓存（只应写入识别成功的结果）"""
+        if not self.enabled:
+            return
+        self._ensure_table()
+        db = SessionLocal()
+        touches = {}
+        try:
+            # 先写入命中记录，淘汰时按真实的最近使用时间排序
+            touches = self._write_touches(db)
+            now = datetime.now()
+            entry = db.get(ClassificationCacheEntry, (digest, model, prompt_version))
+            if entry is None:
+                entry = ClassificationCacheEntry(
+                    image_hash=digest, model=model, prompt_version=prompt_version, hit_count=0
+                )
+                db.add(entry)
+            entry.result = result
+            entry.created_at = now
+            entry.last_used_at = now
+            db.flush()
+            evicted = self._evict(db)
+            db.commit()
+            self._count("writes")
+            if evicted:
+                self._count("evictions", evicted)
+        except Exception:
+            db.rollback()
+            self._restore_touches(touches)
+            raise
+        finally:
+            db.close()
+
+    def _evict(self, db) -> int:
+        """删除过期条目及超出容量的最久未使用条目"""
+        evicted = 0
+        if self.ttl is not None:
+            evicted += db.query(ClassificationCacheEntry).filter(
+                ClassificationCacheEntry.created_at < datetime.now() - self.ttl
+            ).delete(synchronize_session=False)
+
+        overflow = db.query(func.count(ClassificationCacheEntry.image_hash)).scalar() - self.max_entries
+        if overflow > 0:
+            # 一条语句删除最久未使用的 overflow 条（rowid 在 SQLite 中唯一标识一行）
+            table = ClassificationCacheEntry.__table__
+            rowid = literal_column("rowid")
+            stale = select(rowid).select_from(table).order_by(table.c.last_used_at).limit(overflow)
+            evicted += db.execute(delete(table).where(rowid.in_(stale))).rowcount
+        return evicted
+
+    def clear(self) -> int:
+        """清空缓存，返回删除的条目数"""
+        self._ensure_table()
+        with self._lock:
+            self._touches.clear()
+        db = SessionLocal()
+        try:
+            deleted = db.query(ClassificationCacheEntry).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        self._ensure_table()
+        db = ReadSessionLocal()
+        try:
+            entries = db.query(func.count(ClassificationCacheEntry.image_hash)).scalar()
+        finally:
+            db.close()
+
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_days": self.ttl.days if self.ttl else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions
+        }
+
+
+# 单例实例
+classification_cache = ClassificationCache()
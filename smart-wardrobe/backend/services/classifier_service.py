@@ -3,59 +3,28 @@
 AI分类服务
 使用阿里云通义千问进行图像识别
 """
+import asyncio
 import base64
+import hashlib
 import json
-import requests
-from typing import Dict, Any, Optional
+import mimetypes
+import threading
+from typing import Dict, Any, Optional, Tuple
 from pathlib import Path
 
-from backend.config import DASHSCOPE_API_KEY, DASHSCOPE_BASE_URL
+import httpx
 
+from backend.config import (
+    DASHSCOPE_API_KEY, DASHSCOPE_BASE_URL, CLASSIFIER_MODEL,
+    CLASSIFIER_TIMEOUT, CLASSIFIER_CONNECT_TIMEOUT,
+    CLASSIFIER_MAX_CONCURRENCY, CLASSIFIER_MAX_KEEPALIVE
+)
+from backend.services.classification_cache import ClassificationCache, classification_cache, image_digest
+from backend.services.image_pipeline import normalize_image
 
-class ClassifierService:
-    """AI分类服务"""
-    
-    def __init__(self):
-        self.api_key = DASHSCOPE_API_KEY
-        self.base_url = DASHSCOPE_BASE_URL
-    
-    def encode_image_to_base64(self, image_path: str) -> str:
-        """将图片转换为base64编码"""
-        with open(image_path, 'rb') as f:
-            return base64.b64encode(f.read()).decode('utf-8')
-    
-    def classify_image(self, image_path: str) -> Dict[str, Any]:
-        """
-        使用通义千问进行图像分类
-        """
-        # 将图片转换为base64
-        base64_image = self.encode_image_to_base64(image_path)
-        
-        # 构建API请求
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": "qwen-vl-max",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "你是一个专业的服装识别与穿搭顾问专家。请分析图片中的服装，提供详细的分类信息以及穿搭搭配建议。"
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": """请详细分析这张服装图片，并按以下JSON格式返回结果：
+SYSTEM_PROMPT = "你是一个专业的服装识别与穿搭顾问专家。请分析图片中的服装，提供详细的分类信息以及穿搭搭配建议。"
+
+USER_PROMPT = """请详细分析这张服装图片，并按以下JSON格式返回结果：
 {
     "category": "服装类别（如：上衣、裤子、裙子、外套、鞋子、帽子、包包、配饰等）",
     "type": "具体类型（如：T恤、牛仔裤、连衣裙、运动鞋等）",
@@ -80,52 +49,253 @@ class ClassifierService:
     "confidence": "识别置信度（high/medium/low）"
 }
 请只返回JSON格式的结果，不要有其他文字说明。"""
+
+# 分类结果中映射到衣服记录的字段
+CLASSIFICATION_FIELDS = (
+    "category", "type", "color", "color_tone", "style", "material",
+    "thickness", "features", "season", "suitable_weather",
+    "suitable_occasions", "suitable_age_group", "body_type_tips",
+    "matching_tops", "matching_bottoms", "matching_shoes",
+    "matching_accessories", "matching_colors", "outfit_tags",
+    "description", "confidence"
+)
+
+
+def pick_classification_fields(classification: Dict[str, Any]) -> Dict[str, Any]:
+    """从分类结果中取出需要映射到衣服记录的字段"""
+    return {key: classification[key] for key in CLASSIFICATION_FIELDS if key in classification}
+
+
+class ClassifierService:
+    """
+    AI分类服务
+    同步接口（classify_image）供脚本使用，异步接口（classify_image_async）供API使用；
+    两者各自复用一个长连接池，异步接口另有信号量限制同时进行的请求数。
+    识别成功的结果按图片内容缓存，force=True 时跳过缓存重新识别
+    """
+
+    def __init__(self, system_prompt: str = SYSTEM_PROMPT, user_prompt: str = USER_PROMPT,
+                 max_concurrency: int = CLASSIFIER_MAX_CONCURRENCY,
+                 cache: Optional[ClassificationCache] = classification_cache):
+        self.api_key = DASHSCOPE_API_KEY
+        self.base_url = DASHSCOPE_BASE_URL
+        self.model = CLASSIFIER_MODEL
+        self.system_prompt = system_prompt
+        self.user_prompt = user_prompt
+        # 提示词版本取提示词内容的哈希，修改提示词后旧缓存自动失效
+        self.prompt_version = hashlib.sha256(
+            f"{system_prompt}\n{user_prompt}".encode("utf-8")
+        ).hexdigest()[:12]
+        self.cache = cache
+        self.max_concurrency = max(1, max_concurrency)
+        self._timeout = httpx.Timeout(CLASSIFIER_TIMEOUT, connect=CLASSIFIER_CONNECT_TIMEOUT)
+        self._limits = httpx.Limits(
+            max_connections=self.max_concurrency,
+            max_keepalive_connections=min(CLASSIFIER_MAX_KEEPALIVE, self.max_concurrency)
+        )
+        self._client: Optional[httpx.Client] = None
+        self._client_lock = threading.Lock()
+        # 异步客户端和信号量都绑定在创建时的事件循环上
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_semaphore: Optional[asyncio.Semaphore] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def encode_image(self, content: bytes, image_path: str) -> Tuple[str, str]:
+        """
+        规范化并编码图片，返回 (base64, MIME类型)
+        上传的图片已是规范母版，会原样发送；脚本处理的原图在这里缩小后再发送
+        """
+        try:
+            normalized = normalize_image(content)
+            content, mime_type = normalized.data, normalized.mime_type
+        except ValueError:
+            mime_type = mimetypes.guess_type(image_path)[0] or "image/jpeg"
+        return base64.b64encode(content).decode('utf-8'), mime_type
+
+    def _lookup(self, image_path: str, force: bool) -> Tuple[bytes, str, Optional[Dict[str, Any]]]:
+        """读取图片并查询缓存，返回 (图片内容, 内容哈希, 缓存结果)"""
+        with open(image_path, 'rb') as f:
+            content = f.read()
+        digest = image_digest(content)
+        if force or self.cache is None:
+            return content, digest, None
+        try:
+            return content, digest, self.cache.get(digest, self.model, self.prompt_version)
+        except Exception as e:
+            # 缓存不可用时直接调用接口，不影响分类
+            print(f"分类缓存读取失败: {e}")
+            return content, digest, None
+
+    def _store(self, digest: str, classification: Dict[str, Any]):
+        if self.cache is None:
+            return
+        try:
+            self.cache.put(digest, self.model, self.prompt_version, classification)
+        except Exception as e:
+            print(f"分类缓存写入失败: {e}")
+
+    def build_payload(self, base64_image: str, mime_type: str = "image/jpeg") -> Dict[str, Any]:
+        """构建识别请求体"""
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": self.system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:{mime_type};base64,{base64_image}"
+                            }
+                        },
+                        {
+                            "type": "text",
+                            "text": self.user_prompt
                         }
                     ]
                 }
             ]
         }
-        
+
+    def parse_response(self, result: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """解析接口返回的识别结果，返回 (分类结果, 是否成功解析)"""
+        content = result["choices"][0]["message"]["content"]
+
+        # 尝试解析JSON响应
+        try:
+            # 清理可能的markdown代码块标记
+            if "```json" in content:
+                content = content.split("```json")[1].split("```")[0].strip()
+            elif "```" in content:
+                content = content.split("```")[1].split("```")[0].strip()
+
+            return json.loads(content), True
+
+        except json.JSONDecodeError:
+            # 如果无法解析JSON，返回原始文本
+            return {
+                "category": "unknown",
+                "type": "clothing",
+                "description": content,
+                "confidence": "low"
+            }, False
+
+    @property
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    # ==================== 同步接口 ====================
+
+    def _get_client(self) -> httpx.Client:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = httpx.Client(timeout=self._timeout, limits=self._limits)
+        return self._client
+
+    def request_classification(self, image_path: str, force: bool = False) -> Dict[str, Any]:
+        """
+        调用通义千问识别图片（同步）
+        网络或接口错误时直接抛出异常，由调用方决定如何回退
+        """
+        content, digest, cached = self._lookup(image_path, force)
+        if cached is not None:
+            return cached
+
+        base64_image, mime_type = self.encode_image(content, image_path)
+        response = self._get_client().post(
+            f"{self.base_url}/chat/completions",
+            headers=self._headers,
+            json=self.build_payload(base64_image, mime_type)
+        )
+        response.raise_for_status()
+        classification, parsed = self.parse_response(response.json())
+        if parsed:
+            self._store(digest, classification)
+        return classification
+
+    def classify_image(self, image_path: str, force: bool = False) -> Dict[str, Any]:
+        """
+        使用通义千问进行图像分类（同步，失败时回退到文件名分类）
+        """
         try:
-            response = requests.post(
+            return self.request_classification(image_path, force)
+        except Exception as e:
+            print(f"API调用失败: {e}")
+            return self.classify_by_filename(Path(image_path))
+
+    def close(self):
+        """关闭同步连接池，并把分类缓存的命中记录写库"""
+        with self._client_lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+        if self.cache is not None:
+            self.cache.flush()
+
+    # ==================== 异步接口 ====================
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            # 事件循环变化（如测试中多次启动应用）时旧客户端已不可用，重新创建
+            self._async_client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._async_loop = loop
+        return self._async_client
+
+    async def request_classification_async(self, image_path: str, force: bool = False) -> Dict[str, Any]:
+        """
+        调用通义千问识别图片（异步）
+        读图、查缓存和编码放到线程中执行，请求期间不阻塞事件循环
+        """
+        content, digest, cached = await asyncio.to_thread(self._lookup, image_path, force)
+        if cached is not None:
+            return cached
+
+        client = self._get_async_client()
+        async with self._async_semaphore:
+            base64_image, mime_type = await asyncio.to_thread(self.encode_image, content, image_path)
+            response = await client.post(
                 f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=60
+                headers=self._headers,
+                json=self.build_payload(base64_image, mime_type)
             )
-            response.raise_for_status()
-            
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-            
-            # 尝试解析JSON响应
-            try:
-                # 清理可能的markdown代码块标记
-                if "```json" in content:
-                    content = content.split("```json")[1].split("```")[0].strip()
-                elif "```" in content:
-                    content = content.split("```")[1].split("```")[0].strip()
-                
-                classification = json.loads(content)
-                return classification
-                
-            except json.JSONDecodeError:
-                # 如果无法解析JSON，返回原始文本
-                return {
-                    "category": "unknown",
-                    "type": "clothing",
-                    "description": content,
-                    "confidence": "low"
-                }
-                
+        response.raise_for_status()
+        classification, parsed = self.parse_response(response.json())
+        if parsed:
+            await asyncio.to_thread(self._store, digest, classification)
+        return classification
+
+    async def classify_image_async(self, image_path: str, force: bool = False) -> Dict[str, Any]:
+        """
+        使用通义千问进行图像分类（异步，失败时回退到文件名分类）
+        """
+        try:
+            return await self.request_classification_async(image_path, force)
         except Exception as e:
             print(f"API调用失败: {e}")
             return self.classify_by_filename(Path(image_path))
-    
+
+    async def aclose(self):
+        """关闭异步连接池（应用关闭时调用）"""
+        client, self._async_client = self._async_client, None
+        self._async_semaphore = None
+        self._async_loop = None
+        if client is not None:
+            await client.aclose()
+
     def classify_by_filename(self, image_path: Path) -> Dict[str, Any]:
         """基于文件名的启发式分类（备用方案）"""
         filename = image_path.stem.lower()
-        
+
         categories = {
             "裤子": ["pants", "trousers", "jeans", "shorts", "leggings", "slacks"],
             "上衣": ["shirt", "t-shirt", "tshirt", "blouse", "top", "tee"],
@@ -136,10 +306,10 @@ class ClassifierService:
             "包包": ["bag", "handbag", "backpack", "purse", "tote", "clutch"],
             "配饰": ["scarf", "belt", "gloves", "sunglasses", "watch", "jewelry"]
         }
-        
+
         detected_category = "unknown"
         detected_type = "clothing"
-        
+
         for category, keywords in categories.items():
             for keyword in keywords:
                 if keyword in filename:
@@ -148,7 +318,7 @@ class ClassifierService:
                     break
             if detected_category != "unknown":
                 break
-        
+
         return {
             "category": detected_category,
             "type": detected_type,
@@ -163,4 +333,4 @@ class ClassifierService:
 
 
 # 单例实例
-classifier_service = ClassifierService()
\ No newline at end of file
+classifier_service = ClassifierService()
@@ -4,14 +4,78 @@
 """
 import os
 import uuid
-import shutil
+import base64
+from collections import Counter
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from types import SimpleNamespace
+from typing import Iterable, List, Optional, Dict, Any, Tuple
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import or_, select, table, text, literal_column, tuple_, func, update, delete, insert
 
-from backend.models.database import ClothingItem
-from backend.config import IMAGES_DIR, PHOTO_DIR, TRANSPARENT_DIR, ALLOWED_EXTENSIONS
+from backend.models.database import ClothingItem, ClothingTag, TAG_FIELDS, ITEM_DICT_FIELDS, as_tag_list
+from backend.models.search_index import SEARCH_TABLE, SEARCH_FIELDS, build_match_query, bm25_expression, reindex_items
+from backend.services.wardrobe_snapshot import wardrobe_snapshot
+from backend.services.wardrobe_version import wardrobe_version
+from backend.services.wardrobe_counters import wardrobe_counters
+from backend.services.compat_graph import compat_graph, graph_key
+from backend.services.background_removal import background_removal
+from backend.services.image_pipeline import normalize_image
+from backend.services.image_derivatives import derivative_cache
+from backend.config import IMAGES_DIR, ALLOWED_EXTENSIONS
+
+# 搭配快照使用的字段，批量更新涉及这些字段时需要同步快照
+SNAPSHOT_FIELDS = {"category", "type", "color", "style", "season", "suitable_occasions", "is_archived"}
+
+# 列表接口 fields= 参数的预设：card 为衣服卡片（网格、收藏、搭配选择）用到的字段
+FIELD_PRESETS = {
+    "card": ("id", "category", "type", "color", "style", "season", "is_favorite", "is_archived",
+             "wear_count", "last_worn_date", "created_at"),
+    "full": ITEM_DICT_FIELDS,
+}
+
+
+def resolve_fields(spec: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    解析 fields= 参数：逗号分隔的字段名或预设名，可混用（如 "card,brand"）。
+    未指定时返回None（输出全部字段），始终包含id；有未知字段时抛出 ValueError
+    """
+    if not spec:
+        return None
+    fields = {"id": None}
+    for name in (part.strip() for part in spec.split(",")):
+        if not name:
+            continue
+        if name in FIELD_PRESETS:
+            fields.update(dict.fromkeys(FIELD_PRESETS[name]))
+        elif name in ITEM_DICT_FIELDS:
+            fields[name] = None
+        else:
+            raise ValueError(f"未知字段: {name}")
+    return tuple(fields)
+
+
+def encode_cursor(item, column: str = "created_at") -> str:
+    """由一页的最后一条记录生成翻页游标（按 column+ID 排序，对客户端不透明）"""
+    raw = f"{getattr(item, column).isoformat()}|{item.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析翻页游标，格式不正确时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, item_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("无效的翻页游标") from e
+
+
+def _remove_files(paths: Iterable[str]):
+    """删除图片文件及其缩略图"""
+    for path in paths:
+        derivative_cache.discard(path)
+        if os.path.exists(path):
+            os.remove(path)
 
 
 class ClothingService:
@@ -29,50 +93,87 @@ class ClothingService:
                 is_archived: Optional[bool] = None,
                 search: Optional[str] = None,
                 skip: int = 0,
-                limit: int = 50) -> List[ClothingItem]:
+                limit: int = 50,
+                cursor: Optional[str] = None,
+                fields: Optional[Tuple[str, ...]] = None) -> List[ClothingItem]:
         """
         获取衣服列表，支持多条件筛选
+        cursor 为上一页返回的游标（按 创建时间+ID 翻页，与 skip 二选一）；
+        全文搜索按相关度排序，不支持游标。
+        fields 指定时只查询这些列（另加翻页和搜索摘要需要的列），其余列延迟加载，
+        调用方只能访问 fields 中的属性
         """
-        query = self.db.query(ClothingItem)
-        
-        # 筛选条件
-        if category:
-            query = query.filter(ClothingItem.category == category)
-        if color:
-            query = query.filter(ClothingItem.color == color)
-        if style:
-            query = query.filter(ClothingItem.style.contains(f'"{style}"'))
-        if is_favorite is not None:
-            query = query.filter(ClothingItem.is_favorite == is_favorite)
-        if is_archived is not None:
-            query = query.filter(ClothingItem.is_archived == is_archived)
-        
-        # 季节筛选 (JSON字段模糊匹配)
-        if season:
-            query = query.filter(ClothingItem.season.contains(f'"{season}"'))
+        query = self.db.query(ClothingItem).filter(*self._filter_conditions(
+            category=category, color=color, style=style, season=season,
+            is_favorite=is_favorite, is_archived=is_archived
+        ))
+        if fields is not None:
+            columns = set(fields) | {"id", "created_at"} | (set(SEARCH_FIELDS) if search else set())
+            query = query.options(load_only(*(getattr(ClothingItem, name) for name in sorted(columns))))
         
-        # 搜索 (在类型、描述、品牌中搜索)
-        if search:
-            search_pattern = f"%{search}%"
-            query = query.filter(
-                or_(
-                    ClothingItem.type.ilike(search_pattern),
-                    ClothingItem.description.ilike(search_pattern),
-                    ClothingItem.brand.ilike(search_pattern),
-                    ClothingItem.user_notes.ilike(search_pattern)
+        # 搜索 (在类型、描述、品牌、备注中搜索)，全文索引按相关度排序
+        match = build_match_query(search) if search else None
+        if match:
+            hits = select(
+                literal_column("rowid").label("item_id"),
+                literal_column(bm25_expression()).label("rank")
+            ).select_from(table(SEARCH_TABLE)).where(
+                text(f"{SEARCH_TABLE} MATCH :match").bindparams(match=match)
+            ).subquery()
+            query = query.join(hits, hits.c.item_id == ClothingItem.id)
+            query = query.order_by(hits.c.rank, ClothingItem.created_at.desc())
+        else:
+            if search:
+                # 单字无法用二元组索引表达，回退到模糊匹配
+                query = query.filter(self._like_condition(search))
+            if cursor:
+                # 键集分页：从上一页最后一条之后继续，走未归档衣服的 (created_at, id) 部分索引
+                created_at, item_id = decode_cursor(cursor)
+                query = query.filter(
+                    tuple_(ClothingItem.created_at, ClothingItem.id) < tuple_(created_at, item_id)
                 )
-            )
-        
-        # 默认不显示已归档的
-        if is_archived is None:
-            query = query.filter(ClothingItem.is_archived == False)
+                skip = 0
+            query = query.order_by(ClothingItem.created_at.desc(), ClothingItem.id.desc())
         
-        # 排序和分页
-        query = query.order_by(ClothingItem.created_at.desc())
+        # 分页
         query = query.offset(skip).limit(limit)
         
         return query.all()
     
+    @staticmethod
+    def _filter_conditions(category: Optional[str] = None,
+                           color: Optional[str] = None,
+                           style: Optional[str] = None,
+                           season: Optional[str] = None,
+                           is_favorite: Optional[bool] = None,
+                           is_archived: Optional[bool] = None) -> list:
+        """列表和批量操作共用的筛选条件（未指定归档状态时默认只包含未归档的）"""
+        conditions = []
+        if category:
+            conditions.append(ClothingItem.category == category)
+        if color:
+            conditions.append(ClothingItem.color == color)
+        if style:
+            conditions.append(ClothingItem.has_tag("style", style))
+        # 季节筛选 (走标签索引)
+        if season:
+            conditions.append(ClothingItem.has_tag("season", season))
+        if is_favorite is not None:
+            conditions.append(ClothingItem.is_favorite == is_favorite)
+        conditions.append(ClothingItem.is_archived == bool(is_archived))
+        return conditions
+    
+    @staticmethod
+    def _like_condition(search: str):
+        """在类型、描述、品牌、备注中模糊匹配"""
+        search_pattern = f"%{search}%"
+        return or_(
+            ClothingItem.type.ilike(search_pattern),
+            ClothingItem.description.ilike(search_pattern),
+            ClothingItem.brand.ilike(search_pattern),
+            ClothingItem.user_notes.ilike(search_pattern)
+        )
+    
     def get_by_id(self, item_id: int) -> Optional[ClothingItem]:
         """根据ID获取衣服"""
         return self.db.query(ClothingItem).filter(ClothingItem.id == item_id).first()
@@ -80,24 +181,82 @@ class ClothingService:
     def create(self, data: Dict[str, Any]) -> ClothingItem:
         """创建新衣服记录"""
         item = ClothingItem(**data)
+        item.sync_tags()
         self.db.add(item)
+        self.db.flush()
+        reindex_items(self.db, [item.id])
+        wardrobe_counters.apply(self.db, Counter(), wardrobe_counters.contributions(item))
         self.db.commit()
         self.db.refresh(item)
+        if not item.transparent_path and item.original_path:
+            self._attach_transparent(item)
+        self._after_write(item)
         return item
     
+    def _attach_transparent(self, item: ClothingItem):
+        """
+        回填透明背景图：已生成则直接写入，否则排队生成，完成后由后台按原图路径回填。
+        必须在记录提交之后调用，保证后台回填时能查到这条记录
+        """
+        transparent_path = background_removal.result_for(item.original_path)
+        if transparent_path:
+            item.transparent_path = transparent_path
+            self.db.commit()
+            self.db.refresh(item)
+        else:
+            background_removal.submit(item.original_path)
+    
+    def _after_write(self, item: Optional[ClothingItem] = None, deleted_id: Optional[int] = None,
+                     paths: Iterable[str] = ()):
+        """
+        写入提交后的统一收尾：同步搭配快照、登记搭配关系图更新、递增衣柜版本、删除图片文件。
+        item 为影响搭配的新增/修改记录，deleted_id 为已删除的记录，paths 为要删除的图片
+        """
+        graph_ids = []
+        if item is not None:
+            # 快照正在加载时 upsert 等待加载完成后再更新。事先未加载完成的快照
+            # 无法给出修改前的特征，直接登记关系图更新
+            loaded = wardrobe_snapshot.loaded
+            before = graph_key(wardrobe_snapshot.get(item.id))
+            updated = wardrobe_snapshot.upsert(item)
+            if not (loaded and updated) or graph_key(wardrobe_snapshot.get(item.id)) != before:
+                graph_ids.append(item.id)
+        if deleted_id is not None:
+            wardrobe_snapshot.discard(deleted_id)
+            graph_ids.append(deleted_id)
+        self._finish_write(graph_ids, paths)
+    
+    @staticmethod
+    def _finish_write(graph_ids: List[int], paths: Iterable[str]):
+        """
+        递增版本、登记关系图更新、删除文件。
+        关系图由后台线程更新（批量写入时可能整体重建），写请求不等待；更新完成后版本号会再递增一次
+        """
+        wardrobe_version.bump()
+        compat_graph.schedule(graph_ids)
+        _remove_files(paths)
+    
     def update(self, item_id: int, data: Dict[str, Any]) -> Optional[ClothingItem]:
         """更新衣服信息"""
         item = self.get_by_id(item_id)
         if not item:
             return None
         
+        before = wardrobe_counters.contributions(item)
         for key, value in data.items():
             if hasattr(item, key) and value is not None:
                 setattr(item, key, value)
         
+        if any(field in data for field in TAG_FIELDS):
+            item.sync_tags()
         item.updated_at = datetime.now()
+        if any(data.get(field) is not None for field in SEARCH_FIELDS):
+            self.db.flush()
+            reindex_items(self.db, [item.id])
+        wardrobe_counters.apply(self.db, before, wardrobe_counters.contributions(item))
         self.db.commit()
         self.db.refresh(item)
+        self._after_write(item)
         return item
     
     def delete(self, item_id: int) -> bool:
@@ -106,14 +265,12 @@ class ClothingService:
         if not item:
             return False
         
-        # 删除关联的图片文件
-        if item.original_path and os.path.exists(item.original_path):
-            os.remove(item.original_path)
-        if item.transparent_path and os.path.exists(item.transparent_path):
-            os.remove(item.transparent_path)
-        
+        paths = [path for path in (item.original_path, item.transparent_path) if path]
+        wardrobe_counters.apply(self.db, wardrobe_counters.contributions(item), Counter())
         self.db.delete(item)
         self.db.commit()
+        # 数据库删除成功后再删除关联的图片文件及缩略图
+        self._after_write(deleted_id=item_id, paths=paths)
         return True
     
     def toggle_favorite(self, item_id: int) -> Optional[ClothingItem]:
@@ -122,10 +279,13 @@ class ClothingService:
         if not item:
             return None
         
+        before = wardrobe_counters.contributions(item)
         item.is_favorite = not item.is_favorite
         item.updated_at = datetime.now()
+        wardrobe_counters.apply(self.db, before, wardrobe_counters.contributions(item))
         self.db.commit()
         self.db.refresh(item)
+        self._after_write()
         return item
     
     def toggle_archive(self, item_id: int) -> Optional[ClothingItem]:
@@ -134,100 +294,208 @@ class ClothingService:
         if not item:
             return None
         
+        before = wardrobe_counters.contributions(item)
         item.is_archived = not item.is_archived
         item.updated_at = datetime.now()
+        wardrobe_counters.apply(self.db, before, wardrobe_counters.contributions(item))
         self.db.commit()
         self.db.refresh(item)
+        self._after_write(item)
         return item
     
     def record_wear(self, item_id: int) -> Optional[ClothingItem]:
-        """记录穿着"""
+        """记录穿着（立即写库，供脚本使用；API通过 wear_buffer 合并写入）"""
         item = self.get_by_id(item_id)
         if not item:
             return None
         
-        item.wear_count = (item.wear_count or 0) + 1
-        item.last_worn_date = datetime.now()
-        self.db.commit()
+        self.commit_wear([item_id])
         self.db.refresh(item)
         return item
     
-    def get_statistics(self) -> Dict[str, Any]:
-        """获取衣柜统计信息"""
-        total = self.db.query(ClothingItem).filter(ClothingItem.is_archived == False).count()
-        favorites = self.db.query(ClothingItem).filter(
-            ClothingItem.is_favorite == True,
-            ClothingItem.is_archived == False
-        ).count()
+    def commit_wear(self, item_ids: List[int], worn_at: Optional[datetime] = None):
+        """
+        衣服穿着次数各加一（在数据库中原子递增，并发记录不会互相覆盖），最后穿着日期取较晚的一个，
+        与会话中其他未提交的修改一起提交。穿搭记录也通过这里更新穿着信息
+        """
+        worn_at = worn_at or datetime.now()
+        self.db.execute(
+            update(ClothingItem).where(ClothingItem.id.in_(item_ids)).values(
+                wear_count=func.coalesce(ClothingItem.wear_count, 0) + 1,
+                last_worn_date=func.max(func.coalesce(ClothingItem.last_worn_date, worn_at), worn_at)
+            ),
+            execution_options={"synchronize_session": False}
+        )
+        self.db.commit()
+        # 已加载到会话中的对象不再与数据库一致
+        self.db.expire_all()
+        # 穿着信息不影响快照和关系图，只递增版本号
+        self._after_bulk_write()
+    
+    # ==================== 批量操作 ====================
+    # 批量操作按ID列表或筛选条件选中衣服，用一条集合式 UPDATE/DELETE 完成修改，
+    # 计数器增量、标签同步与修改在同一个事务中提交，返回每个ID的处理结果
+    
+    # 计数器、快照和删除图片需要的列（只投影这些列，不实例化ORM对象）
+    _BULK_COLUMNS = (
+        ClothingItem.id, ClothingItem.category, ClothingItem.color, ClothingItem.style,
+        ClothingItem.is_favorite, ClothingItem.is_archived,
+        ClothingItem.original_path, ClothingItem.transparent_path
+    )
+    
+    def _bulk_targets(self, ids: Optional[List[int]],
+                      filters: Optional[Dict[str, Any]]) -> Tuple[list, List[int]]:
+        """解析批量操作的目标，返回 (选中的记录, 不存在的ID)"""
+        query = self.db.query(*self._BULK_COLUMNS)
+        if ids is not None:
+            requested = list(dict.fromkeys(ids))
+            rows = query.filter(ClothingItem.id.in_(requested)).all() if requested else []
+            found = {row.id for row in rows}
+            return rows, [item_id for item_id in requested if item_id not in found]
         
-        # 按类别统计
-        from sqlalchemy import func
-        category_stats = self.db.query(
-            ClothingItem.category,
-            func.count(ClothingItem.id)
-        ).filter(ClothingItem.is_archived == False).group_by(ClothingItem.category).all()
+        filters = dict(filters or {})
+        search = filters.pop("search", None)
+        query = query.filter(*self._filter_conditions(**filters))
+        match = build_match_query(search) if search else None
+        if match:
+            query = query.filter(ClothingItem.id.in_(
+                select(literal_column("rowid")).select_from(table(SEARCH_TABLE)).where(
+                    text(f"{SEARCH_TABLE} MATCH :match").bindparams(match=match)
+                )
+            ))
+        elif search:
+            query = query.filter(self._like_condition(search))
+        return query.order_by(ClothingItem.id).all(), []
+    
+    @staticmethod
+    def _bulk_results(rows: list, missing: List[int]) -> Dict[str, Any]:
+        results = [{"id": row.id, "success": True} for row in rows]
+        results.extend({"id": item_id, "success": False, "error": "衣服不存在"} for item_id in missing)
+        return {"affected": len(rows), "results": results}
+    
+    def _after_bulk_write(self, changed_ids: List[int] = (), deleted_ids: List[int] = (),
+                          paths: List[str] = ()):
+        """批量写入提交后的收尾：重新读取影响搭配的记录同步快照和关系图，版本号只递增一次"""
+        if changed_ids:
+            for item in self.db.query(ClothingItem).filter(ClothingItem.id.in_(changed_ids)):
+                wardrobe_snapshot.upsert(item)
+        for item_id in deleted_ids:
+            wardrobe_snapshot.discard(item_id)
+        graph_ids = list(changed_ids) + list(deleted_ids)
+        self._finish_write(graph_ids, paths)
+    
+    def bulk_update(self, data: Dict[str, Any], ids: Optional[List[int]] = None,
+                    filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """批量更新字段（收藏、归档也通过 is_favorite / is_archived 字段批量设置），值为None的字段忽略"""
+        values = {key: value for key, value in data.items()
+                  if value is not None and key in ClothingItem.__table__.columns}
+        rows, missing = self._bulk_targets(ids, filters)
+        if not rows or not values:
+            return self._bulk_results(rows, missing)
         
-        # 最近穿着
-        recently_worn = self.db.query(ClothingItem).filter(
-            ClothingItem.last_worn_date != None
-        ).order_by(ClothingItem.last_worn_date.desc()).limit(5).all()
+        target_ids = [row.id for row in rows]
+        before: Counter = Counter()
+        after: Counter = Counter()
+        for row in rows:
+            before.update(wardrobe_counters.contributions(row))
+            after.update(wardrobe_counters.contributions(SimpleNamespace(**{**row._asdict(), **values})))
         
-        # 从未穿过 (超过30天)
-        from datetime import timedelta
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        never_worn = self.db.query(ClothingItem).filter(
-            or_(
-                ClothingItem.last_worn_date == None,
-                ClothingItem.last_worn_date < thirty_days_ago
-            ),
-            ClothingItem.is_archived == False
-        ).count()
+        values["updated_at"] = datetime.now()
+        self.db.execute(
+            update(ClothingItem).where(ClothingItem.id.in_(target_ids)).values(**values),
+            execution_options={"synchronize_session": False}
+        )
+        tag_fields = [field for field in TAG_FIELDS if field in values]
+        if tag_fields:
+            self.db.execute(delete(ClothingTag).where(
+                ClothingTag.item_id.in_(target_ids), ClothingTag.field.in_(tag_fields)
+            ))
+            tags = [{"item_id": item_id, "field": field, "value": value}
+                    for field in tag_fields for value in as_tag_list(values[field])
+                    for item_id in target_ids]
+            if tags:
+                self.db.execute(insert(ClothingTag), tags)
+        if SEARCH_FIELDS & values.keys():
+            reindex_items(self.db, target_ids)
+        wardrobe_counters.apply(self.db, before, after)
+        self.db.commit()
+        # 已加载到会话中的对象不再与数据库一致
+        self.db.expire_all()
         
-        return {
-            "total_items": total,
-            "favorites": favorites,
-            "category_distribution": {cat: count for cat, count in category_stats if cat},
-            "recently_worn": [item.to_dict() for item in recently_worn],
-            "never_worn_count": never_worn
-        }
+        affects_snapshot = bool(SNAPSHOT_FIELDS & values.keys())
+        self._after_bulk_write(changed_ids=target_ids if affects_snapshot else [])
+        return self._bulk_results(rows, missing)
+    
+    def bulk_record_wear(self, ids: Optional[List[int]] = None,
+                         filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """批量记录穿着（穿着次数在数据库中原子递增）"""
+        rows, missing = self._bulk_targets(ids, filters)
+        if rows:
+            self.commit_wear([row.id for row in rows])
+        return self._bulk_results(rows, missing)
+    
+    def bulk_delete(self, ids: Optional[List[int]] = None,
+                    filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """批量删除衣服，记录提交后统一删除图片文件及缩略图"""
+        rows, missing = self._bulk_targets(ids, filters)
+        if not rows:
+            return self._bulk_results(rows, missing)
+        
+        target_ids = [row.id for row in rows]
+        removed: Counter = Counter()
+        for row in rows:
+            removed.update(wardrobe_counters.contributions(row))
+        self.db.execute(delete(ClothingTag).where(ClothingTag.item_id.in_(target_ids)))
+        self.db.execute(
+            delete(ClothingItem).where(ClothingItem.id.in_(target_ids)),
+            execution_options={"synchronize_session": False}
+        )
+        wardrobe_counters.apply(self.db, removed, Counter())
+        self.db.commit()
+        self.db.expire_all()
+        
+        # 数据库删除成功后再删文件，事务失败时不会留下缺图的记录
+        paths = [path for row in rows for path in (row.original_path, row.transparent_path) if path]
+        self._after_bulk_write(deleted_ids=target_ids, paths=paths)
+        return self._bulk_results(rows, missing)
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取衣柜统计信息（读增量维护的计数器，不扫描衣服表）"""
+        return wardrobe_counters.statistics(self.db)
+    
+    def get_filter_options(self) -> Dict[str, List[str]]:
+        """获取所有筛选选项（读增量维护的筛选项字典）"""
+        return wardrobe_counters.facets(self.db)
     
     def get_categories(self) -> List[str]:
         """获取所有服装类别"""
-        from sqlalchemy import distinct
-        result = self.db.query(distinct(ClothingItem.category)).all()
-        return [r[0] for r in result if r[0]]
+        return self.get_filter_options()["categories"]
     
     def get_colors(self) -> List[str]:
         """获取所有颜色"""
-        from sqlalchemy import distinct
-        result = self.db.query(distinct(ClothingItem.color)).all()
-        return [r[0] for r in result if r[0]]
+        return self.get_filter_options()["colors"]
     
     def get_styles(self) -> List[str]:
         """获取所有风格"""
-        # style是JSON数组，需要遍历所有记录提取唯一值
-        items = self.db.query(ClothingItem.style).all()
-        styles = set()
-        for item in items:
-            if item[0]:
-                for style in item[0]:
-                    styles.add(style)
-        return sorted(list(styles))
+        return self.get_filter_options()["styles"]
 
 
 def save_uploaded_image(file_content: bytes, original_filename: str) -> str:
     """
-    保存上传的图片，返回保存路径
+    保存上传的图片（规范化为母版后保存），返回保存路径
     """
-    # 生成唯一文件名
     ext = os.path.splitext(original_filename)[1].lower()
     if ext not in ALLOWED_EXTENSIONS:
         raise ValueError(f"不支持的文件格式: {ext}")
     
-    unique_filename = f"{uuid.uuid4().hex}{ext}"
+    # 摆正方向、缩小尺寸、重新压缩，扩展名以实际保存的格式为准
+    normalized = normalize_image(file_content)
+    
+    # 生成唯一文件名
+    unique_filename = f"{uuid.uuid4().hex}{normalized.ext}"
     save_path = IMAGES_DIR / unique_filename
     
     with open(save_path, 'wb') as f:
-        f.write(file_content)
+        f.write(normalized.data)
     
     return str(save_path)
\ No newline at end of file
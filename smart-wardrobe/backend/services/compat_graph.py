@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+搭配关系图
+为每件未归档的衣服、在它需要搭配的每个类别中，预先算好匹配分数最高的前N件（评分规则同
+OutfitService._calculate_match_score，季节取基础衣服的第一个季节），保存在 compat_edges 表中。
+单品推荐直接按名次读取，不再扫描整个类别；衣服新增、修改、归档、删除后由后台线程增量更新受影响的列表，
+scripts/rebuild_compat_graph.py 整体重建
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from backend.config import COMPAT_GRAPH_TOP_N, COMPAT_GRAPH_INCREMENTAL_MAX
+from backend.models.database import SessionLocal, ReadSessionLocal, CompatEdge
+from backend.services.wardrobe_version import wardrobe_version
+from backend.services.wardrobe_snapshot import wardrobe_snapshot, ItemFeatures
+from backend.services.outfit_scoring import DRESS_KEYWORDS, FeatureArrays, arrays_for
+
+# 浮点比较容差：候选分数与列表最低分相等时也合并，由排序决定名次
+_EPSILON = 1e-9
+
+
+def default_season(features: ItemFeatures) -> Optional[str]:
+    """关系图使用的季节：与单品推荐未指定季节时相同，取基础衣服的第一个季节"""
+    season = features.season
+    return season[0] if season else None
+
+
+def graph_key(features: Optional[ItemFeatures]) -> Optional[tuple]:
+    """影响关系图的特征（场合在查询时过滤，不影响关系图）"""
+    if features is None:
+        return None
+    return (features.category, features.type, features.color_id, features.style_ids, features.season_ids)
+
+
+class CompatGraph:
+    """
+    搭配关系图
+    列表与现场扫描的排序一致（分数降序，同分按ID升序），因此前N名与扫描结果完全相同；
+    查询条件（另选季节、场合过滤后不足）超出预存范围时由调用方回退到扫描。
+    写入衣服后调用 schedule() 登记变化的衣服，由后台线程合并后更新，写请求不等待关系图；
+    更新完成前查询读到的是旧列表（已删除、归档的衣服由快照过滤掉），完成后递增衣柜版本，
+    之前缓存的推荐结果随之失效。应用关闭时由 main.py 的 lifespan 调用 shutdown() 处理剩余的更新
+    """
+
+    def __init__(self, top_n: int = COMPAT_GRAPH_TOP_N, incremental_max: int = COMPAT_GRAPH_INCREMENTAL_MAX):
+        self.top_n = max(1, top_n)
+        self.incremental_max = max(1, incremental_max)
+        self._lock = threading.Lock()
+        # 串行化更新，shutdown 时与后台线程的更新不交错
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        # 等待更新的衣服ID
+        self._pending: Set[int] = set()
+
+    @staticmethod
+    def _service(db: Session):
+        # 评分规则和搭配类别定义在 OutfitService 中（它也依赖本模块做查询）
+        from backend.services.outfit_service import OutfitService
+        return OutfitService(db)
+
+    def _rank(self, service, base: ItemFeatures, category: str) -> Tuple[List[int], List[float]]:
+        return service._rank_candidates(category, base.color, base.style, default_season(base),
+                                        None, [base.id], self.top_n)
+
+    @staticmethod
+    def _rows(base_id: int, category: str, ids: List[int], scores: List[float]) -> List[dict]:
+        return [{"item_id": base_id, "category": category, "rank": rank, "partner_id": partner_id, "score": score}
+                for rank, (partner_id, score) in enumerate(zip(ids, scores))]
+
+    def _insert(self, db: Session, rows: List[dict]):
+        if rows:
+            db.execute(CompatEdge.__table__.insert(), rows)
+
+    # ==================== 查询 ====================
+
+    def lookup(self, db: Session, base_id: int, category: str, limit: int,
+               occasion: Optional[str] = None) -> Optional[List[int]]:
+        """
+        按名次读取搭配，返回至多limit个衣服ID。
+        预存的列表不足以确定结果时（按场合过滤后不够、或关系图中没有这件衣服）返回None
+        """
+        query = db.query(CompatEdge.partner_id).filter(
+            CompatEdge.item_id == base_id, CompatEdge.category == category
+        ).order_by(CompatEdge.rank)
+        rows = [partner_id for (partner_id,) in (query.all() if occasion else query.limit(limit))]
+        if not rows:
+            return None
+        partners = []
+        for partner_id in rows:
+            features = wardrobe_snapshot.get(partner_id)
+            if features is not None and (not occasion or features.has_occasion(occasion)):
+                partners.append(partner_id)
+        if len(partners) >= limit:
+            return partners[:limit]
+        # 已读完整个列表且列表未截断（少于N件）时，列表就是全部候选，不足limit也是准确结果
+        fetched_all = bool(occasion) or len(rows) < limit
+        if fetched_all and len(rows) < self.top_n:
+            return partners
+        return None
+
+    # ==================== 维护 ====================
+
+    def _all_rows(self) -> List[dict]:
+        """按快照计算全部列表（只做计算，不访问数据库）"""
+        service = self._service(None)
+        rows = []
+        for base in wardrobe_snapshot.items():
+            for category in service._get_needed_categories(base.category, base.type):
+                rows.extend(self._rows(base.id, category, *self._rank(service, base, category)))
+        return rows
+
+    def _replace_all(self, db: Session, rows: List[dict]):
+        db.execute(CompatEdge.__table__.delete())
+        self._insert(db, rows)
+
+    def rebuild(self, db: Session) -> int:
+        """从快照整体重建关系图（不提交），返回边数"""
+        wardrobe_snapshot.ensure_loaded(db)
+        rows = self._all_rows()
+        self._replace_all(db, rows)
+        return len(rows)
+
+    def schedule(self, item_ids: Iterable[int]):
+        """登记写入已提交、快照已同步的衣服，由后台线程更新关系图（不访问数据库，立即返回）"""
+        with self._lock:
+            size = len(self._pending)
+            self._pending.update(item_ids)
+            if len(self._pending) == size:
+                return
+            self._ensure_started()
+        self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stopping:
+            return
+        self._thread = threading.Thread(target=self._run, name="compat-graph", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        更新登记的衣服，返回处理的衣服数。
+        更新：这些衣服自己的列表、列表中含有它们的列表、它们新进入前N名的列表；
+        一次超过 incremental_max 件时整体重建，计算期间不占用写连接，只在替换整张表时写库
+        """
+        with self._flush_lock:
+            with self._lock:
+                changed, self._pending = self._pending, set()
+            if not changed:
+                return 0
+            # 快照通过只读连接加载，不能在持有写连接时加载（见 WardrobeSnapshot.load）
+            with ReadSessionLocal() as db:
+                wardrobe_snapshot.ensure_loaded(db)
+            rows = self._all_rows() if len(changed) > self.incremental_max else None
+            db = SessionLocal()
+            try:
+                if rows is None:
+                    self._update(db, changed)
+                else:
+                    self._replace_all(db, rows)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"更新搭配关系图失败，可运行 scripts/rebuild_compat_graph.py 重建: {e}")
+                return 0
+            finally:
+                db.close()
+        # 之前按旧关系图缓存的推荐结果失效
+        wardrobe_version.bump()
+        return len(changed)
+
+    def shutdown(self, timeout: float = 30.0):
+        """停止后台线程并处理剩余的更新（应用关闭时调用）"""
+        with self._lock:
+            self._stopping = True
+            thread, self._thread = self._thread, None
+        self._wakeup.set()
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+        with self._lock:
+            self._stopping = False
+
+    def _update(self, db: Session, changed: Set[int]):
+        service = self._service(db)
+        table = CompatEdge.__table__
+
+        # 这些衣服自己的列表
+        db.execute(table.delete().where(table.c.item_id.in_(changed)))
+        active = [features for features in map(wardrobe_snapshot.get, sorted(changed)) if features is not None]
+        rows = []
+        for base in active:
+            for category in service._get_needed_categories(base.category, base.type):
+                rows.extend(self._rows(base.id, category, *self._rank(service, base, category)))
+
+        # 受影响的列表：含有这些衣服的（可能被删除、归档或分数变化），以及它们可能新进入的
+        affected: Dict[str, Set[int]] = {}
+        for base_id, category in db.query(CompatEdge.item_id, CompatEdge.category).filter(
+            CompatEdge.partner_id.in_(changed), CompatEdge.item_id.notin_(changed)
+        ).distinct():
+            affected.setdefault(category, set()).add(base_id)
+
+        # 发生变化的衣服作为候选时，对全部基础衣服一次性向量化打分
+        bases = arrays_for("*", wardrobe_snapshot.items())
+        base_seasons = np.fromiter((r.season_ids[0] if r.season_ids else -1 for r in bases.records),
+                                   dtype=np.int64, count=len(bases))
+        needs = self._needs_masks(service, bases)
+        members: Dict[str, List[Tuple[int, np.ndarray, np.ndarray]]] = {}
+        for member in active:
+            eligible = needs.get(member.category)
+            if eligible is None or not self._eligible(member, member.category, None):
+                continue
+            eligible = eligible & (bases.ids != member.id) & ~np.isin(bases.ids, list(changed))
+            eligible &= (base_seasons < 0) | np.isin(base_seasons, member.season_ids)
+            scores = service.scorer.candidate_scores(member, bases, base_seasons)
+            members.setdefault(member.category, []).append((member.id, eligible, scores))
+
+        for category, entries in members.items():
+            best = np.full(len(bases), -np.inf)
+            for _, eligible, scores in entries:
+                best = np.where(eligible, np.maximum(best, scores), best)
+            candidates = np.flatnonzero((best > -np.inf) & ~np.isin(bases.ids, list(affected.get(category, ()))))
+            if not len(candidates):
+                continue
+            # 只读这些基础衣服列表中的第N名：没有第N名（列表未满）或分数不低于它时会进入
+            candidate_ids = bases.ids[candidates].tolist()
+            floors = dict(db.query(CompatEdge.item_id, CompatEdge.score).filter(
+                CompatEdge.category == category, CompatEdge.rank == self.top_n - 1,
+                CompatEdge.item_id.in_(candidate_ids)
+            ))
+            floor = np.fromiter((floors.get(base_id, -np.inf) for base_id in candidate_ids),
+                                dtype=np.float64, count=len(candidate_ids))
+            entering = best[candidates] >= floor - _EPSILON
+            affected.setdefault(category, set()).update(bases.ids[candidates[entering]].tolist())
+
+        # 在原列表上合并新分数；原列表已满且有成员离开时缺少第N+1名，重新扫描
+        for category, base_ids in affected.items():
+            current: Dict[int, List[Tuple[float, int]]] = {base_id: [] for base_id in base_ids}
+            for base_id, partner_id, score in db.query(
+                CompatEdge.item_id, CompatEdge.partner_id, CompatEdge.score
+            ).filter(CompatEdge.category == category, CompatEdge.item_id.in_(base_ids)).order_by(
+                CompatEdge.item_id, CompatEdge.rank
+            ):
+                current[base_id].append((score, partner_id))
+            db.execute(table.delete().where(table.c.category == category, table.c.item_id.in_(base_ids)))
+            positions = {int(bases.ids[i]): i for i in np.flatnonzero(np.isin(bases.ids, list(base_ids)))}
+            for base_id in sorted(base_ids):
+                base = wardrobe_snapshot.get(base_id)
+                if base is None or base_id not in positions:
+                    continue
+                entries = current[base_id]
+                kept = [(score, partner_id) for score, partner_id in entries if partner_id not in changed]
+                if len(entries) >= self.top_n and len(kept) < len(entries):
+                    rows.extend(self._rows(base_id, category, *self._rank(service, base, category)))
+                    continue
+                i = positions[base_id]
+                merged = sorted(kept + [(float(scores[i]), member_id)
+                                        for member_id, eligible, scores in members.get(category, ())
+                                        if eligible[i]],
+                                key=lambda entry: (-entry[0], entry[1]))[:self.top_n]
+                rows.extend(self._rows(base_id, category, [partner_id for _, partner_id in merged],
+                                       [score for score, _ in merged]))
+        self._insert(db, rows)
+
+    @staticmethod
+    def _needs_masks(service, bases: FeatureArrays) -> Dict[str, np.ndarray]:
+        """每个类别 -> 哪些基础衣服需要搭配该类别（按 类别+类型 的组合只判断一次）"""
+        groups: Dict[tuple, int] = {}
+        group_ids = np.fromiter((groups.setdefault((r.category, r.type), len(groups)) for r in bases.records),
+                                dtype=np.int64, count=len(bases))
+        masks: Dict[str, np.ndarray] = {}
+        for (category, type_), group_id in groups.items():
+            for needed in service._get_needed_categories(category, type_):
+                masks.setdefault(needed, np.zeros(len(groups), dtype=bool))[group_id] = True
+        return {category: mask[group_ids] for category, mask in masks.items()}
+
+    @staticmethod
+    def _eligible(features: ItemFeatures, category: str, season: Optional[str]) -> bool:
+        """候选过滤条件，与 OutfitService._rank_candidates 一致"""
+        if category == "裙子" and (not features.type or any(k in features.type for k in DRESS_KEYWORDS)):
+            return False
+        return not season or features.has_season(season)
+
+
+# 单例实例
+compat_graph = CompatGraph()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+派生图片缓存
+按宽度档位和浏览器支持的格式（AVIF/WebP）生成缩略图，只生成一次，
+保存在按哈希分片的缓存目录中
+"""
+import hashlib
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from PIL import Image, ImageOps
+
+from backend.config import DERIVATIVES_DIR, IMAGE_WIDTH_PRESETS
+
+Image.init()
+
+# 格式 -> (Pillow格式名, 扩展名, MIME类型, 保存参数)
+_FORMATS = {
+    "avif": ("AVIF", ".avif", "image/avif", {"quality": 60}),
+    "webp": ("WEBP", ".webp", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", ".jpg", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+    "png": ("PNG", ".png", "image/png", {"optimize": True}),
+}
+
+# 当前Pillow能编码的格式（AVIF需要插件或较新版本的Pillow）
+SUPPORTED_FORMATS = {name for name, (pil_format, *_) in _FORMATS.items() if pil_format in Image.SAVE}
+
+
+class Derivative(NamedTuple):
+    """一张派生图片"""
+    path: Path
+    media_type: str
+    etag: str
+
+
+def snap_width(width: int) -> int:
+    """取不小于请求宽度的最近档位，超过最大档位时取最大档位"""
+    for preset in IMAGE_WIDTH_PRESETS:
+        if width <= preset:
+            return preset
+    return IMAGE_WIDTH_PRESETS[-1]
+
+
+def negotiate_format(accept: Optional[str]) -> Optional[str]:
+    """根据 Accept 头选择现代格式，都不支持时返回None（沿用原图格式）"""
+    accept = accept or ""
+    for name in ("avif", "webp"):
+        if name in SUPPORTED_FORMATS and f"image/{name}" in accept:
+            return name
+    return None
+
+
+def file_etag(path: str, variant: str = "") -> str:
+    """由文件路径、修改时间和大小生成ETag"""
+    stat = os.stat(path)
+    raw = f"{path}|{stat.st_mtime_ns}|{stat.st_size}|{variant}"
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+class DerivativeCache:
+    """
+    派生图片缓存
+    缓存文件名由原图路径+宽度+格式哈希得到，按哈希前缀分两级目录存放；
+    同一张派生图由分段锁保证只生成一次，写入临时文件后原子替换，
+    原图比缓存新时重新生成
+    """
+
+    def __init__(self, root: Path = DERIVATIVES_DIR, lock_stripes: int = 64):
+        self.root = Path(root)
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+
+    def _path_for(self, source_path: str, width: int, fmt: str) -> Path:
+        key = hashlib.sha1(f"{source_path}|{width}|{fmt}".encode("utf-8")).hexdigest()
+        return self.root / key[:2] / key[2:4] / f"{key}{_FORMATS[fmt][1]}"
+
+    def get(self, source_path: str, width: int, fmt: Optional[str] = None) -> Derivative:
+        """获取（必要时生成）派生图片，fmt为None时按原图是否透明选择PNG或JPEG"""
+        if fmt is None:
+            fmt = self._fallback_format(source_path)
+        path = self._path_for(source_path, width, fmt)
+        source_mtime = os.stat(source_path).st_mtime_ns
+
+        if not self._is_fresh(path, source_mtime):
+            lock = self._locks[hash(path.name) % len(self._locks)]
+            with lock:
+                # 拿到锁后再检查一次，其他请求可能已经生成好了
+                if not self._is_fresh(path, source_mtime):
+                    self._render(source_path, width, fmt, path)
+
+        return Derivative(path, _FORMATS[fmt][2], file_etag(str(path)))
+
+    @staticmethod
+    def _is_fresh(path: Path, source_mtime: int) -> bool:
+        try:
+            return path.stat().st_mtime_ns >= source_mtime
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _fallback_format(source_path: str) -> str:
+        with Image.open(source_path) as image:
+            has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        return "png" if has_alpha else "jpeg"
+
+    def _render(self, source_path: str, width: int, fmt: str, path: Path):
+        pil_format, _, _, options = _FORMATS[fmt]
+        with Image.open(source_path) as image:
+            if image.format == "JPEG":
+                image.draft("RGB", (width, width * 4))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((width, width * 4), Image.LANCZOS)
+            if fmt == "jpeg":
+                image = image.convert("RGB")
+            elif image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+            try:
+                image.save(tmp_path, pil_format, **options)
+                os.replace(tmp_path, path)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+
+    def discard(self, source_path: Optional[str]):
+        """删除某张原图的所有派生图片"""
+        if not source_path:
+            return
+        for width in IMAGE_WIDTH_PRESETS:
+            for fmt in _FORMATS:
+                path = self._path_for(source_path, width, fmt)
+                if path.exists():
+                    path.unlink()
+
+
+# 单例实例
+derivative_cache = DerivativeCache()
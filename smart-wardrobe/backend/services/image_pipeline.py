@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+图片规范化
+上传时把手机原图统一处理为一份规范母版：按EXIF方向摆正、缩小到最长边上限、重新压缩，
+存储和AI分类都使用这份母版
+"""
+import io
+import math
+from typing import NamedTuple, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from backend.config import IMAGE_MAX_EDGE, IMAGE_JPEG_QUALITY, IMAGE_RECOMPRESS_THRESHOLD
+
+# EXIF 方向标签；5-8 表示需要旋转90/270度（宽高互换）
+_ORIENTATION = 0x0112
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# 格式 -> (扩展名, MIME类型)，其余格式统一转为JPEG
+_FORMATS = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "PNG": (".png", "image/png"),
+    "WEBP": (".webp", "image/webp"),
+}
+
+
+class NormalizedImage(NamedTuple):
+    """规范化后的图片"""
+    data: bytes
+    ext: str
+    mime_type: str
+    width: int
+    height: int
+
+
+def draft_size(width: int, height: int, orientation: int, max_edge: int) -> Tuple[int, int]:
+    """
+    JPEG draft 模式的目标尺寸：摆正后按比例缩到最长边 max_edge 的大小，换回文件中存储的方向。
+    draft 选择宽高都不小于目标的最大2的幂次缩小，传正方形时较短边会阻止缩小
+    """
+    transposed = orientation in _TRANSPOSED_ORIENTATIONS
+    display_width, display_height = (height, width) if transposed else (width, height)
+    scale = max_edge / max(display_width, display_height)
+    target = (math.ceil(display_width * scale), math.ceil(display_height * scale))
+    return (target[1], target[0]) if transposed else target
+
+
+def normalize_image(content: bytes, max_edge: int = IMAGE_MAX_EDGE,
+                    quality: int = IMAGE_JPEG_QUALITY) -> NormalizedImage:
+    """
+    规范化图片
+    - JPEG 先用 draft 模式按2的幂次缩小解码，大图只解码需要的分辨率
+    - 按EXIF方向旋转，去掉方向标记
+    - 最长边缩小到 max_edge 以内
+    - 带透明通道的保存为PNG，其余重新压缩为JPEG
+    尺寸、方向都已合规且文件不大的图片原样返回，避免重复压缩损失画质。
+    无法识别的图片抛出 ValueError
+    """
+    try:
+        image = Image.open(io.BytesIO(content))
+        image_format = image.format
+        width, height = image.size
+        orientation = image.getexif().get(_ORIENTATION, 1)
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError("无法识别的图片文件") from e
+    except Image.DecompressionBombError as e:
+        raise ValueError("图片像素过多") from e
+
+    if (image_format in _FORMATS and max(width, height) <= max_edge and orientation == 1
+            and len(content) <= IMAGE_RECOMPRESS_THRESHOLD):
+        ext, mime_type = _FORMATS[image_format]
+        return NormalizedImage(content, ext, mime_type, width, height)
+
+    try:
+        if image_format == "JPEG" and max(width, height) > max_edge:
+            image.draft("RGB", draft_size(width, height, orientation, max_edge))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        output = io.BytesIO()
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if has_alpha:
+            image.save(output, "PNG", optimize=True)
+            ext, mime_type = _FORMATS["PNG"]
+        else:
+            image.convert("RGB").save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+            ext, mime_type = _FORMATS["JPEG"]
+    except (OSError, ValueError) as e:
+        raise ValueError("无法识别的图片文件") from e
+    except Image.DecompressionBombError as e:
+        raise ValueError("图片像素过多") from e
+
+    return NormalizedImage(output.getvalue(), ext, mime_type, image.width, image.height)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+穿搭记录服务
+记录每天穿了哪些衣服：写入记录的同时在同一个事务中更新这些衣服的穿着次数和最后穿着日期；
+按日期区间和按单品查询历史都走索引并使用游标翻页，记录多年后依然很快
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from backend.models.database import ClothingItem, OutfitRecord, OutfitRecordItem
+from backend.services.clothing_service import ClothingService, decode_cursor, encode_cursor
+
+# 记录中可修改的字段（clothing_ids 和日期只在创建时设置）
+RECORD_FIELDS = ("outfit_name", "weather", "temperature", "occasion", "mood", "rating", "notes")
+
+
+class OutfitLogService:
+    """穿搭记录服务"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        # 穿着次数经由衣服服务更新，与单独记录穿着共用提交后的收尾
+        self.clothing = ClothingService(db)
+
+    def create(self, data: Dict[str, Any]) -> OutfitRecord:
+        """
+        记录一套穿搭，clothing_ids 中的衣服穿着次数各加一，最后穿着日期取较晚的一个（补记以前的穿搭不会让日期倒退）。
+        有不存在的衣服时抛出 ValueError，不写入任何数据
+        """
+        clothing_ids = list(dict.fromkeys(int(item_id) for item_id in data.get("clothing_ids") or []))
+        if not clothing_ids:
+            raise ValueError("请选择穿搭中的衣服")
+        found = {item_id for (item_id,) in self.db.query(ClothingItem.id).filter(ClothingItem.id.in_(clothing_ids))}
+        missing = [item_id for item_id in clothing_ids if item_id not in found]
+        if missing:
+            raise ValueError(f"衣服不存在: {', '.join(str(item_id) for item_id in missing)}")
+
+        worn_at = data.get("date") or datetime.now()
+        record = OutfitRecord(
+            date=worn_at,
+            clothing_ids=clothing_ids,
+            **{field: data.get(field) for field in RECORD_FIELDS}
+        )
+        record.sync_items()
+        self.db.add(record)
+        # 记录与穿着次数在同一个事务中提交
+        self.clothing.commit_wear(clothing_ids, worn_at)
+        self.db.refresh(record)
+        return record
+
+    def get_by_id(self, record_id: int) -> Optional[OutfitRecord]:
+        """根据ID获取穿搭记录"""
+        return self.db.query(OutfitRecord).filter(OutfitRecord.id == record_id).first()
+
+    def update(self, record_id: int, data: Dict[str, Any]) -> Optional[OutfitRecord]:
+        """修改穿搭记录的描述信息（名称、天气、心情、评分等）"""
+        record = self.get_by_id(record_id)
+        if not record:
+            return None
+        for field in RECORD_FIELDS:
+            if data.get(field) is not None:
+                setattr(record, field, data[field])
+        self.db.commit()
+        self.db.refresh(record)
+        return record
+
+    def delete(self, record_id: int) -> bool:
+        """删除穿搭记录（已累加到衣服上的穿着次数不回退）"""
+        record = self.get_by_id(record_id)
+        if not record:
+            return False
+        self.db.delete(record)
+        self.db.commit()
+        return True
+
+    def list_records(self, start: Optional[date] = None, end: Optional[date] = None,
+                     cursor: Optional[str] = None, limit: int = 50) -> Tuple[List[OutfitRecord], Optional[str]]:
+        """
+        按日期倒序列出穿搭记录，start/end 为包含两端的日期区间。
+        返回 (记录, 下一页游标)，走 outfit_records 的日期索引
+        """
+        query = self.db.query(OutfitRecord)
+        if start:
+            query = query.filter(OutfitRecord.date >= datetime.combine(start, time.min))
+        if end:
+            query = query.filter(OutfitRecord.date < datetime.combine(end + timedelta(days=1), time.min))
+        if cursor:
+            query = query.filter(tuple_(OutfitRecord.date, OutfitRecord.id) < tuple_(*decode_cursor(cursor)))
+        records = query.order_by(OutfitRecord.date.desc(), OutfitRecord.id.desc()).limit(limit).all()
+        return records, self._next_cursor(records, limit)
+
+    def item_history(self, item_id: int, cursor: Optional[str] = None,
+                     limit: int = 50) -> Tuple[List[OutfitRecord], Optional[str]]:
+        """某件衣服的穿搭历史（日期倒序），先在关联表的 (item_id, date) 索引上取一页，再按ID取记录"""
+        links = self.db.query(OutfitRecordItem.record_id).filter(OutfitRecordItem.item_id == item_id)
+        if cursor:
+            links = links.filter(
+                tuple_(OutfitRecordItem.date, OutfitRecordItem.record_id) < tuple_(*decode_cursor(cursor))
+            )
+        record_ids = [record_id for (record_id,) in links.order_by(
+            OutfitRecordItem.date.desc(), OutfitRecordItem.record_id.desc()
+        ).limit(limit)]
+        if not record_ids:
+            return [], None
+        records = self.db.query(OutfitRecord).filter(OutfitRecord.id.in_(record_ids)).all()
+        records.sort(key=lambda record: (record.date, record.id), reverse=True)
+        return records, self._next_cursor(records, limit)
+
+    @staticmethod
+    def _next_cursor(records: List[OutfitRecord], limit: int) -> Optional[str]:
+        if len(records) == limit and records[-1].date:
+            return encode_cursor(records[-1], "date")
+        return None
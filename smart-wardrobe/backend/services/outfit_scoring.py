@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+向量化搭配评分
+把快照中的特征整理成NumPy数组（颜色ID、风格/季节/场合位掩码），
+一次性为整批候选衣服或整批搭配组合打分。
+评分规则与 OutfitService._calculate_match_score / _calculate_outfit_score 逐位一致
+"""
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.services.wardrobe_snapshot import COLORS, STYLES, SEASONS, OCCASIONS, ItemFeatures, Vocabulary
+
+DRESS_KEYWORDS = ("连衣裙", "长裙")
+
+
+def _mask_width(vocab: Vocabulary) -> int:
+    """位掩码需要的64位字数"""
+    return max(1, (len(vocab) + 63) // 64)
+
+
+def ids_to_mask(ids: Sequence[int], width: int) -> np.ndarray:
+    """把一组ID编码为位掩码（超出宽度的ID不可能出现在候选中，直接忽略）"""
+    mask = np.zeros(width, dtype=np.uint64)
+    for value_id in ids:
+        if 0 <= value_id < width * 64:
+            mask[value_id >> 6] |= np.uint64(1 << (value_id & 63))
+    return mask
+
+
+def _pack_masks(id_tuples: Sequence[Tuple[int, ...]], width: int) -> np.ndarray:
+    masks = np.zeros((len(id_tuples), width), dtype=np.uint64)
+    for row, ids in enumerate(id_tuples):
+        for value_id in ids:
+            masks[row, value_id >> 6] |= np.uint64(1 << (value_id & 63))
+    return masks
+
+
+def _popcount(masks: np.ndarray) -> np.ndarray:
+    """按最后一维统计置位数"""
+    return np.bitwise_count(masks).sum(axis=-1, dtype=np.int64)
+
+
+def _pad(masks: np.ndarray, width: int) -> np.ndarray:
+    if masks.shape[-1] == width:
+        return masks
+    pad = [(0, 0)] * (masks.ndim - 1) + [(0, width - masks.shape[-1])]
+    return np.pad(masks, pad)
+
+
+class FeatureArrays:
+    """一批衣服特征的列式表示"""
+    __slots__ = ("records", "ids", "color_ids", "style_masks", "season_masks", "occasion_masks",
+                 "has_type", "is_dress")
+
+    def __init__(self, records, ids, color_ids, style_masks, season_masks, occasion_masks, has_type, is_dress):
+        self.records = records
+        self.ids = ids
+        self.color_ids = color_ids
+        self.style_masks = style_masks
+        self.season_masks = season_masks
+        self.occasion_masks = occasion_masks
+        self.has_type = has_type
+        self.is_dress = is_dress
+
+    @classmethod
+    def build(cls, records: List[ItemFeatures]) -> "FeatureArrays":
+        return cls(
+            records,
+            np.fromiter((r.id for r in records), dtype=np.int64, count=len(records)),
+            np.fromiter((r.color_id for r in records), dtype=np.int64, count=len(records)),
+            _pack_masks([r.style_ids for r in records], _mask_width(STYLES)),
+            _pack_masks([r.season_ids for r in records], _mask_width(SEASONS)),
+            _pack_masks([r.occasion_ids for r in records], _mask_width(OCCASIONS)),
+            np.fromiter((bool(r.type) for r in records), dtype=bool, count=len(records)),
+            np.fromiter((bool(r.type) and any(k in r.type for k in DRESS_KEYWORDS) for r in records),
+                        dtype=bool, count=len(records)),
+        )
+
+    def take(self, index) -> "FeatureArrays":
+        """按下标或布尔掩码取子集"""
+        index = np.flatnonzero(index) if getattr(index, "dtype", None) == bool else np.asarray(index, dtype=np.int64)
+        return FeatureArrays(
+            [self.records[i] for i in index],
+            self.ids[index],
+            self.color_ids[index],
+            self.style_masks[index],
+            self.season_masks[index],
+            self.occasion_masks[index],
+            self.has_type[index],
+            self.is_dress[index],
+        )
+
+    def has_season(self, season: str) -> np.ndarray:
+        return self._has(self.season_masks, SEASONS.lookup(season))
+
+    def has_occasion(self, occasion: str) -> np.ndarray:
+        return self._has(self.occasion_masks, OCCASIONS.lookup(occasion))
+
+    @staticmethod
+    def _has(masks: np.ndarray, value_id: int) -> np.ndarray:
+        if value_id < 0 or value_id >= masks.shape[1] * 64:
+            return np.zeros(len(masks), dtype=bool)
+        bit = np.uint64(1 << (value_id & 63))
+        return (masks[:, value_id >> 6] & bit) != 0
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+
+_ARRAY_CACHE: Dict[str, Tuple[list, FeatureArrays]] = {}
+_ARRAY_CACHE_LOCK = threading.Lock()
+
+
+def arrays_for(key: str, records: List[ItemFeatures]) -> FeatureArrays:
+    """
+    获取一组快照记录的列式表示
+    快照在内容变化时会换一个新的列表对象，据此判断缓存是否失效
+    """
+    cached = _ARRAY_CACHE.get(key)
+    if cached is not None and cached[0] is records:
+        return cached[1]
+    arrays = FeatureArrays.build(records)
+    with _ARRAY_CACHE_LOCK:
+        _ARRAY_CACHE[key] = (records, arrays)
+    return arrays
+
+
+class OutfitScorer:
+    """批量评分引擎"""
+
+    def __init__(self, color_rules: Dict[str, List[str]], style_rules: Dict[str, List[str]],
+                 season_rules: Dict[str, List[str]]):
+        self.color_rules = color_rules
+        self.style_rules = style_rules
+        self.season_rules = season_rules
+        self._color_tables: Optional[Tuple[int, np.ndarray, np.ndarray]] = None
+        self._lock = threading.Lock()
+
+    def color_tables(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        颜色矩阵（取值表增长时重建）
+        match[b, c]: 单品匹配的颜色得分；pair_ok[c1, c2]: 整套搭配中两色是否协调。
+        最后一行/列对应“无颜色”（ID为-1），取值为0
+        """
+        size = len(COLORS)
+        tables = self._color_tables
+        if tables is None or tables[0] != size:
+            with self._lock:
+                colors = COLORS.values[:size]
+                match = np.zeros((size + 1, size + 1), dtype=np.float64)
+                pair_ok = np.zeros((size + 1, size + 1), dtype=bool)
+                for b, base in enumerate(colors):
+                    match[b, :size] = self._color_row(base, colors)
+                    compatible = self.color_rules.get(base, [])
+                    pair_ok[b, :size] = [c in compatible or c == base for c in colors]
+                tables = (size, match, pair_ok)
+                self._color_tables = tables
+        return tables[1], tables[2]
+
+    def _color_row(self, base_color: str, colors: List[str]) -> List[float]:
+        compatible = self.color_rules.get(base_color, [])
+        return [0.4 if c in compatible else 0.2 if c == base_color else 0.1 for c in colors]
+
+    def _compatible_mask(self, rules: Dict[str, List[str]], keys: Sequence[str],
+                         vocab: Vocabulary, width: int) -> np.ndarray:
+        ids = [vocab.lookup(value) for key in keys for value in rules.get(key, [])]
+        return ids_to_mask(ids, width)
+
+    def match_scores(self, arrays: FeatureArrays, base_color: Optional[str],
+                     base_style: List[str], base_season: Optional[str]) -> np.ndarray:
+        """为一批候选衣服计算与基础衣服的匹配分数"""
+        score = np.zeros(len(arrays), dtype=np.float64)
+        if not len(arrays):
+            return score
+
+        # 颜色匹配 (权重: 40%)
+        if base_color:
+            base_id = COLORS.lookup(base_color)
+            match, _ = self.color_tables()
+            if 0 <= base_id < match.shape[0] - 1:
+                row = match[base_id]
+            else:
+                row = np.append(self._color_row(base_color, COLORS.values[:match.shape[0] - 1]), 0.0)
+            color_ids = np.where(arrays.color_ids < match.shape[0] - 1, arrays.color_ids, -1)
+            score = score + row[color_ids]
+
+        # 风格匹配 (权重: 40%)
+        if base_style:
+            width = arrays.style_masks.shape[1]
+            has_style = arrays.style_masks.any(axis=1)
+            base_mask = ids_to_mask([STYLES.lookup(s) for s in base_style], width)
+            matched = _popcount(arrays.style_masks & base_mask)
+            compatible = self._compatible_mask(self.style_rules, base_style, STYLES, width)
+            is_compatible = (arrays.style_masks & compatible).any(axis=1)
+            style_score = np.where(
+                matched > 0,
+                0.4 * matched / max(len(base_style), 1),
+                np.where(is_compatible, 0.2, 0.0)
+            )
+            score = score + np.where(has_style, style_score, 0.0)
+
+        # 季节匹配 (权重: 20%)
+        if base_season:
+            width = arrays.season_masks.shape[1]
+            has_season = arrays.season_masks.any(axis=1)
+            in_season = arrays.has_season(base_season)
+            compatible = self._compatible_mask(self.season_rules, [base_season], SEASONS, width)
+            is_compatible = (arrays.season_masks & compatible).any(axis=1)
+            season_score = np.where(in_season, 0.2, np.where(is_compatible, 0.1, 0.0))
+            score = score + np.where(has_season, season_score, 0.0)
+
+        return score
+
+    def candidate_scores(self, candidate: ItemFeatures, bases: FeatureArrays,
+                         base_seasons: np.ndarray) -> np.ndarray:
+        """
+        为一件候选衣服计算与一批基础衣服的匹配分数（match_scores 的转置，结果逐位一致）
+        base_seasons: 每件基础衣服使用的季节ID，-1表示不限季节
+        """
+        score = np.zeros(len(bases), dtype=np.float64)
+        if not len(bases):
+            return score
+
+        # 颜色匹配：无颜色的基础衣服/候选落在最后一行/列（取值为0）
+        match, _ = self.color_tables()
+        base_colors = np.where(bases.color_ids < match.shape[0] - 1, bases.color_ids, -1)
+        candidate_color = candidate.color_id if candidate.color_id < match.shape[0] - 1 else -1
+        score = score + match[base_colors, candidate_color]
+
+        # 风格匹配：反过来求"哪些风格的兼容列表包含候选的风格"
+        if candidate.style_ids:
+            width = bases.style_masks.shape[1]
+            has_style = bases.style_masks.any(axis=1)
+            matched = _popcount(bases.style_masks & ids_to_mask(candidate.style_ids, width))
+            accepting = ids_to_mask([STYLES.lookup(key) for key, values in self.style_rules.items()
+                                     if any(STYLES.lookup(v) in candidate.style_ids for v in values)], width)
+            is_compatible = (bases.style_masks & accepting).any(axis=1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                style_score = np.where(
+                    matched > 0,
+                    0.4 * matched / np.maximum(_popcount(bases.style_masks), 1),
+                    np.where(is_compatible, 0.2, 0.0)
+                )
+            score = score + np.where(has_style, style_score, 0.0)
+
+        # 季节匹配：按季节ID查表
+        if candidate.season_ids:
+            table = np.zeros(len(SEASONS) + 1, dtype=np.float64)
+            for season_id, season in enumerate(SEASONS.values[:len(SEASONS)]):
+                if season_id in candidate.season_ids:
+                    table[season_id] = 0.2
+                elif any(SEASONS.lookup(v) in candidate.season_ids for v in self.season_rules.get(season, [])):
+                    table[season_id] = 0.1
+            score = score + np.where(base_seasons >= 0, table[base_seasons], 0.0)
+
+        return score
+
+    def outfit_scores(self, slots: Sequence[Tuple[FeatureArrays, np.ndarray]],
+                      style_preference: Optional[List[str]]) -> np.ndarray:
+        """
+        为一批搭配组合计算整体分数
+        slots: 每个位置一个 (候选数组, 下标数组)，下标为-1表示该位置为空；
+        同一行的各位置按顺序组成一套搭配
+        """
+        count = len(slots[0][1]) if slots else 0
+        score = np.zeros(count, dtype=np.float64)
+        if not count:
+            return score
+
+        present = np.stack([index >= 0 for _, index in slots], axis=1)
+        safe = [np.where(index >= 0, index, 0) for _, index in slots]
+
+        # 检查颜色协调（按顺序两两比较）
+        _, pair_ok = self.color_tables()
+        none_color = pair_ok.shape[0] - 1
+        colors = np.stack([
+            np.where(present[:, k] & (arrays.color_ids[safe[k]] >= 0) & (arrays.color_ids[safe[k]] < none_color),
+                     arrays.color_ids[safe[k]], -1)
+            for k, (arrays, _) in enumerate(slots)
+        ], axis=1)
+        colored = colors >= 0
+        n_colors = colored.sum(axis=1)
+        color_score = np.zeros(count, dtype=np.int64)
+        for i in range(len(slots)):
+            for j in range(i + 1, len(slots)):
+                color_score += colored[:, i] & colored[:, j] & pair_ok[colors[:, i], colors[:, j]]
+        pairs = n_colors * (n_colors - 1) / 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = score + np.where(n_colors >= 2, color_score / pairs * 0.4, 0.0)
+
+        # 检查风格一致
+        style_width = max(arrays.style_masks.shape[1] for arrays, _ in slots)
+        seen = np.zeros((count, style_width), dtype=np.uint64)
+        repeated = np.zeros((count, style_width), dtype=np.uint64)
+        for k, (arrays, _) in enumerate(slots):
+            masks = np.where(present[:, k, None], _pad(arrays.style_masks, style_width)[safe[k]], np.uint64(0))
+            repeated |= seen & masks
+            seen |= masks
+        has_styles = seen.any(axis=1)
+        score = score + np.where(has_styles, np.minimum(_popcount(repeated) * 0.3, 0.4), 0.0)
+
+        # 风格偏好加分
+        if style_preference:
+            preference = ids_to_mask([STYLES.lookup(s) for s in style_preference], style_width)
+            score = score + np.where(has_styles, _popcount(seen & preference) * 0.1, 0.0)
+
+        # 检查季节一致（忽略没有季节信息的衣服）
+        season_width = max(arrays.season_masks.shape[1] for arrays, _ in slots)
+        common = np.full((count, season_width), np.uint64(0xFFFFFFFFFFFFFFFF), dtype=np.uint64)
+        has_seasons = np.zeros(count, dtype=bool)
+        for k, (arrays, _) in enumerate(slots):
+            masks = _pad(arrays.season_masks, season_width)[safe[k]]
+            valid = present[:, k] & masks.any(axis=1)
+            common = np.where(valid[:, None], common & masks, common)
+            has_seasons |= valid
+        score = score + np.where(has_seasons & common.any(axis=1), 0.2, 0.0)
+
+        score = np.minimum(score, 1.0)
+        # 少于两件时给基础分
+        return np.where(present.sum(axis=1) < 2, 0.5, score)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+搭配组合搜索
+在所有类别（含外套、包包、配饰等可选层）的组合中，用分支限界搜索整体分数最高的前K套搭配。
+
+- 同一位置上颜色/风格/季节完全相同的衣服分数必然相同，先合并为等价类再搜索
+- 每个节点一次性向量化计算所有子节点的分数上界，按上界从高到低（同上界时按
+  当前部分搭配的分数从高到低）展开，上界不超过当前第K名时直接剪掉剩余子节点
+- 最后一个位置直接计算精确分数（与 _calculate_outfit_score 逐位一致）
+- 用小顶堆保留前K名，同分时先找到的优先
+"""
+import heapq
+import itertools
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.config import OUTFIT_SEARCH_BUDGET
+from backend.services.outfit_scoring import FeatureArrays, OutfitScorer, ids_to_mask
+from backend.services.wardrobe_snapshot import STYLES, ItemFeatures
+
+# 上界比较的浮点容差
+_EPS = 1e-9
+
+
+def _popcount(masks: np.ndarray) -> np.ndarray:
+    return np.bitwise_count(masks).sum(axis=-1, dtype=np.int64)
+
+
+class SearchSlot:
+    """搭配中的一个位置，候选按特征签名合并为等价类"""
+
+    def __init__(self, label: str, arrays: FeatureArrays, optional: bool = False):
+        self.label = label
+        self.optional = optional
+        self.arrays = arrays
+
+        keys = np.hstack([
+            arrays.color_ids.astype(np.uint64)[:, None],
+            arrays.style_masks,
+            arrays.season_masks,
+        ])
+        _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        # 等价类按首次出现的顺序编号
+        order = np.argsort(first, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        self.classes = arrays.take(first[order])
+        self.members: List[List[ItemFeatures]] = [[] for _ in order]
+        for position, class_index in enumerate(rank[inverse]):
+            self.members[class_index].append(arrays.records[position])
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def options(self, style_width: int, season_width: int):
+        """
+        该位置的所有选项（可选位置额外有一个“不选”，编号-1）
+        返回 (选项编号, 是否有衣服, 颜色ID, 风格掩码, 季节掩码)
+        """
+        classes = self.classes
+        option_ids = np.arange(len(self), dtype=np.int64)
+        present = np.ones(len(self), dtype=bool)
+        colors = classes.color_ids
+        styles = np.pad(classes.style_masks, ((0, 0), (0, style_width - classes.style_masks.shape[1])))
+        seasons = np.pad(classes.season_masks, ((0, 0), (0, season_width - classes.season_masks.shape[1])))
+        if self.optional:
+            option_ids = np.concatenate([[-1], option_ids])
+            present = np.concatenate([[False], present])
+            colors = np.concatenate([[-1], colors])
+            styles = np.vstack([np.zeros((1, style_width), dtype=np.uint64), styles])
+            seasons = np.vstack([np.zeros((1, season_width), dtype=np.uint64), seasons])
+        return option_ids, present, colors, styles, seasons
+
+
+class _Suffix:
+    """从某个位置开始、尚未确定的位置的汇总信息（用于计算上界）"""
+    __slots__ = ("styles", "twice", "colored", "seasoned", "max_more", "required_more")
+
+    def __init__(self, styles, twice, colored=0, seasoned=False, max_more=0, required_more=0):
+        self.styles = styles
+        self.twice = twice
+        self.colored = colored
+        self.seasoned = seasoned
+        self.max_more = max_more
+        self.required_more = required_more
+
+
+class _State:
+    """部分搭配的汇总状态"""
+    __slots__ = ("colors", "ok_pairs", "seen", "repeated", "common", "has_season", "count")
+
+    def __init__(self, colors, ok_pairs, seen, repeated, common, has_season, count):
+        self.colors = colors
+        self.ok_pairs = ok_pairs
+        self.seen = seen
+        self.repeated = repeated
+        self.common = common
+        self.has_season = has_season
+        self.count = count
+
+
+class OutfitSearch:
+    """分支限界的前K套搭配搜索"""
+
+    def __init__(self, scorer: OutfitScorer, style_preference: Optional[List[str]],
+                 limit: int, min_score: float = 0.3, budget: int = OUTFIT_SEARCH_BUDGET):
+        self.scorer = scorer
+        self.style_preference = style_preference
+        self.limit = limit
+        self.min_score = min_score
+        self.budget = budget
+        self.work = 0
+        self.truncated = False
+        self._heap: List[Tuple[float, int, str, Tuple[ItemFeatures, ...]]] = []
+        self._seq = 0
+        self._pair_ok = None
+
+    def run(self, templates: Sequence[List[SearchSlot]]) -> List[Dict]:
+        """
+        搜索所有模板，返回按分数降序的前K套搭配
+        评估的选项数超出预算时提前结束，返回已找到的最优结果（truncated=True）
+        """
+        _, self._pair_ok = self.scorer.color_tables()
+        for slots in templates:
+            slots = [slot for slot in slots if len(slot) or not slot.optional]
+            if not slots or any(not len(slot) for slot in slots):
+                continue
+            self._search_template(slots)
+            if self.truncated or self._settled():
+                break
+
+        ranked = sorted(self._heap, key=lambda entry: (-entry[0], -entry[1]))
+        return [{"items": list(items), "score": score, "type": label}
+                for score, _, label, items in ranked]
+
+    # ---------- 搜索 ----------
+
+    def _search_template(self, slots: List[SearchSlot]):
+        style_width = max(slot.classes.style_masks.shape[1] for slot in slots)
+        season_width = max(slot.classes.season_masks.shape[1] for slot in slots)
+        self._preference = ids_to_mask([STYLES.lookup(s) for s in self.style_preference or []], style_width)
+        options = [slot.options(style_width, season_width) for slot in slots]
+        suffix = self._suffix_info(options, slots, style_width)
+        zeros_style = np.zeros(style_width, dtype=np.uint64)
+        state = _State((), 0, zeros_style, zeros_style, np.zeros(season_width, dtype=np.uint64), False, 0)
+        self._search(slots, options, suffix, 0, [], state)
+
+    def _search(self, slots, options, suffix, depth, prefix, state: _State):
+        option_ids, present, colors, styles, seasons = options[depth]
+        self.work += len(option_ids)
+        if self.work > self.budget:
+            self.truncated = True
+            return
+        children = self._extend(state, present, colors, styles, seasons)
+        scores = self._exact_scores(children)
+
+        if depth == len(slots) - 1:
+            self._collect(slots, prefix, option_ids, scores)
+            return
+
+        bounds = self._upper_bounds(children, suffix[depth + 1])
+        for row in np.lexsort((-scores, -bounds)):
+            # 子节点按上界降序展开，第一个被剪掉的之后全部可剪
+            if self._pruned(bounds[row]):
+                return
+            child = _State(
+                state.colors + ((int(colors[row]),) if present[row] and colors[row] >= 0 else ()),
+                int(children["ok_pairs"][row]),
+                children["seen"][row],
+                children["repeated"][row],
+                children["common"][row],
+                bool(children["has_season"][row]),
+                int(children["count"][row]),
+            )
+            self._search(slots, options, suffix, depth + 1, prefix + [int(option_ids[row])], child)
+            if self.truncated or self._settled():
+                return
+
+    def _collect(self, slots, prefix, option_ids, scores):
+        """收集最后一个位置的结果，按分数从高到低入堆"""
+        for row in np.argsort(-scores, kind="stable"):
+            score = float(scores[row])
+            if score < self.min_score:
+                return
+            if len(self._heap) >= self.limit and score <= self._heap[0][0]:
+                return
+            self._push_members(slots, prefix + [int(option_ids[row])], score)
+
+    def _push_members(self, slots, chosen, score):
+        """把一个等价类组合展开为具体衣服组合，按顺序入堆直到挤不进前K"""
+        groups = [slot.members[option] if option >= 0 else [None]
+                  for slot, option in zip(slots, chosen)]
+        label = "+".join(slot.label for slot, option in zip(slots, chosen) if option >= 0)
+        for combo in itertools.islice(itertools.product(*groups), self.limit):
+            entry = (score, -self._seq, label, tuple(item for item in combo if item is not None))
+            self._seq += 1
+            if len(self._heap) < self.limit:
+                heapq.heappush(self._heap, entry)
+            elif score > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entry)
+            else:
+                break
+
+    def _pruned(self, bound: float) -> bool:
+        if bound < self.min_score - _EPS:
+            return True
+        # 同分时先找到的优先，上界不超过第K名即可剪枝
+        return len(self._heap) >= self.limit and bound <= self._heap[0][0] + _EPS
+
+    def _settled(self) -> bool:
+        """前K名都已满分，后续不可能更好"""
+        return len(self._heap) >= self.limit and self._heap[0][0] >= 1.0 - _EPS
+
+    # ---------- 向量化的状态扩展、上界与精确分数 ----------
+
+    def _extend(self, state: _State, present, colors, styles, seasons) -> Dict[str, np.ndarray]:
+        """把当前状态分别扩展到下一个位置的每个选项"""
+        colored = present & (colors >= 0)
+        safe_colors = np.where(colored, colors, 0)
+        ok_pairs = np.full(len(present), state.ok_pairs, dtype=np.int64)
+        if state.colors:
+            ok_pairs += np.where(colored, self._pair_ok[list(state.colors)][:, safe_colors].sum(axis=0), 0)
+
+        has_season_option = present & seasons.any(axis=1)
+        if state.has_season:
+            merged = state.common & seasons
+        else:
+            merged = seasons
+        common = np.where(has_season_option[:, None], merged, state.common)
+
+        return {
+            "n_colors": len(state.colors) + colored.astype(np.int64),
+            "ok_pairs": ok_pairs,
+            "seen": state.seen | styles,
+            "repeated": state.repeated | (state.seen & styles),
+            "common": common,
+            "has_season": state.has_season | has_season_option,
+            "count": state.count + present.astype(np.int64),
+        }
+
+    def _suffix_info(self, options, slots, style_width) -> List[_Suffix]:
+        zeros = np.zeros(style_width, dtype=np.uint64)
+        suffix = [_Suffix(zeros, zeros)]
+        for (_, present, colors, styles, seasons), slot in zip(reversed(options), reversed(slots)):
+            after = suffix[0]
+            union = np.bitwise_or.reduce(styles, axis=0)
+            suffix.insert(0, _Suffix(
+                styles=union | after.styles,
+                twice=after.twice | (union & after.styles),
+                colored=after.colored + (1 if (colors >= 0).any() else 0),
+                seasoned=after.seasoned or bool(seasons.any()),
+                max_more=after.max_more + 1,
+                required_more=after.required_more + (0 if slot.optional else 1),
+            ))
+        return suffix
+
+    def _upper_bounds(self, children, rest: _Suffix) -> np.ndarray:
+        """各子节点在任意补全方式下能达到的最高分"""
+        count = children["count"]
+        bound = np.where(count + rest.required_more < 2, 0.5, 0.0)
+
+        # 颜色：已有的不协调色对无法消除，新增的色对全部按协调计算
+        n_colors = children["n_colors"]
+        final = n_colors + rest.colored
+        deficit = n_colors * (n_colors - 1) / 2 - children["ok_pairs"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            color = np.where(final >= 2, 0.4 * (1 - deficit / (final * (final - 1) / 2)), 0.0)
+
+        # 风格：可能重复出现的风格、可能命中的偏好
+        seen = children["seen"]
+        styles = seen | rest.styles
+        repeats = _popcount(children["repeated"] | (seen & rest.styles) | rest.twice)
+        style = np.where(
+            styles.any(axis=1),
+            np.minimum(repeats * 0.3, 0.4) + _popcount(styles & self._preference) * 0.1,
+            0.0
+        )
+
+        # 季节：共同季节一旦为空就不可能恢复
+        season_possible = np.where(children["has_season"], children["common"].any(axis=1), rest.seasoned)
+        season = np.where(season_possible, 0.2, 0.0)
+
+        multi = np.where(count + rest.max_more >= 2, np.minimum(color + style + season, 1.0), 0.0)
+        return np.maximum(bound, multi)
+
+    def _exact_scores(self, children) -> np.ndarray:
+        """当前搭配的精确分数（运算顺序与 _calculate_outfit_score 相同）"""
+        n_colors = children["n_colors"]
+        score = np.zeros(len(n_colors), dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = score + np.where(
+                n_colors >= 2, children["ok_pairs"] / (n_colors * (n_colors - 1) / 2) * 0.4, 0.0
+            )
+
+        seen = children["seen"]
+        has_styles = seen.any(axis=1)
+        score = score + np.where(has_styles, np.minimum(_popcount(children["repeated"]) * 0.3, 0.4), 0.0)
+        if self.style_preference:
+            score = score + np.where(has_styles, _popcount(seen & self._preference) * 0.1, 0.0)
+
+        score = score + np.where(children["has_season"] & children["common"].any(axis=1), 0.2, 0.0)
+        score = np.minimum(score, 1.0)
+        return np.where(children["count"] < 2, 0.5, score)
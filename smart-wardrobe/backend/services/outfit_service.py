@@ -3,11 +3,25 @@
 智能搭配推荐服务
 基于衣服属性和搭配规则推荐服装组合
 """
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
 
 from backend.models.database import ClothingItem
+from backend.services.wardrobe_snapshot import wardrobe_snapshot, ItemFeatures
+from backend.services.outfit_scoring import OutfitScorer, FeatureArrays, arrays_for
+from backend.services.outfit_search import OutfitSearch, SearchSlot
+from backend.services.compat_graph import compat_graph
+
+
+class OutfitPlan(NamedTuple):
+    """单品推荐的中间结果：基础衣服，以及每个类别从关系图读出的衣服ID（None表示需要扫描）"""
+    base_item: ClothingItem
+    base_features: ItemFeatures
+    categories: Dict[str, Optional[List[int]]]
+    occasion: Optional[str]
+    season: Optional[str]
+    limit: int
 
 
 class OutfitService:
@@ -55,6 +69,9 @@ class OutfitService:
         "冬": ["冬", "秋"],
     }
     
+    # 向量化评分引擎（规则同上）
+    scorer = OutfitScorer(COLOR_COMPATIBILITY, STYLE_COMPATIBILITY, SEASON_RULES)
+    
     def __init__(self, db: Session):
         self.db = db
     
@@ -77,51 +94,10 @@ class OutfitService:
         Returns:
             包含推荐搭配的字典
         """
-        # 获取基础衣服
-        base_item = self.db.query(ClothingItem).filter(
-            ClothingItem.id == base_item_id,
-            ClothingItem.is_archived == False
-        ).first()
-        
-        if not base_item:
+        plan = self._plan_outfit(base_item_id, occasion, season, limit)
+        if plan is None:
             return {"success": False, "message": "未找到基础衣服"}
-        
-        base_category = base_item.category
-        base_color = base_item.color
-        base_style = base_item.style or []
-        base_season = base_item.season or []
-        base_type = base_item.type
-        
-        # 确定需要推荐的类别
-        needed_categories = self._get_needed_categories(base_category, base_type)
-        
-        recommendations = {
-            "base_item": base_item.to_dict(),
-            "recommendations": {},
-            "suggestions": []
-        }
-        
-        # 为每个需要的类别推荐衣服
-        for category in needed_categories:
-            items = self._recommend_for_category(
-                category=category,
-                base_color=base_color,
-                base_style=base_style,
-                base_season=season or (base_season[0] if base_season else None),
-                occasion=occasion,
-                exclude_ids=[base_item_id],
-                limit=limit
-            )
-            if items:
-                recommendations["recommendations"][category] = items
-        
-        # 生成搭配建议
-        recommendations["suggestions"] = self._generate_suggestions(
-            base_item, 
-            recommendations["recommendations"]
-        )
-        
-        return recommendations
+        return self._assemble_outfit(plan, self._rank_missing(plan))
     
     def recommend_for_occasion(
         self,
@@ -140,41 +116,107 @@ class OutfitService:
         Returns:
             推荐的搭配组合
         """
-        # 获取所有未归档的衣服
-        query = self.db.query(ClothingItem).filter(
-            ClothingItem.is_archived == False
-        )
+        wardrobe_snapshot.ensure_loaded(self.db)
+        outfits = self._search_occasion(occasion, season, style_preference)
+        return self._occasion_result(occasion, season, outfits)
+    
+    # 推荐分为三步：读数据库确定要做什么、在快照上计算（不访问数据库）、读数据库组装结果。
+    # 异步服务层把中间的计算放到线程池执行，前后两步在异步会话上执行
+    
+    def _plan_outfit(self, base_item_id: int, occasion: Optional[str], season: Optional[str],
+                     limit: int) -> Optional[OutfitPlan]:
+        """读取基础衣服，并从搭配关系图中读出能直接确定结果的类别；基础衣服不存在时返回None"""
+        # 获取基础衣服（快照中只有未归档的衣服）
+        wardrobe_snapshot.ensure_loaded(self.db)
+        base_features = wardrobe_snapshot.get(base_item_id)
+        base_item = self.db.get(ClothingItem, base_item_id) if base_features else None
+        if not base_item:
+            return None
+        
+        # 另选了季节或关系图不足以确定结果的类别留空（None），由 _rank_missing 扫描
+        graph_season = base_features.season[0] if base_features.season else None
+        use_graph = season is None or season == graph_season
+        categories = {
+            category: compat_graph.lookup(self.db, base_item_id, category, limit, occasion) if use_graph else None
+            for category in self._get_needed_categories(base_features.category, base_features.type)
+        }
+        return OutfitPlan(base_item, base_features, categories, occasion, season or graph_season, limit)
+    
+    def _rank_missing(self, plan: OutfitPlan) -> Dict[str, List[int]]:
+        """为关系图未能确定的类别扫描快照打分（纯计算），返回每个类别入选的衣服ID"""
+        base = plan.base_features
+        return {
+            category: top_ids if top_ids is not None else self._rank_candidates(
+                category, base.color, base.style, plan.season, plan.occasion, [base.id], plan.limit
+            )[0]
+            for category, top_ids in plan.categories.items()
+        }
+    
+    def _assemble_outfit(self, plan: OutfitPlan, ranked: Dict[str, List[int]]) -> Dict[str, Any]:
+        """加载入选的衣服，组装推荐结果"""
+        winners = self._load_items([item_id for top_ids in ranked.values() for item_id in top_ids])
+        recommendations = {
+            "base_item": plan.base_item.to_dict(),
+            "recommendations": {},
+            "suggestions": []
+        }
+        for category, top_ids in ranked.items():
+            items = [winners[item_id] for item_id in top_ids if item_id in winners]
+            if items:
+                recommendations["recommendations"][category] = items
         
-        all_items = query.all()
+        # 生成搭配建议
+        recommendations["suggestions"] = self._generate_suggestions(
+            plan.base_item,
+            recommendations["recommendations"]
+        )
         
-        # 在Python中过滤场合和季节（因为SQLite不能直接查询JSON数组）
-        items = [item for item in all_items 
-                 if item.suitable_occasions and occasion in item.suitable_occasions]
+        return recommendations
+    
+    def _search_occasion(self, occasion: str, season: Optional[str],
+                         style_preference: Optional[List[str]]) -> Optional[List[Dict[str, Any]]]:
+        """在快照中搜索适合场合的搭配（纯计算，快照需已加载）；没有合适的衣服时返回None"""
+        # 从快照中筛选适合该场合和季节的未归档衣服
+        arrays = arrays_for("*", wardrobe_snapshot.items())
+        keep = arrays.has_occasion(occasion)
         
         if season:
-            items = [item for item in items 
-                     if item.season and season in item.season]
+            keep &= arrays.has_season(season)
         
-        if not items:
-            return {
-                "success": False,
-                "message": f"未找到适合{occasion}场合的衣服"
-            }
+        items = arrays.take(keep)
+        
+        if not len(items):
+            return None
         
         # 按类别分组
-        items_by_category = {}
-        for item in items:
-            cat = item.category
-            if cat not in items_by_category:
-                items_by_category[cat] = []
-            items_by_category[cat].append(item)
+        positions_by_category = {}
+        for position, item in enumerate(items.records):
+            positions_by_category.setdefault(item.category, []).append(position)
+        items_by_category = {cat: items.take(positions)
+                             for cat, positions in positions_by_category.items()}
         
         # 尝试组合搭配
-        outfit_combinations = self._create_outfit_combinations(
+        return self._create_outfit_combinations(
             items_by_category,
             style_preference,
             limit=3
         )
+    
+    def _occasion_result(self, occasion: str, season: Optional[str],
+                         outfits: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """加载入选搭配中的衣服，组装场合推荐结果"""
+        if outfits is None:
+            return {
+                "success": False,
+                "message": f"未找到适合{occasion}场合的衣服"
+            }
+        
+        # 只序列化入选的搭配
+        details = self._load_items([item.id for outfit in outfits for item in outfit["items"]])
+        outfit_combinations = [
+            {**outfit, "items": [details[item.id] for item in outfit["items"] if item.id in details]}
+            for outfit in outfits
+        ]
         
         return {
             "success": True,
@@ -215,7 +257,7 @@ class OutfitService:
         }
         return category_mapping.get(base_category, ["上衣", "裤子", "鞋子"])
     
-    def _recommend_for_category(
+    def _rank_candidates(
         self,
         category: str,
         base_color: str,
@@ -224,49 +266,43 @@ class OutfitService:
         occasion: Optional[str],
         exclude_ids: List[int],
         limit: int
-    ) -> List[Dict[str, Any]]:
-        """为特定类别推荐衣服"""
-        query = self.db.query(ClothingItem).filter(
-            ClothingItem.category == category,
-            ClothingItem.is_archived == False,
-            ClothingItem.id.notin_(exclude_ids)
-        )
-        
-        items = query.all()
+    ) -> Tuple[List[int], List[float]]:
+        """在快照中为特定类别的候选衣服打分，返回分数最高的前limit件的ID和分数（同分按ID升序）"""
+        arrays = arrays_for(category, wardrobe_snapshot.candidates(category))
+        keep = ~np.isin(arrays.ids, exclude_ids)
         
         # 如果推荐裙子类别，排除连衣裙（连衣裙不需要搭配上衣）
         if category == "裙子":
-            items = [item for item in items 
-                     if item.type and "连衣裙" not in item.type and "长裙" not in item.type]
+            keep &= arrays.has_type & ~arrays.is_dress
         
-        # 在Python中过滤季节和场合（因为SQLite不能直接查询JSON数组）
+        # 过滤季节和场合
         if base_season:
-            items = [item for item in items if item.season and base_season in item.season]
+            keep &= arrays.has_season(base_season)
         
         if occasion:
-            items = [item for item in items if item.suitable_occasions and occasion in item.suitable_occasions]
-        
-        # 计算每件衣服的匹配分数
-        scored_items = []
-        for item in items:
-            score = self._calculate_match_score(
-                item, base_color, base_style, base_season
-            )
-            scored_items.append((item, score))
-        
-        # 按分数排序
-        scored_items.sort(key=lambda x: x[1], reverse=True)
+            keep &= arrays.has_occasion(occasion)
         
-        return [item.to_dict() for item, score in scored_items[:limit]]
+        # 批量计算匹配分数，按分数稳定排序（同分保持原顺序）
+        candidates = arrays.take(keep)
+        scores = self.scorer.match_scores(candidates, base_color, base_style, base_season)
+        order = np.argsort(-scores, kind="stable")[:limit]
+        return candidates.ids[order].tolist(), scores[order].tolist()
+    
+    def _load_items(self, item_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """按ID批量加载衣服详情"""
+        if not item_ids:
+            return {}
+        items = self.db.query(ClothingItem).filter(ClothingItem.id.in_(item_ids)).all()
+        return {item.id: item.to_dict() for item in items}
     
     def _calculate_match_score(
         self,
-        item: ClothingItem,
+        item: ItemFeatures,
         base_color: str,
         base_style: List[str],
         base_season: Optional[str]
     ) -> float:
-        """计算匹配分数"""
+        """计算匹配分数（逐件参考实现，批量评分见 OutfitScorer.match_scores）"""
         score = 0.0
         
         # 颜色匹配 (权重: 40%)
@@ -307,99 +343,56 @@ class OutfitService:
     
     def _create_outfit_combinations(
         self,
-        items_by_category: Dict[str, List[ClothingItem]],
+        items_by_category: Dict[str, FeatureArrays],
         style_preference: Optional[List[str]],
         limit: int
     ) -> List[Dict[str, Any]]:
-        """创建搭配组合"""
-        outfits = []
+        """创建搭配组合：在全部候选中搜索整体分数最高的前N套（搭配中的衣服为快照特征记录）"""
+        empty = FeatureArrays.build([])
         
         # 获取各类别
-        tops = items_by_category.get("上衣", [])
-        pants = items_by_category.get("裤子", [])
-        skirts = items_by_category.get("裙子", [])
-        shoes = items_by_category.get("鞋子", [])
-        outerwears = items_by_category.get("外套", [])
-        bags = items_by_category.get("包包", [])
-        accessories = items_by_category.get("配饰", [])
+        tops = items_by_category.get("上衣", empty)
+        pants = items_by_category.get("裤子", empty)
+        skirts = items_by_category.get("裙子", empty)
+        shoes = items_by_category.get("鞋子", empty)
+        outerwears = items_by_category.get("外套", empty)
+        bags = items_by_category.get("包包", empty)
+        accessories = items_by_category.get("配饰", empty)
         
         # 区分半身裙和连衣裙
-        half_skirts = []  # 半身裙，需要搭配上衣
-        dresses = []      # 连衣裙，不需要搭配上衣
-        for skirt in skirts:
-            skirt_type = skirt.type or ""
-            if "连衣裙" in skirt_type or "长裙" in skirt_type:
-                dresses.append(skirt)
-            else:
-                half_skirts.append(skirt)
-        
-        # 尝试组合：上衣 + 裤子 + 鞋子（如果有鞋子）
-        if tops and pants:
-            for top in tops[:5]:
-                for pant in pants[:3]:
-                    if shoes:
-                        for shoe in shoes[:3]:
-                            score = self._calculate_outfit_score([top, pant, shoe], style_preference)
-                            if score >= 0.3:
-                                outfits.append({
-                                    "items": [top.to_dict(), pant.to_dict(), shoe.to_dict()],
-                                    "score": score,
-                                    "type": "上衣+裤子+鞋子"
-                                })
-                    else:
-                        # 没有鞋子时，只用上衣+裤子
-                        score = self._calculate_outfit_score([top, pant], style_preference)
-                        if score >= 0.3:
-                            outfits.append({
-                                "items": [top.to_dict(), pant.to_dict()],
-                                "score": score,
-                                "type": "上衣+裤子"
-                            })
-        
-        # 尝试组合：上衣 + 半身裙 + 鞋子（如果有鞋子）
-        # 注意：只搭配半身裙，不搭配连衣裙
-        if tops and half_skirts:
-            for top in tops[:5]:
-                for skirt in half_skirts[:3]:
-                    if shoes:
-                        for shoe in shoes[:3]:
-                            score = self._calculate_outfit_score([top, skirt, shoe], style_preference)
-                            if score >= 0.3:
-                                outfits.append({
-                                    "items": [top.to_dict(), skirt.to_dict(), shoe.to_dict()],
-                                    "score": score,
-                                    "type": "上衣+裙子+鞋子"
-                                })
-                    else:
-                        # 没有鞋子时，只用上衣+裙子
-                        score = self._calculate_outfit_score([top, skirt], style_preference)
-                        if score >= 0.3:
-                            outfits.append({
-                                "items": [top.to_dict(), skirt.to_dict()],
-                                "score": score,
-                                "type": "上衣+裙子"
-                            })
-        
-        # 尝试组合：连衣裙单独作为一套（不需要上衣和裤子）
-        if dresses:
-            for dress in dresses[:5]:
-                # 连衣裙可以单独作为一套
-                outfits.append({
-                    "items": [dress.to_dict()],
-                    "score": 0.5,
-                    "type": "连衣裙"
-                })
-        
-        # 按分数排序并返回前N个
-        outfits.sort(key=lambda x: x["score"], reverse=True)
-        return outfits[:limit]
+        half_skirts = skirts.take(~skirts.is_dress)  # 半身裙，需要搭配上衣
+        dresses = skirts.take(skirts.is_dress)       # 连衣裙，不需要搭配上衣
+        
+        # 可选的外层和配件：每套搭配可以加也可以不加
+        layers = [
+            SearchSlot("外套", outerwears, optional=True),
+            SearchSlot("包包", bags, optional=True),
+            SearchSlot("配饰", accessories, optional=True),
+        ]
+        shoe_slot = [SearchSlot("鞋子", shoes)] if len(shoes) else []
+        
+        templates = []
+        # 上衣 + 裤子 + 鞋子（有鞋子时必须搭配鞋子）
+        if len(tops) and len(pants):
+            templates.append([SearchSlot("上衣", tops), SearchSlot("裤子", pants)] + shoe_slot + layers)
+        
+        # 上衣 + 半身裙 + 鞋子（只搭配半身裙，不搭配连衣裙）
+        if len(tops) and len(half_skirts):
+            templates.append([SearchSlot("上衣", tops), SearchSlot("裙子", half_skirts)] + shoe_slot + layers)
+        
+        # 连衣裙可以单独作为一套，鞋子和外层可选
+        if len(dresses):
+            templates.append([SearchSlot("连衣裙", dresses), SearchSlot("鞋子", shoes, optional=True)] + layers)
+        
+        search = OutfitSearch(self.scorer, style_preference, limit)
+        return search.run(templates)
     
     def _calculate_outfit_score(
         self,
-        items: List[ClothingItem],
+        items: List[ItemFeatures],
         style_preference: Optional[List[str]]
     ) -> float:
-        """计算整体搭配分数"""
+        """计算整体搭配分数（逐套参考实现，批量评分见 OutfitScorer.outfit_scores）"""
         if len(items) < 2:
             return 0.5  # 单件衣服给一个基础分
         
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+推荐结果缓存
+搭配推荐只取决于请求参数和衣柜数据，用户往往反复查看同几件衣服、同几个场合。
+结果按"衣柜版本 + 接口 + 参数"缓存在进程内存中，任何写入递增衣柜版本后旧结果全部失效
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from backend.config import (
+    RECOMMENDATION_CACHE_ENABLED, RECOMMENDATION_CACHE_MAX_ENTRIES, RECOMMENDATION_CACHE_TTL_SECONDS
+)
+from backend.services.wardrobe_version import wardrobe_version
+
+
+class RecommendationCache:
+    """
+    推荐结果缓存（LRU）
+    键中带有计算前读取的衣柜版本号：计算期间发生写入时，结果不会以新版本号写入缓存。
+    与 wardrobe_version 一样只感知本进程内的写入，其他进程改库后需调用 wardrobe_version.bump()
+    """
+
+    def __init__(self, enabled: bool = RECOMMENDATION_CACHE_ENABLED,
+                 max_entries: int = RECOMMENDATION_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = RECOMMENDATION_CACHE_TTL_SECONDS):
+        self.enabled = enabled
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds if ttl_seconds > 0 else None
+        self._lock = threading.Lock()
+        # 键 -> (过期时间, 结果)，按最近使用排序
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._version = wardrobe_version.token
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(scope: str, *params) -> tuple:
+        """生成缓存键（在计算结果之前调用，记录当时的衣柜版本）"""
+        return (wardrobe_version.token, scope) + params
+
+    def _sync_version(self, version: str) -> bool:
+        """衣柜版本变化时清空缓存（需持有锁），返回键的版本是否为当前版本"""
+        current = wardrobe_version.token
+        if current != self._version:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._version = current
+        return version == current
+
+    def get(self, key: tuple) -> Optional[Any]:
+        """查询缓存，未命中返回None。返回的结果与其他请求共享，不要修改"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key) if self._sync_version(key[0]) else None
+            if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, value: Any):
+        """写入缓存；计算期间衣柜数据已变化的结果直接丢弃"""
+        if not self.enabled or value is None:
+            return
+        with self._lock:
+            if not self._sync_version(key[0]):
+                return
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            self.writes += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> int:
+        """清空缓存，返回删除的条目数"""
+        with self._lock:
+            cleared = len(self._entries)
+            self._entries.clear()
+            return cleared
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            self._sync_version(self._version)
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl or 0,
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+
+# 单例实例
+recommendation_cache = RecommendationCache()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+批量上传任务
+上传接口保存图片后立即返回任务ID，由固定数量的后台协程并发完成AI分类，
+前端轮询任务进度并逐张确认
+"""
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from backend.config import UPLOAD_BATCH_WORKERS, UPLOAD_JOB_RETENTION
+from backend.services.classifier_service import classifier_service, pick_classification_fields
+
+# 单张图片的处理状态
+ITEM_PENDING = "pending"
+ITEM_DONE = "done"
+ITEM_FAILED = "failed"
+
+
+class UploadJob:
+    """一次批量上传任务"""
+
+    def __init__(self, entries: List[Dict[str, Any]], auto_classify: bool):
+        self.id = uuid.uuid4().hex
+        self.auto_classify = auto_classify
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.items: List[Dict[str, Any]] = []
+        for index, entry in enumerate(entries):
+            item = {
+                "index": index,
+                "filename": entry["filename"],
+                "status": ITEM_FAILED if entry.get("error") else ITEM_PENDING,
+                "data": None,
+                "error": entry.get("error")
+            }
+            if not item["error"]:
+                item["data"] = {
+                    "filename": entry["filename"],
+                    "original_path": entry["original_path"],
+                    "temp_id": entry["original_path"]  # 与单张上传一致，用图片路径作为临时ID
+                }
+            self.items.append(item)
+        self._check_finished()
+
+    @property
+    def completed(self) -> int:
+        return sum(1 for item in self.items if item["status"] == ITEM_DONE)
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for item in self.items if item["status"] == ITEM_FAILED)
+
+    @property
+    def status(self) -> str:
+        if self.finished_at is not None:
+            return "completed"
+        return "running" if self.completed + self.failed else "pending"
+
+    def finish_item(self, index: int, classification: Optional[Dict[str, Any]] = None,
+                    error: Optional[str] = None):
+        """记录单张图片的处理结果"""
+        item = self.items[index]
+        if error:
+            item["status"] = ITEM_FAILED
+            item["error"] = error
+        else:
+            item["status"] = ITEM_DONE
+            if classification:
+                item["data"].update(pick_classification_fields(classification))
+        self._check_finished()
+
+    def _check_finished(self):
+        if self.finished_at is None and all(item["status"] != ITEM_PENDING for item in self.items):
+            self.finished_at = datetime.now()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": len(self.items),
+            "completed": self.completed,
+            "failed": self.failed,
+            "auto_classify": self.auto_classify,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "items": self.items
+        }
+
+
+class UploadJobManager:
+    """
+    批量上传任务管理
+    待分类的图片进入队列，由 UPLOAD_BATCH_WORKERS 个协程消费；
+    实际的接口并发还受 ClassifierService 的信号量限制。
+    任务只保存在内存中，重启后丢失
+    """
+
+    def __init__(self, workers: int = UPLOAD_BATCH_WORKERS, retention: int = UPLOAD_JOB_RETENTION):
+        self.workers = max(1, workers)
+        self.retention = max(1, retention)
+        self._jobs: "OrderedDict[str, UploadJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_workers(self):
+        # 队列和协程绑定在当前事件循环上，首次提交时启动
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._queue = asyncio.Queue()
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+            self._loop = loop
+
+    async def _worker(self):
+        while True:
+            job, index = await self._queue.get()
+            try:
+                classification = await classifier_service.classify_image_async(
+                    job.items[index]["data"]["original_path"]
+                )
+                job.finish_item(index, classification)
+            except Exception as e:
+                print(f"批量上传分类失败: {e}")
+                job.finish_item(index, error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def submit(self, entries: List[Dict[str, Any]], auto_classify: bool = True) -> UploadJob:
+        """
+        提交批量任务
+        entries: 每张图片一个字典，保存成功的含 filename/original_path，失败的含 filename/error
+        """
+        job = UploadJob(entries, auto_classify)
+        self._jobs[job.id] = job
+        self._prune()
+
+        for item in job.items:
+            if item["status"] != ITEM_PENDING:
+                continue
+            if auto_classify:
+                self._ensure_workers()
+                self._queue.put_nowait((job, item["index"]))
+            else:
+                job.finish_item(item["index"])
+        return job
+
+    def get(self, job_id: str) -> Optional[UploadJob]:
+        return self._jobs.get(job_id)
+
+    def _prune(self):
+        """只保留最近的已完成任务，未完成的任务不清理"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.retention)]:
+            del self._jobs[job_id]
+
+    async def shutdown(self):
+        """停止后台协程（应用关闭时调用）"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._queue = None
+        self._loop = None
+
+
+# 单例实例
+upload_job_manager = UploadJobManager()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+衣柜计数器
+统计数据（总数、收藏数、类别分布）和筛选项字典（类别、颜色、风格及引用计数）
+随每次写入增量维护，增量与衣服记录在同一个事务中提交，统计和筛选接口只读计数器表
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from backend.models.database import ClothingItem, WardrobeCounter, as_tag_list
+
+# 计数器分组
+NS_STATS = "stats"
+NS_CATEGORY = "category"
+# 筛选项字典：值 -> 引用它的衣服数（含已归档），计数归零的值自动消失
+NS_FACET_CATEGORY = "facet:category"
+NS_FACET_COLOR = "facet:color"
+NS_FACET_STYLE = "facet:style"
+# 计数器布局版本，记录在 meta 分组中；新增分组后递增，启动时发现版本不符会整表重建
+NS_META = "meta"
+LAYOUT_VERSION = 2
+
+# "从未穿过"的时间窗口
+NEVER_WORN_DAYS = 30
+
+
+class WardrobeCounters:
+    """
+    衣柜计数器
+    每件衣服对计数器的贡献由 contributions() 给出，写入前后各取一次，
+    两者之差通过 UPSERT 累加到计数器表；计数归零的行直接删除
+    """
+
+    @staticmethod
+    def contributions(item: Optional[ClothingItem]) -> Counter:
+        """一件衣服对各计数器的贡献，item为None表示不存在"""
+        counts: Counter = Counter()
+        if item is None:
+            return counts
+        if item.category:
+            counts[(NS_FACET_CATEGORY, item.category)] += 1
+        if item.color:
+            counts[(NS_FACET_COLOR, item.color)] += 1
+        for style in as_tag_list(item.style):
+            counts[(NS_FACET_STYLE, style)] += 1
+        if item.is_archived:
+            return counts
+        counts[(NS_STATS, "total_items")] += 1
+        if item.is_favorite:
+            counts[(NS_STATS, "favorites")] += 1
+        if item.category:
+            counts[(NS_CATEGORY, item.category)] += 1
+        return counts
+
+    def apply(self, db: Session, before: Counter, after: Counter):
+        """把写入前后的贡献差累加到计数器（不提交，由调用方与记录一起提交）"""
+        delta = Counter(after)
+        delta.subtract(before)
+        self._add(db, {key: value for key, value in delta.items() if value})
+
+    def _add(self, db: Session, delta: Dict[Tuple[str, str], int]):
+        if not delta:
+            return
+        table = WardrobeCounter.__table__
+        stmt = insert(table)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[table.c.namespace, table.c.key],
+                set_={"value": table.c.value + stmt.excluded.value}
+            ),
+            [{"namespace": ns, "key": key, "value": value} for (ns, key), value in sorted(delta.items())]
+        )
+        db.execute(table.delete().where(table.c.value <= 0))
+
+    def rebuild(self, db: Session):
+        """从衣服表重新计算全部计数器（不提交）"""
+        db.execute(WardrobeCounter.__table__.delete())
+        totals: Counter = Counter()
+        for item in db.query(ClothingItem).yield_per(500):
+            totals.update(self.contributions(item))
+        totals[(NS_META, "layout")] = LAYOUT_VERSION
+        self._add(db, totals)
+
+    def ensure_current(self, db: Session) -> bool:
+        """计数器布局版本与代码不一致（旧数据库或新增了分组）时重建，返回是否重建"""
+        marker = db.query(WardrobeCounter.value).filter(
+            WardrobeCounter.namespace == NS_META, WardrobeCounter.key == "layout"
+        ).scalar()
+        if marker == LAYOUT_VERSION:
+            return False
+        self.rebuild(db)
+        return True
+
+    def read(self, db: Session, *namespaces: str) -> Dict[str, Dict[str, int]]:
+        """读取若干分组的计数器"""
+        result: Dict[str, Dict[str, int]] = {ns: {} for ns in namespaces}
+        rows = db.query(WardrobeCounter.namespace, WardrobeCounter.key, WardrobeCounter.value).filter(
+            WardrobeCounter.namespace.in_(namespaces)
+        )
+        for ns, key, value in rows:
+            result[ns][key] = value
+        return result
+
+    def statistics(self, db: Session) -> Dict[str, Any]:
+        """衣柜统计：计数器 + 两个走索引的时间相关查询"""
+        counters = self.read(db, NS_STATS, NS_CATEGORY)
+        total = counters[NS_STATS].get("total_items", 0)
+
+        # 最近穿着：走 last_worn_date 索引取前5条
+        recently_worn = db.query(ClothingItem).filter(
+            ClothingItem.last_worn_date != None
+        ).order_by(ClothingItem.last_worn_date.desc()).limit(5).all()
+
+        # 从未穿过(超过30天) = 在用总数 - 30天内穿过的，后者走未归档衣服的 last_worn_date 部分索引
+        cutoff = datetime.now() - timedelta(days=NEVER_WORN_DAYS)
+        worn_recently = db.query(func.count()).select_from(ClothingItem).filter(
+            ClothingItem.is_archived == False,
+            ClothingItem.last_worn_date >= cutoff
+        ).scalar()
+
+        return {
+            "total_items": total,
+            "favorites": counters[NS_STATS].get("favorites", 0),
+            "category_distribution": counters[NS_CATEGORY],
+            "recently_worn": [item.to_dict() for item in recently_worn],
+            "never_worn_count": total - worn_recently
+        }
+
+    def facets(self, db: Session) -> Dict[str, List[str]]:
+        """筛选项：各分组中引用计数大于0的值，按值排序"""
+        counters = self.read(db, NS_FACET_CATEGORY, NS_FACET_COLOR, NS_FACET_STYLE)
+        return {
+            "categories": sorted(counters[NS_FACET_CATEGORY]),
+            "colors": sorted(counters[NS_FACET_COLOR]),
+            "styles": sorted(counters[NS_FACET_STYLE])
+        }
+
+
+# 单例实例
+wardrobe_counters = WardrobeCounters()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+衣柜特征快照
+进程内常驻的只读搭配特征（类别、类型、颜色、风格、季节、场合），
+供搭配推荐使用，避免每次请求都查询并实例化完整的ORM对象
+"""
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from backend.models.database import ClothingItem, as_tag_list
+
+
+class Vocabulary:
+    """字符串驻留表：把颜色/风格/季节等取值映射为紧凑的整数ID"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self.values: List[str] = []
+        self._lock = threading.Lock()
+
+    def intern(self, value: str) -> int:
+        """获取取值对应的ID，不存在时分配新ID"""
+        value_id = self._ids.get(value)
+        if value_id is None:
+            with self._lock:
+                value_id = self._ids.get(value)
+                if value_id is None:
+                    value_id = len(self.values)
+                    self.values.append(sys.intern(value))
+                    self._ids[value] = value_id
+        return value_id
+
+    def lookup(self, value: Optional[str]) -> int:
+        """查询取值对应的ID，不存在时返回-1"""
+        if value is None:
+            return -1
+        return self._ids.get(value, -1)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+# 进程级共享的取值表（只增不减，取值种类远少于衣服数量）
+COLORS = Vocabulary()
+STYLES = Vocabulary()
+SEASONS = Vocabulary()
+OCCASIONS = Vocabulary()
+
+# ID元组驻留池：风格/季节组合大量重复，相同组合共用同一个元组
+_TUPLE_POOL: Dict[Tuple[int, ...], Tuple[int, ...]] = {}
+
+
+def _intern_ids(vocab: Vocabulary, values) -> Tuple[int, ...]:
+    ids = tuple(vocab.intern(v) for v in as_tag_list(values))
+    return _TUPLE_POOL.setdefault(ids, ids)
+
+
+def _intern_str(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+class ItemFeatures:
+    """单件衣服的搭配特征记录"""
+    __slots__ = ("id", "category", "type", "color_id", "style_ids", "season_ids", "occasion_ids")
+
+    def __init__(self, item_id: int, category, type_, color, style, season, occasions):
+        self.id = item_id
+        self.category = _intern_str(category)
+        self.type = _intern_str(type_)
+        self.color_id = COLORS.intern(color) if color else -1
+        self.style_ids = _intern_ids(STYLES, style)
+        self.season_ids = _intern_ids(SEASONS, season)
+        self.occasion_ids = _intern_ids(OCCASIONS, occasions)
+
+    @classmethod
+    def from_item(cls, item: ClothingItem) -> "ItemFeatures":
+        return cls(item.id, item.category, item.type, item.color,
+                   item.style, item.season, item.suitable_occasions)
+
+    # 以下属性与 ClothingItem 同名，便于直接复用评分规则
+    @property
+    def color(self) -> Optional[str]:
+        return COLORS.values[self.color_id] if self.color_id >= 0 else None
+
+    @property
+    def style(self) -> List[str]:
+        return [STYLES.values[i] for i in self.style_ids]
+
+    @property
+    def season(self) -> List[str]:
+        return [SEASONS.values[i] for i in self.season_ids]
+
+    @property
+    def suitable_occasions(self) -> List[str]:
+        return [OCCASIONS.values[i] for i in self.occasion_ids]
+
+    def has_season(self, season: str) -> bool:
+        return SEASONS.lookup(season) in self.season_ids
+
+    def has_occasion(self, occasion: str) -> bool:
+        return OCCASIONS.lookup(occasion) in self.occasion_ids
+
+
+class WardrobeSnapshot:
+    """
+    未归档衣服的特征快照
+    首次使用时整体加载，之后由 ClothingService 的写操作增量维护。
+    快照只感知本进程内的写入，其他进程直接改库后需调用 invalidate()
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._items: Dict[int, ItemFeatures] = {}
+        self._by_category: Dict[str, Dict[int, ItemFeatures]] = {}
+        self._ordered: Dict[str, List[ItemFeatures]] = {}
+        self._all_ordered: Optional[List[ItemFeatures]] = None
+        self._loaded = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self, db: Session):
+        """确保快照已加载（并发的首次使用只加载一次）"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load(db)
+
+    def load(self, db: Session):
+        """
+        从数据库整体加载（只投影评分需要的列，不实例化ORM对象）。
+        查询在锁内执行：加载期间提交的写入在 upsert/discard 处等待，加载完成后再应用，
+        不会被跳过或被加载的旧数据覆盖。因此服务中不能用写连接的会话加载，
+        否则与持有写连接、等待快照锁的写入者互相等待（单线程的离线脚本除外）
+        """
+        with self._lock:
+            rows = db.query(
+                ClothingItem.id,
+                ClothingItem.category,
+                ClothingItem.type,
+                ClothingItem.color,
+                ClothingItem.style,
+                ClothingItem.season,
+                ClothingItem.suitable_occasions
+            ).filter(ClothingItem.is_archived == False).order_by(ClothingItem.id).all()
+
+            self._items = {}
+            self._by_category = {}
+            self._ordered = {}
+            self._all_ordered = None
+            for row in rows:
+                self._put(ItemFeatures(*row))
+            self._loaded = True
+
+    def invalidate(self):
+        """丢弃快照，下次使用时重新加载"""
+        with self._lock:
+            self._loaded = False
+            self._items = {}
+            self._by_category = {}
+            self._ordered = {}
+            self._all_ordered = None
+
+    def upsert(self, item: ClothingItem) -> bool:
+        """写入后增量更新单件衣服（已归档的会被移出快照），快照未加载时不更新并返回False"""
+        with self._lock:
+            if not self._loaded:
+                return False
+            self._remove(item.id)
+            if not item.is_archived:
+                self._put(ItemFeatures.from_item(item))
+            return True
+
+    def discard(self, item_id: int):
+        """删除后移出快照"""
+        with self._lock:
+            if self._loaded:
+                self._remove(item_id)
+
+    def get(self, item_id: int) -> Optional[ItemFeatures]:
+        return self._items.get(item_id)
+
+    def items(self) -> List[ItemFeatures]:
+        """所有未归档衣服，按ID排序（内容不变时返回同一个列表对象）"""
+        ordered = self._all_ordered
+        if ordered is None:
+            with self._lock:
+                ordered = sorted(self._items.values(), key=lambda f: f.id)
+                self._all_ordered = ordered
+        return ordered
+
+    def candidates(self, category: str) -> List[ItemFeatures]:
+        """某类别的所有未归档衣服，按ID排序（内容不变时返回同一个列表对象）"""
+        ordered = self._ordered.get(category)
+        if ordered is None:
+            with self._lock:
+                members = self._by_category.get(category, {})
+                ordered = sorted(members.values(), key=lambda f: f.id)
+                self._ordered[category] = ordered
+        return ordered
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _put(self, features: ItemFeatures):
+        self._items[features.id] = features
+        self._by_category.setdefault(features.category, {})[features.id] = features
+        self._ordered.pop(features.category, None)
+        self._all_ordered = None
+
+    def _remove(self, item_id: int):
+        features = self._items.pop(item_id, None)
+        if features is not None:
+            self._by_category.get(features.category, {}).pop(item_id, None)
+            self._ordered.pop(features.category, None)
+            self._all_ordered = None
+
+
+# 单例实例
+wardrobe_snapshot = WardrobeSnapshot()
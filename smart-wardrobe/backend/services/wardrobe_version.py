@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+衣柜数据版本
+每次写入衣柜数据时递增，读接口据此生成ETag/Last-Modified，
+数据未变化的重复请求直接返回304
+"""
+import hashlib
+import threading
+import time
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional
+
+
+class WardrobeVersion:
+    """
+    单调递增的衣柜版本号
+    纪元（epoch）在进程启动时随机生成，重启后旧的ETag全部失效；
+    与快照一样只感知本进程内的写入，其他进程改库后需调用 bump()
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.counter = 0
+        # Last-Modified 精度为秒，取启动时间作为初始值
+        self.modified_at = time.time()
+        self._lock = threading.Lock()
+
+    def bump(self):
+        """数据发生变化"""
+        with self._lock:
+            self.counter += 1
+            self.modified_at = time.time()
+
+    @property
+    def token(self) -> str:
+        return f"{self.epoch}-{self.counter}"
+
+    def etag(self, scope: str, params: str = "") -> str:
+        """由版本号、接口和查询参数生成ETag"""
+        digest = hashlib.sha1(f"{scope}?{params}".encode("utf-8")).hexdigest()[:12]
+        return f'W/"{self.token}-{digest}"'
+
+    def validators(self, scope: str, params: str = "") -> Dict[str, str]:
+        """生成条件请求相关的响应头"""
+        return {
+            "ETag": self.etag(scope, params),
+            "Last-Modified": formatdate(self.modified_at, usegmt=True),
+            "Cache-Control": "no-cache"
+        }
+
+    def is_fresh(self, headers: Dict[str, str], if_none_match: Optional[str],
+                 if_modified_since: Optional[str]) -> bool:
+        """客户端缓存是否仍然有效（If-None-Match 优先于 If-Modified-Since）"""
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return headers["ETag"] in tags or "*" in tags
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(self.modified_at) <= since
+        return False
+
+
+# 单例实例
+wardrobe_version = WardrobeVersion()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+穿着记录写缓冲
+"记录穿着"是最频繁的写操作，逐次提交会占用写连接并各自落盘一次。
+这里先在内存中按衣服合并穿着次数，由后台线程定时（或攒够一定数量时）
+用一条批量 UPDATE wear_count = wear_count + n 写库，递增在数据库中完成，并发点击不会丢失。
+返回给客户端的穿着次数 = 已写库的次数 + 缓冲中的次数，读取已写库的次数与写库互斥，两部分不会错开
+"""
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import update, bindparam, func
+
+from backend.config import WEAR_BUFFER_FLUSH_INTERVAL, WEAR_BUFFER_MAX_EVENTS
+from backend.models import SessionLocal, ReadSessionLocal, ClothingItem
+from backend.services.wardrobe_version import wardrobe_version
+
+
+class WearBuffer:
+    """
+    穿着记录写缓冲
+    未写库的穿着次数只保存在内存中，最长延迟 WEAR_BUFFER_FLUSH_INTERVAL 秒；
+    应用关闭时由 main.py 的 lifespan 调用 shutdown() 写入剩余记录
+    """
+
+    def __init__(self, flush_interval: float = WEAR_BUFFER_FLUSH_INTERVAL,
+                 max_events: int = WEAR_BUFFER_MAX_EVENTS):
+        self.flush_interval = max(0.01, flush_interval)
+        self.max_events = max(1, max_events)
+        self._lock = threading.Lock()
+        # 串行化写库，shutdown 时与后台线程的写入不交错
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        # 衣服ID -> (待写入的次数, 最后一次穿着时间)
+        self._pending: Dict[int, Tuple[int, datetime]] = {}
+        self._events = 0
+
+    def record(self, item_id: int) -> Optional[Tuple[int, datetime]]:
+        """
+        记录一次穿着，返回该衣服的穿着次数（含本次）和本次穿着时间，衣服不存在时返回None。
+        在持有写库锁时读取已写库的次数：写库要么已提交（次数已从缓冲移入数据库），要么尚未开始，
+        不会出现已从缓冲取走、但还没提交到数据库的中间状态
+        """
+        with self._flush_lock:
+            with ReadSessionLocal() as db:
+                stored = db.query(ClothingItem.wear_count).filter(ClothingItem.id == item_id).first()
+            if stored is None:
+                return None
+            worn_at = datetime.now()
+            with self._lock:
+                count, _ = self._pending.get(item_id, (0, worn_at))
+                self._pending[item_id] = (count + 1, worn_at)
+                self._events += 1
+                self._ensure_started()
+                if self._events >= self.max_events:
+                    self._wakeup.set()
+        return (stored.wear_count or 0) + count + 1, worn_at
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stopping:
+            return
+        self._thread = threading.Thread(target=self._run, name="wear-buffer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """把缓冲的穿着次数写库，返回写入的衣服数"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._events = 0
+            if not pending:
+                return 0
+            table = ClothingItem.__table__
+            db = SessionLocal()
+            try:
+                db.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("item_id"))
+                    .values(
+                        wear_count=func.coalesce(table.c.wear_count, 0) + bindparam("times"),
+                        # 与 ClothingService.commit_wear 一致取较晚的日期，补记的穿搭已写入更晚的日期时不倒退
+                        last_worn_date=func.max(
+                            func.coalesce(table.c.last_worn_date, bindparam("worn_at")), bindparam("worn_at")
+                        )
+                    ),
+                    [{"item_id": item_id, "times": count, "worn_at": worn_at}
+                     for item_id, (count, worn_at) in sorted(pending.items())]
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"写入穿着记录失败，稍后重试: {e}")
+                self._restore(pending)
+                return 0
+            finally:
+                db.close()
+        wardrobe_version.bump()
+        return len(pending)
+
+    def _restore(self, pending: Dict[int, Tuple[int, datetime]]):
+        """写库失败时把记录放回缓冲，与期间新增的记录合并"""
+        with self._lock:
+            for item_id, (count, worn_at) in pending.items():
+                newer_count, newer_worn_at = self._pending.get(item_id, (0, worn_at))
+                self._pending[item_id] = (count + newer_count, max(worn_at, newer_worn_at))
+                self._events += count
+
+    def shutdown(self, timeout: float = 5.0):
+        """停止后台线程并写入剩余记录（应用关闭时调用）"""
+        with self._lock:
+            self._stopping = True
+            thread, self._thread = self._thread, None
+        self._wakeup.set()
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+        with self._lock:
+            self._stopping = False
+
+
+# 单例实例
+wear_buffer = WearBuffer()
@@ -33,10 +33,10 @@ async function apiRequest(endpoint, options = {}) {
 
 // 衣服相关API
 const ClothesAPI = {
-    // 获取衣服列表
+    // 获取衣服列表（列表只用于展示卡片，默认只取卡片字段，详情通过 getById 获取）
     async getList(params = {}) {
         const queryStr = new URLSearchParams(
-            Object.entries(params).filter(([_, v]) => v !== '' && v !== null && v !== undefined)
+            Object.entries({ fields: 'card', ...params }).filter(([_, v]) => v !== '' && v !== null && v !== undefined)
         ).toString();
         return apiRequest(`/clothes/?${queryStr}`);
     },
@@ -64,6 +64,29 @@ const ClothesAPI = {
         return data;
     },
     
+    // 批量上传衣服图片（返回后台分类任务）
+    async uploadBatch(files, autoClassify = true) {
+        const formData = new FormData();
+        files.forEach(file => formData.append('files', file));
+        formData.append('auto_classify', autoClassify);
+        
+        const response = await fetch(`${API_BASE_URL}/clothes/upload-batch`, {
+            method: 'POST',
+            body: formData,
+        });
+        
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.detail || '上传失败');
+        }
+        return data;
+    },
+    
+    // 查询批量上传进度
+    async getUploadBatch(jobId) {
+        return apiRequest(`/clothes/upload-batch/${jobId}`);
+    },
+    
     // 更新衣服信息
     async update(id, data) {
         return apiRequest(`/clothes/${id}`, {
@@ -117,9 +140,12 @@ const ClothesAPI = {
         return apiRequest('/clothes/filters');
     },
     
-    // 获取图片URL
-    getImageUrl(id, transparent = false) {
-        return `${API_BASE_URL}/clothes/${id}/image?transparent=${transparent}`;
+    // 获取图片URL（width为缩略图宽度，version为图片版本号，带版本号的图片可被浏览器长期缓存）
+    getImageUrl(id, transparent = false, width = null, version = null) {
+        let url = `${API_BASE_URL}/clothes/${id}/image?transparent=${transparent}`;
+        if (width) url += `&w=${width}`;
+        if (version) url += `&v=${encodeURIComponent(version)}`;
+        return url;
     },
     
     // 确认并保存衣服信息
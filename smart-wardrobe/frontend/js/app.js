@@ -11,6 +11,7 @@ let batchMode = false;
 let selectedItems = new Set();
 let pendingUploadData = null; // 待确认的上传数据
 let currentUploadIndex = 0; // 当前上传的文件索引
+let batchUploadJobId = null; // 批量上传任务ID（多张图片时使用）
 
 // ==================== 初始化 ====================
 
@@ -126,8 +127,8 @@ function renderClothesGrid(clothes) {
 }
 
 function createClothesCard(item) {
-    // 添加时间戳参数防止浏览器缓存
-    const imageUrl = item.id ? `${ClothesAPI.getImageUrl(item.id, false)}&t=${Date.now()}` : '';
+    // 卡片只加载缩略图，以创建时间作为版本号
+    const imageUrl = item.id ? ClothesAPI.getImageUrl(item.id, false, 256, item.created_at) : '';
     const seasonTags = (item.season || []).slice(0, 2).map(s => 
         `<span class="clothes-card-tag">${s}</span>`
     ).join('');
@@ -153,6 +154,7 @@ function createClothesCard(item) {
                     ${item.color ? `<span>${item.color}</span>` : ''}
                     ${item.style && item.style.length > 0 ? `<span>${item.style.join('、')}</span>` : ''}
                 </div>
+                ${item.snippet ? `<div class="clothes-card-snippet">${item.snippet}</div>` : ''}
                 ${seasonTags ? `<div class="clothes-card-tags">${seasonTags}</div>` : ''}
             </div>
         </div>
@@ -175,8 +177,8 @@ async function showDetail(id) {
 }
 
 function renderDetail(item) {
-    // 图片 - 添加时间戳防止缓存
-    document.getElementById('detail-image').src = `${ClothesAPI.getImageUrl(item.id, false)}&t=${Date.now()}`;
+    // 图片
+    document.getElementById('detail-image').src = ClothesAPI.getImageUrl(item.id, false, 1024, item.created_at);
     
     // 标题
     document.getElementById('detail-type').textContent = item.type || '未分类';
@@ -258,7 +260,9 @@ function toggleTransparent() {
     useTransparentImage = !useTransparentImage;
     document.getElementById('detail-image').src = ClothesAPI.getImageUrl(
         currentClothingItem.id, 
-        useTransparentImage
+        useTransparentImage,
+        1024,
+        currentClothingItem.created_at
     );
 }
 
@@ -478,7 +482,7 @@ function renderRecentList(items) {
     
     listContainer.innerHTML = items.map(item => `
         <div class="recent-item" onclick="showDetail(${item.id})">
-            <img src="${ClothesAPI.getImageUrl(item.id, false)}&t=${Date.now()}" alt="${item.type}">
+            <img src="${ClothesAPI.getImageUrl(item.id, false, 256, item.created_at)}" alt="${item.type}">
             <div class="recent-item-info">
                 <div class="recent-item-type">${item.type || '未分类'}</div>
                 <div class="recent-item-date">${item.last_worn_date ? formatDate(item.last_worn_date) : ''}</div>
@@ -929,6 +933,37 @@ async function confirmAndSave() {
     }
 }
 
+// 等待批量任务中某张图片分类完成
+async function waitForBatchItem(index) {
+    while (true) {
+        const response = await ClothesAPI.getUploadBatch(batchUploadJobId);
+        const job = response.data;
+        const item = job.items[index];
+        if (item.status !== 'pending') {
+            return item;
+        }
+        showToast(`AI分类中 ${job.completed + job.failed}/${job.total}...`, 'info');
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
+// 显示批量任务中某张图片的确认弹窗
+async function showBatchItem(index) {
+    try {
+        const item = await waitForBatchItem(index);
+        if (item.status === 'failed') {
+            showToast(`第 ${index + 1} 张图片处理失败: ${item.error}`, 'error');
+            processNextFile();
+            return;
+        }
+        const imageUrl = URL.createObjectURL(pendingFiles[index]);
+        openConfirmModal(item.data, imageUrl);
+    } catch (error) {
+        showToast(`第 ${index + 1} 张图片处理失败: ${error.message}`, 'error');
+        processNextFile();
+    }
+}
+
 // 处理下一个文件
 async function processNextFile() {
     currentUploadIndex++;
@@ -936,12 +971,19 @@ async function processNextFile() {
     if (currentUploadIndex >= pendingFiles.length) {
         // 所有文件处理完成
         pendingFiles = [];
+        batchUploadJobId = null;
         document.getElementById('upload-preview').style.display = 'none';
         currentUploadIndex = 0;
         showPage('wardrobe');
         return;
     }
     
+    // 批量上传时分类已在后台进行，直接取结果
+    if (batchUploadJobId) {
+        showBatchItem(currentUploadIndex);
+        return;
+    }
+    
     // 处理下一个文件
     const file = pendingFiles[currentUploadIndex];
     const autoClassify = document.getElementById('auto-classify').checked;
@@ -976,10 +1018,30 @@ async function uploadFiles() {
     
     // 重置索引
     currentUploadIndex = 0;
+    batchUploadJobId = null;
+    
+    const autoClassify = document.getElementById('auto-classify').checked;
+    
+    // 多张图片一次性上传，后台并发分类，逐张确认
+    if (pendingFiles.length > 1) {
+        try {
+            showToast(`正在上传 ${pendingFiles.length} 张图片...`, 'info');
+            const response = await ClothesAPI.uploadBatch(pendingFiles, autoClassify);
+            batchUploadJobId = response.data.job_id;
+            showBatchItem(0);
+        } catch (error) {
+            showToast('上传失败: ' + error.message, 'error');
+        } finally {
+            if (uploadBtn) {
+                uploadBtn.disabled = false;
+                uploadBtn.innerHTML = '<i class="fas fa-cloud-upload-alt"></i> 开始上传';
+            }
+        }
+        return;
+    }
     
     // 开始处理第一个文件
     const file = pendingFiles[0];
-    const autoClassify = document.getElementById('auto-classify').checked;
     
     try {
         showToast('正在处理图片...', 'info');
@@ -1067,7 +1129,7 @@ async function loadOutfitBaseItems() {
         grid.innerHTML = items.map(item => `
             <div class="outfit-base-item ${selectedBaseItem?.id === item.id ? 'selected' : ''}" 
                  onclick="selectBaseItem(${item.id})" data-id="${item.id}">
-                <img src="${ClothesAPI.getImageUrl(item.id, false)}&t=${Date.now()}" alt="${item.type}">
+                <img src="${ClothesAPI.getImageUrl(item.id, false, 256, item.created_at)}" alt="${item.type}">
                 <div class="item-label">${item.type || '未分类'}</div>
                 ${selectedBaseItem?.id === item.id ? '<div class="selected-badge"><i class="fas fa-check"></i></div>' : ''}
             </div>
@@ -1140,7 +1202,7 @@ function renderOutfitRecommendation(data) {
     // 基础单品显示
     html += `
         <div class="outfit-base-display">
-            <img src="${ClothesAPI.getImageUrl(baseItem.id, false)}&t=${Date.now()}" alt="${baseItem.type}">
+            <img src="${ClothesAPI.getImageUrl(baseItem.id, false, 512, baseItem.created_at)}" alt="${baseItem.type}">
             <div class="base-label">${baseItem.type || '未分类'}</div>
             <div class="base-meta">${baseItem.color || ''} ${baseItem.style?.join('、') || ''}</div>
         </div>
@@ -1168,7 +1230,7 @@ function renderOutfitRecommendation(data) {
                     <div class="match-items">
                         ${items.map(item => `
                             <div class="match-item" onclick="showDetail(${item.id})">
-                                <img src="${ClothesAPI.getImageUrl(item.id, false)}&t=${Date.now()}" alt="${item.type}">
+                                <img src="${ClothesAPI.getImageUrl(item.id, false, 256, item.created_at)}" alt="${item.type}">
                                 <div class="match-item-name">${item.type || '未分类'}</div>
                             </div>
                         `).join('')}
@@ -1272,7 +1334,7 @@ function renderOccasionOutfits(outfits, occasion) {
                 <div class="combination-items">
                     ${outfit.items.map(item => `
                         <div class="combination-item" onclick="showDetail(${item.id})">
-                            <img src="${ClothesAPI.getImageUrl(item.id, false)}&t=${Date.now()}" alt="${item.type}">
+                            <img src="${ClothesAPI.getImageUrl(item.id, false, 256, item.created_at)}" alt="${item.type}">
                             <div class="combination-item-name">${item.type || '未分类'}</div>
                         </div>
                     `).join('')}
@@ -2,6 +2,7 @@
 """
 衣柜管理系统 - 主应用入口
 """
+import asyncio
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -9,8 +10,12 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
 
-from backend.models import init_db
-from backend.api import clothes_router
+from backend.models import init_db, dispose_async_engines
+from backend.api import clothes_router, outfits_router
+from backend.services import (
+    classifier_service, upload_job_manager, background_removal, wear_buffer, compat_graph,
+    start_async_workers, shutdown_async_workers
+)
 from backend.config import API_HOST, API_PORT, DEBUG, TRANSPARENT_DIR, IMAGES_DIR
 
 # 前端目录
@@ -24,8 +29,17 @@ async def lifespan(app: FastAPI):
     print("🚀 正在初始化数据库...")
     init_db()
     print("✅ 数据库初始化完成")
+    start_async_workers()
     yield
     # 关闭时的清理工作
+    await upload_job_manager.shutdown()
+    await asyncio.to_thread(shutdown_async_workers)
+    await asyncio.to_thread(compat_graph.shutdown)
+    await asyncio.to_thread(wear_buffer.shutdown)
+    await asyncio.to_thread(background_removal.shutdown)
+    await classifier_service.aclose()
+    classifier_service.close()
+    await dispose_async_engines()
     print("👋 应用关闭")
 
 
@@ -48,6 +62,7 @@ app.add_middleware(
 
 # 注册API路由
 app.include_router(clothes_router, prefix="/api/v1")
+app.include_router(outfits_router, prefix="/api/v1")
 
 
 # ==================== 前端静态文件服务 ====================
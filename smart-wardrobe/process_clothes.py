@@ -5,83 +5,33 @@
 """
 
 import os
-import base64
 import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import closing
 from pathlib import Path
 from PIL import Image
-from rembg import remove
-import requests
+from rembg import remove, new_session
+
+from backend.services.classifier_service import ClassifierService
+from backend.services.background_removal import save_transparent_webp
 
 # 配置
 PHOTO_DIR = Path("photo")
 OUTPUT_DIR = Path("output")
 TRANSPARENT_DIR = OUTPUT_DIR / "transparent"
+MANIFEST_PATH = OUTPUT_DIR / "manifest.ndjson"  # 逐条追加的处理结果，用于断点续跑
+RESULTS_PATH = OUTPUT_DIR / "classification_results.json"
 
-# 阿里云通义千问API配置
-DASHSCOPE_API_KEY = "sk-475537d9b1634c5487b87e81b9d44230"
-DASHSCOPE_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
-
-# 确保输出目录存在
-OUTPUT_DIR.mkdir(exist_ok=True)
-TRANSPARENT_DIR.mkdir(exist_ok=True)
-
-def remove_background(input_path, output_path):
-    """使用rembg去除图片背景 (U²-Net模型)"""
-    print(f"  正在处理: {input_path.name}")
-    
-    # 打开图片
-    with open(input_path, 'rb') as f:
-        input_image = f.read()
-    
-    # 去除背景
-    output_image = remove(input_image)
-    
-    # 保存结果
-    with open(output_path, 'wb') as f:
-        f.write(output_image)
-    
-    print(f"  ✓ 已保存透明背景图片: {output_path}")
-    return output_path
+# 并发配置
+REMBG_WORKERS = int(os.getenv("REMBG_WORKERS", str(os.cpu_count() or 1)))  # 背景透明化进程数
+REMBG_THREADS = int(os.getenv("REMBG_THREADS", "1"))  # 每个透明化进程的推理线程数，进程数×线程数不宜超过CPU核数
+CLASSIFY_WORKERS = int(os.getenv("CLASSIFY_WORKERS", "4"))  # AI分类线程数
 
-def encode_image_to_base64(image_path):
-    """将图片转换为base64编码"""
-    with open(image_path, 'rb') as f:
-        return base64.b64encode(f.read()).decode('utf-8')
+# 通义千问识别提示词（比后端的更侧重穿搭推荐）
+SYSTEM_PROMPT = "你是一个专业的服装识别与穿搭顾问专家。请分析图片中的服装，提供详细的分类信息以及穿搭搭配建议，以便后续根据场景、天气、风格等为用户推荐每日搭配方案。"
 
-def classify_with_qwen(image_path):
-    """
-    使用阿里云通义千问(qwen-vl)进行图像识别和分类
-    """
-    print(f"  正在调用通义千问API进行AI分类...")
-    
-    # 将图片转换为base64
-    base64_image = encode_image_to_base64(image_path)
-    
-    # 构建API请求
-    headers = {
-        "Authorization": f"Bearer {DASHSCOPE_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "model": "qwen-vl-max",
-        "messages": [
-            {
-                "role": "system",
-                "content": "你是一个专业的服装识别与穿搭顾问专家。请分析图片中的服装，提供详细的分类信息以及穿搭搭配建议，以便后续根据场景、天气、风格等为用户推荐每日搭配方案。"
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": """请详细分析这张服装图片，并按以下JSON格式返回结果（用于智能穿搭推荐系统）：
+USER_PROMPT = """请详细分析这张服装图片，并按以下JSON格式返回结果（用于智能穿搭推荐系统）：
 {
     "category": "服装类别（如：上衣、裤子、裙子、外套、鞋子、配饰等）",
     "type": "具体类型（如：T恤、牛仔裤、连衣裙、运动鞋等）",
@@ -106,48 +56,62 @@ def classify_with_qwen(image_path):
     "confidence": "识别置信度（high/medium/low）"
 }
 请只返回JSON格式的结果，不要有其他文字说明。"""
-                    }
-                ]
-            }
-        ]
-    }
+
+# 进程池中每个进程持有一个rembg会话，模型只加载一次
+_rembg_session = None
+
+# 确保输出目录存在
+OUTPUT_DIR.mkdir(exist_ok=True)
+TRANSPARENT_DIR.mkdir(exist_ok=True)
+
+def init_rembg_worker():
+    """
+    进程池初始化：为当前进程加载U²-Net模型
+    onnxruntime 默认每个会话使用全部核心，多个进程同时推理会严重超额占用CPU；
+    rembg 创建会话时按 OMP_NUM_THREADS 设置推理线程数
+    """
+    global _rembg_session
+    os.environ["OMP_NUM_THREADS"] = str(max(1, REMBG_THREADS))
+    _rembg_session = new_session()
+
+def remove_background(input_path, output_path):
+    """使用rembg去除图片背景 (U²-Net模型)"""
+    print(f"  正在处理: {input_path.name}")
+    
+    # 打开图片
+    with open(input_path, 'rb') as f:
+        input_image = f.read()
+    
+    # 去除背景（未初始化会话时由rembg临时创建）
+    output_image = remove(input_image, session=_rembg_session)
+    
+    # 裁剪到不透明区域，保存为带透明通道的WebP
+    save_transparent_webp(output_image, output_path)
+    
+    print(f"  ✓ 已保存透明背景图片: {output_path}")
+    return output_path
+
+def create_classifier(max_concurrency=CLASSIFY_WORKERS):
+    """创建复用长连接的同步分类客户端（API密钥和模型取自 backend.config），用完需 close()"""
+    return ClassifierService(system_prompt=SYSTEM_PROMPT, user_prompt=USER_PROMPT,
+                             max_concurrency=max_concurrency)
+
+def classify_with_qwen(classifier, image_path):
+    """
+    使用阿里云通义千问(qwen-vl)进行图像识别和分类
+    """
+    print(f"  正在调用通义千问API进行AI分类: {image_path.name}")
     
     try:
-        response = requests.post(
-            f"{DASHSCOPE_BASE_URL}/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        response.raise_for_status()
-        
-        result = response.json()
-        content = result["choices"][0]["message"]["content"]
+        classification = classifier.request_classification(str(image_path))
+        if classification.get("confidence") == "low" and classification.get("category") == "unknown":
+            print(f"  ⚠ 无法解析JSON，返回原始结果: {image_path.name}")
+        else:
+            print(f"  ✓ AI分类成功: {image_path.name}")
+        return classification
         
-        # 尝试解析JSON响应
-        try:
-            # 清理可能的markdown代码块标记
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-            
-            classification = json.loads(content)
-            print(f"  ✓ AI分类成功")
-            return classification
-            
-        except json.JSONDecodeError:
-            # 如果无法解析JSON，返回原始文本
-            print(f"  ⚠ 无法解析JSON，返回原始结果")
-            return {
-                "category": "unknown",
-                "type": "clothing",
-                "description": content,
-                "confidence": "low"
-            }
-            
     except Exception as e:
-        print(f"  ✗ API调用失败: {e}")
+        print(f"  ✗ API调用失败: {image_path.name}: {e}")
         # 失败时回退到基于文件名的分类
         return classify_by_filename(image_path)
 
@@ -190,84 +154,158 @@ def classify_by_filename(image_path):
         "note": "Fallback classification (API failed)"
     }
 
-def process_all_images():
-    """处理所有图片"""
+def print_classification(classification):
+    """显示分类结果"""
+    print(f"\n  ✓ 分类结果: {classification.get('filename', '')}")
+    print(f"    📁 类别: {classification.get('category', 'N/A')}")
+    print(f"    👔 类型: {classification.get('type', 'N/A')}")
+    print(f"    🎨 颜色: {classification.get('color', 'N/A')} ({classification.get('color_tone', 'N/A')})")
+    print(f"    ✨ 风格: {classification.get('style', 'N/A')}")
+    print(f"    🧵 材质: {classification.get('material', 'N/A')} / {classification.get('thickness', 'N/A')}")
+    if classification.get('features'):
+        print(f"    📝 特征: {', '.join(classification['features'])}")
+    if classification.get('season'):
+        print(f"    🌸 适合季节: {', '.join(classification['season'])}")
+    if classification.get('suitable_weather'):
+        print(f"    🌤 适合天气: {', '.join(classification['suitable_weather'])}")
+    if classification.get('suitable_occasions'):
+        print(f"    🏷 适合场合: {', '.join(classification['suitable_occasions'])}")
+    if classification.get('outfit_tags'):
+        print(f"    🔖 穿搭标签: {', '.join(classification['outfit_tags'])}")
+    if classification.get('matching_tops'):
+        print(f"    👕 搭配上衣: {', '.join(classification['matching_tops'])}")
+    if classification.get('matching_bottoms'):
+        print(f"    👖 搭配下装: {', '.join(classification['matching_bottoms'])}")
+    if classification.get('matching_shoes'):
+        print(f"    👟 搭配鞋子: {', '.join(classification['matching_shoes'])}")
+    if classification.get('matching_accessories'):
+        print(f"    👜 搭配配饰: {', '.join(classification['matching_accessories'])}")
+    if classification.get('matching_colors'):
+        print(f"    🎨 推荐配色: {', '.join(classification['matching_colors'])}")
+    if classification.get('body_type_tips'):
+        print(f"    💃 身材建议: {classification['body_type_tips']}")
+    print(f"    📊 置信度: {classification.get('confidence', 'N/A')}")
+    if classification.get('description'):
+        print(f"    💬 描述: {classification['description']}")
+
+def load_manifest():
+    """读取已处理的结果清单（按文件名索引，忽略崩溃时写了一半的行）"""
+    records = {}
+    if not MANIFEST_PATH.exists():
+        return records
+    with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("filename"):
+                records[record["filename"]] = record
+    return records
+
+def process_all_images(rembg_workers=REMBG_WORKERS, classify_workers=CLASSIFY_WORKERS, resume=True):
+    """
+    处理所有图片
+    背景透明化在进程池中执行，AI分类在线程池中执行，两者并行；
+    每张图片两步都完成后立即追加到清单，重新运行时跳过清单中已有的图片
+    """
     # 获取所有图片文件
     image_extensions = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
-    image_files = [f for f in PHOTO_DIR.iterdir() 
-                   if f.is_file() and f.suffix.lower() in image_extensions]
+    image_files = sorted(f for f in PHOTO_DIR.iterdir()
+                         if f.is_file() and f.suffix.lower() in image_extensions)
     
     if not image_files:
         print("没有找到图片文件！")
         return
     
-    print(f"找到 {len(image_files)} 张图片")
+    if not resume and MANIFEST_PATH.exists():
+        MANIFEST_PATH.unlink()
+    done = load_manifest()
+    todo = [f for f in image_files
+            if f.name not in done or not Path(done[f.name].get("transparent_path", "")).exists()]
+    
+    print(f"找到 {len(image_files)} 张图片，已处理 {len(image_files) - len(todo)} 张，待处理 {len(todo)} 张")
     print(f"使用模型: 通义千问 (qwen-vl-max)")
+    print(f"并发: 背景透明化 {rembg_workers} 进程×{REMBG_THREADS} 线程 / AI分类 {classify_workers} 线程")
     print("=" * 60)
     
-    results = []
+    # 本次运行中分类失败回退的结果不写入清单，下次运行会重试
+    fallback_results = {}
+    failed = []
     
-    for image_file in image_files:
-        print(f"\n处理图片: {image_file.name}")
-        print("-" * 60)
-        
-        # 1. 背景透明化 (U²-Net模型)
-        transparent_path = TRANSPARENT_DIR / f"{image_file.stem}_transparent.png"
-        remove_background(image_file, transparent_path)
-        
-        # 2. AI分类 (通义千问)
-        classification = classify_with_qwen(image_file)
-        classification["filename"] = image_file.name
-        classification["transparent_path"] = str(transparent_path)
-        results.append(classification)
-        
-        # 显示分类结果
-        print(f"\n  ✓ 分类结果:")
-        print(f"    📁 类别: {classification.get('category', 'N/A')}")
-        print(f"    👔 类型: {classification.get('type', 'N/A')}")
-        print(f"    🎨 颜色: {classification.get('color', 'N/A')} ({classification.get('color_tone', 'N/A')})")
-        print(f"    ✨ 风格: {classification.get('style', 'N/A')}")
-        print(f"    🧵 材质: {classification.get('material', 'N/A')} / {classification.get('thickness', 'N/A')}")
-        if classification.get('features'):
-            print(f"    📝 特征: {', '.join(classification['features'])}")
-        if classification.get('season'):
-            print(f"    🌸 适合季节: {', '.join(classification['season'])}")
-        if classification.get('suitable_weather'):
-            print(f"    🌤 适合天气: {', '.join(classification['suitable_weather'])}")
-        if classification.get('suitable_occasions'):
-            print(f"    🏷 适合场合: {', '.join(classification['suitable_occasions'])}")
-        if classification.get('outfit_tags'):
-            print(f"    🔖 穿搭标签: {', '.join(classification['outfit_tags'])}")
-        if classification.get('matching_tops'):
-            print(f"    👕 搭配上衣: {', '.join(classification['matching_tops'])}")
-        if classification.get('matching_bottoms'):
-            print(f"    👖 搭配下装: {', '.join(classification['matching_bottoms'])}")
-        if classification.get('matching_shoes'):
-            print(f"    👟 搭配鞋子: {', '.join(classification['matching_shoes'])}")
-        if classification.get('matching_accessories'):
-            print(f"    👜 搭配配饰: {', '.join(classification['matching_accessories'])}")
-        if classification.get('matching_colors'):
-            print(f"    🎨 推荐配色: {', '.join(classification['matching_colors'])}")
-        if classification.get('body_type_tips'):
-            print(f"    💃 身材建议: {classification['body_type_tips']}")
-        print(f"    📊 置信度: {classification.get('confidence', 'N/A')}")
-        if classification.get('description'):
-            print(f"    💬 描述: {classification['description']}")
+    if todo:
+        pending = {}  # 文件名 -> 已完成的部分结果
+        # 分类客户端的并发上限与分类线程数一致
+        with closing(create_classifier(classify_workers)) as classifier, \
+                ProcessPoolExecutor(max_workers=rembg_workers, initializer=init_rembg_worker) as processes, \
+                ThreadPoolExecutor(max_workers=classify_workers) as threads, \
+                open(MANIFEST_PATH, 'a', encoding='utf-8') as manifest:
+            futures = {}
+            # 1. 背景透明化 (U²-Net模型)
+            # 先提交进程任务，让子进程在分类线程启动前全部创建好
+            for image_file in todo:
+                transparent_path = TRANSPARENT_DIR / f"{image_file.stem}_transparent.webp"
+                futures[processes.submit(remove_background, image_file, transparent_path)] = (image_file, "transparent")
+            # 2. AI分类 (通义千问)
+            for image_file in todo:
+                futures[threads.submit(classify_with_qwen, classifier, image_file)] = (image_file, "classification")
+            
+            for future in as_completed(futures):
+                image_file, step = futures[future]
+                parts = pending.setdefault(image_file.name, {})
+                try:
+                    parts[step] = future.result()
+                except Exception as e:
+                    print(f"  ✗ 处理失败: {image_file.name} ({step}): {e}")
+                    parts[step] = None
+                    failed.append(image_file.name)
+                if len(parts) < 2:
+                    continue
+                
+                del pending[image_file.name]
+                if parts["transparent"] is None or parts["classification"] is None:
+                    continue
+                classification = parts["classification"]
+                classification["filename"] = image_file.name
+                classification["transparent_path"] = str(parts["transparent"])
+                print_classification(classification)
+                
+                if classification.get("note"):
+                    fallback_results[image_file.name] = classification
+                else:
+                    manifest.write(json.dumps(classification, ensure_ascii=False) + "\n")
+                    manifest.flush()
+                    done[image_file.name] = classification
     
-    # 保存分类结果到JSON文件
-    results_path = OUTPUT_DIR / "classification_results.json"
-    with open(results_path, 'w', encoding='utf-8') as f:
+    # 按图片顺序汇总清单和本次结果，保存分类结果到JSON文件
+    results = []
+    for image_file in image_files:
+        record = done.get(image_file.name) or fallback_results.get(image_file.name)
+        if record is not None:
+            results.append(record)
+    with open(RESULTS_PATH, 'w', encoding='utf-8') as f:
         json.dump(results, f, ensure_ascii=False, indent=2)
     
     print("\n" + "=" * 60)
-    print(f"✅ 处理完成！")
+    print(f"✅ 处理完成！共 {len(results)} 张")
+    if fallback_results:
+        print(f"   ⚠ {len(fallback_results)} 张分类失败使用了文件名回退，重新运行会重试")
+    if failed:
+        print(f"   ✗ {len(set(failed))} 张处理失败: {', '.join(sorted(set(failed)))}")
     print(f"   透明背景图片: {TRANSPARENT_DIR}")
-    print(f"   分类结果: {results_path}")
+    print(f"   处理清单: {MANIFEST_PATH}")
+    print(f"   分类结果: {RESULTS_PATH}")
     print("=" * 60)
     
     return results
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="衣服图片背景透明化处理和AI分类")
+    parser.add_argument("--rembg-workers", type=int, default=REMBG_WORKERS, help="背景透明化进程数")
+    parser.add_argument("--classify-workers", type=int, default=CLASSIFY_WORKERS, help="AI分类线程数")
+    parser.add_argument("--restart", action="store_true", help="忽略已有清单，全部重新处理")
+    args = parser.parse_args()
+    
     print("开始处理衣服照片...")
     print("=" * 60)
-    process_all_images()
+    process_all_images(args.rembg_workers, args.classify_workers, resume=not args.restart)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+索引检查脚本
+执行数据库迁移后，用 EXPLAIN QUERY PLAN 检查关键查询是否使用了预期的索引，
+有查询未命中索引时以非零状态退出
+"""
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.models import engine, init_db
+from backend.models.migrations import QUERY_PLAN_CHECKS, check_query_plans
+
+
+def main() -> int:
+    init_db()
+    problems = check_query_plans(engine)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        return 1
+    print(f"✅ {len(QUERY_PLAN_CHECKS)} 个关键查询均使用了预期索引")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
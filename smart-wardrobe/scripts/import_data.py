@@ -6,6 +6,7 @@
 import json
 import sys
 import os
+from collections import Counter
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -13,6 +14,10 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from pathlib import Path
 from backend.models import init_db, SessionLocal, ClothingItem
 from backend.config import PHOTO_DIR, TRANSPARENT_DIR
+from backend.models.search_index import reindex_items
+from backend.services.wardrobe_counters import wardrobe_counters
+from backend.services.wardrobe_snapshot import wardrobe_snapshot
+from backend.services.compat_graph import compat_graph
 
 
 def import_classification_results(json_path: str = "output/classification_results.json"):
@@ -38,6 +43,7 @@ def import_classification_results(json_path: str = "output/classification_result
     
     try:
         imported_count = 0
+        imported_items = []
         for item_data in results:
             # 检查是否已存在
             existing = db.query(ClothingItem).filter(
@@ -52,8 +58,12 @@ def import_classification_results(json_path: str = "output/classification_result
             filename = item_data.get("filename", "")
             original_path = str(PHOTO_DIR / filename) if filename else None
             
-            transparent_filename = filename.rsplit('.', 1)[0] + "_transparent.png" if filename else None
-            transparent_path = str(TRANSPARENT_DIR / transparent_filename) if transparent_filename else None
+            # 优先使用处理脚本记录的透明图路径，旧结果按PNG命名规则推断
+            transparent_path = item_data.get("transparent_path")
+            if transparent_path:
+                transparent_path = str(Path(__file__).parent.parent / transparent_path)
+            elif filename:
+                transparent_path = str(TRANSPARENT_DIR / (filename.rsplit('.', 1)[0] + "_transparent.png"))
             
             # 检查文件是否存在
             if original_path and not Path(original_path).exists():
@@ -88,14 +98,27 @@ def import_classification_results(json_path: str = "output/classification_result
                 description=item_data.get("description"),
                 confidence=item_data.get("confidence"),
             )
+            item.sync_tags()
             
             db.add(item)
+            wardrobe_counters.apply(db, Counter(), wardrobe_counters.contributions(item))
+            imported_items.append(item)
             imported_count += 1
             print(f"  ✓ 导入: {filename}")
         
+        # 写入检索词，与衣服记录一起提交
+        db.flush()
+        reindex_items(db, [item.id for item in imported_items])
+        
         # 提交事务
         db.commit()
         print(f"\n✅ 成功导入 {imported_count} 条记录")
+
+        # 导入的衣服直接写库，重建搭配关系图
+        if imported_count:
+            wardrobe_snapshot.load(db)
+            compat_graph.rebuild(db)
+            db.commit()
         
     except Exception as e:
         db.rollback()
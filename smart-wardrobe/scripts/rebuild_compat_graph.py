@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+搭配关系图重建脚本
+修改了搭配评分规则、调整了 COMPAT_GRAPH_TOP_N，或直接改过数据库之后，
+从衣服表整体重建 compat_edges
+"""
+import sys
+import os
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.models import init_db, SessionLocal
+from backend.services.compat_graph import compat_graph
+from backend.services.wardrobe_snapshot import wardrobe_snapshot
+
+
+def main() -> int:
+    init_db()
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        wardrobe_snapshot.load(db)
+        edges = compat_graph.rebuild(db)
+        db.commit()
+        print(f"✅ 已重建搭配关系图：{len(wardrobe_snapshot)} 件衣服，{edges} 条边，"
+              f"耗时 {time.perf_counter() - started:.1f} 秒")
+        return 0
+    except Exception as e:
+        db.rollback()
+        print(f"❌ 重建失败: {e}")
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+全文检索索引重建脚本
+检索词由应用在写入衣服时生成，用其他工具直接改过 clothing_items 的类型、描述、品牌、备注之后，
+从衣服表整体重建 clothing_search
+"""
+import sys
+import os
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.models import init_db, SessionLocal
+from backend.models.search_index import rebuild_search_index
+
+
+def main() -> int:
+    init_db()
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        indexed = rebuild_search_index(db)
+        db.commit()
+        print(f"✅ 已重建全文检索索引：{indexed} 件衣服，耗时 {time.perf_counter() - started:.1f} 秒")
+        return 0
+    except Exception as e:
+        db.rollback()
+        print(f"❌ 重建失败: {e}")
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
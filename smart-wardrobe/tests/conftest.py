@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+"""
+测试公共配置
+"""
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
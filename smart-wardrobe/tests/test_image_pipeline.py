@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+图片规范化测试
+"""
+import io
+
+import pytest
+from PIL import Image
+
+from backend.services.image_pipeline import draft_size, normalize_image
+
+_ORIENTATION = 0x0112
+
+
+def _jpeg(width: int, height: int, orientation: int = 1) -> bytes:
+    image = Image.new("RGB", (width, height), (120, 80, 40))
+    exif = Image.Exif()
+    if orientation != 1:
+        exif[_ORIENTATION] = orientation
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=80, exif=exif.tobytes())
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("orientation", [1, 6])
+def test_draft_reduces_4_3_photo(orientation):
+    """4:3 手机照片（4032x3024）按比例请求时 draft 解码缩小一半"""
+    image = Image.open(io.BytesIO(_jpeg(4032, 3024, orientation)))
+    image.draft("RGB", draft_size(4032, 3024, orientation, 1600))
+    assert image.size == (2016, 1512)
+
+
+def test_draft_size_keeps_stored_orientation():
+    assert draft_size(4032, 3024, 1, 1600) == (1600, 1200)
+    assert draft_size(4032, 3024, 6, 1600) == (1600, 1200)
+    assert draft_size(3024, 4032, 8, 1600) == (1200, 1600)
+
+
+@pytest.mark.parametrize("orientation, expected", [(1, (1600, 1200)), (6, (1200, 1600))])
+def test_normalize_large_jpeg(orientation, expected):
+    normalized = normalize_image(_jpeg(4032, 3024, orientation), max_edge=1600)
+    assert normalized.mime_type == "image/jpeg"
+    assert (normalized.width, normalized.height) == expected
+
+
+def test_decompression_bomb_is_value_error(monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    with pytest.raises(ValueError):
+        normalize_image(_jpeg(200, 200))
+
+
+def test_invalid_image_is_value_error():
+    with pytest.raises(ValueError):
+        normalize_image(b"not an image")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+搭配评分与搜索的等价性测试
+批量评分（OutfitScorer）与逐件参考实现（OutfitService._calculate_*）在随机衣服上逐个比较，
+分支限界搜索的前K套与穷举所有组合的结果比较
+"""
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+from backend.services.outfit_scoring import FeatureArrays
+from backend.services.outfit_service import OutfitService
+from backend.services.wardrobe_snapshot import ItemFeatures
+
+# 规则中的取值加上规则外的取值和空值，覆盖查不到规则的分支
+COLORS = list(OutfitService.COLOR_COMPATIBILITY) + ["unknown", "酒红", None]
+STYLES = list(OutfitService.STYLE_COMPATIBILITY) + ["小众", "学院"]
+SEASONS = ["春", "夏", "秋", "冬", "四季"]
+TYPES = ["T恤", "连衣裙", "半身裙", None]
+CATEGORIES = ("上衣", "裤子", "裙子", "鞋子", "外套", "包包", "配饰")
+
+service = OutfitService(None)
+
+
+def _item(rng: random.Random, item_id: int, category: str = "上衣") -> ItemFeatures:
+    return ItemFeatures(
+        item_id, category, rng.choice(TYPES), rng.choice(COLORS),
+        rng.sample(STYLES, rng.randint(0, 3)), rng.sample(SEASONS, rng.randint(0, 3)), []
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_match_scores_equal_reference(seed):
+    rng = random.Random(seed)
+    records = [_item(rng, i) for i in range(400)]
+    arrays = FeatureArrays.build(records)
+    for _ in range(40):
+        base = _item(rng, -1)
+        base_color = rng.choice(COLORS + ["火星色"])
+        base_season = rng.choice(SEASONS + [None, "雨季"])
+        scores = service.scorer.match_scores(arrays, base_color, base.style, base_season)
+        expected = [service._calculate_match_score(r, base_color, base.style, base_season) for r in records]
+        assert scores.tolist() == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_candidate_scores_are_transposed_match_scores(seed):
+    """关系图增量维护用的 candidate_scores 与 match_scores 逐位一致"""
+    rng = random.Random(seed)
+    bases = [_item(rng, i) for i in range(200)]
+    arrays = FeatureArrays.build(bases)
+    base_seasons = np.array([b.season_ids[0] if b.season_ids else -1 for b in bases], dtype=np.int64)
+    for candidate in (_item(rng, 1000 + i) for i in range(40)):
+        scores = service.scorer.candidate_scores(candidate, arrays, base_seasons)
+        expected = [
+            service.scorer.match_scores(FeatureArrays.build([candidate]), b.color, b.style,
+                                        b.season[0] if b.season else None)[0]
+            for b in bases
+        ]
+        assert scores.tolist() == expected
+
+
+@pytest.mark.parametrize("style_preference", [None, ["休闲", "学院", "不存在"]])
+def test_outfit_scores_equal_reference(style_preference):
+    rng = random.Random(11)
+    slots = [FeatureArrays.build([_item(rng, k * 100 + i) for i in range(60)]) for k in range(4)]
+    count = 3000
+    np_rng = np.random.default_rng(11)
+    # 后两个位置可以为空（-1）
+    index = [np_rng.integers(-1 if k >= 2 else 0, 60, count) for k in range(4)]
+    scores = service.scorer.outfit_scores(list(zip(slots, index)), style_preference)
+    for row in range(count):
+        items = [slots[k].records[index[k][row]] for k in range(4) if index[k][row] >= 0]
+        assert scores[row] == service._calculate_outfit_score(items, style_preference)
+
+
+def _brute_force(wardrobe, style_preference, limit):
+    """按 _create_outfit_combinations 的模板穷举所有组合，返回前K名的分数"""
+    dresses = [item for item in wardrobe["裙子"] if item.type and "连衣裙" in item.type]
+    half_skirts = [item for item in wardrobe["裙子"] if item not in dresses]
+    shoes = wardrobe["鞋子"]
+    layers = [[None] + wardrobe[category] for category in ("外套", "包包", "配饰")]
+    required_shoes = [shoes] if shoes else []
+    templates = [
+        [wardrobe["上衣"], wardrobe["裤子"]] + required_shoes + layers,
+        [wardrobe["上衣"], half_skirts] + required_shoes + layers,
+        [dresses, [None] + shoes] + layers,
+    ]
+    scores = []
+    for slots in templates:
+        for combo in itertools.product(*slots):
+            score = service._calculate_outfit_score([item for item in combo if item is not None],
+                                                    style_preference)
+            if score >= 0.3:
+                scores.append(score)
+    return sorted(scores, reverse=True)[:limit]
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_outfit_search_matches_brute_force(seed):
+    rng = random.Random(seed)
+    wardrobe = {
+        category: [_item(rng, seed * 1000 + k * 100 + i, category) for i in range(rng.randint(0, 4))]
+        for k, category in enumerate(CATEGORIES)
+    }
+    style_preference = rng.choice([None, ["休闲"], ["正式", "优雅"]])
+    limit = rng.randint(1, 5)
+
+    items_by_category = {category: FeatureArrays.build(items) for category, items in wardrobe.items()}
+    outfits = service._create_outfit_combinations(items_by_category, style_preference, limit)
+
+    assert [outfit["score"] for outfit in outfits] == _brute_force(wardrobe, style_preference, limit)
+    for outfit in outfits:
+        assert service._calculate_outfit_score(outfit["items"], style_preference) == outfit["score"]
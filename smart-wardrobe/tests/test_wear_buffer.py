@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+穿着记录写缓冲测试
+每个测试使用临时目录中的独立数据库，不影响 data/wardrobe.db
+"""
+import importlib
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.models import Base, ClothingItem
+from backend.services.wear_buffer import WearBuffer
+
+# backend.services 导出的 wear_buffer 是单例，这里取模块本身
+wear_buffer_module = importlib.import_module("backend.services.wear_buffer")
+
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'wardrobe.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(wear_buffer_module, "SessionLocal", factory)
+    monkeypatch.setattr(wear_buffer_module, "ReadSessionLocal", factory)
+    yield factory
+    engine.dispose()
+
+
+def _add_item(factory, **fields) -> int:
+    with factory() as db:
+        item = ClothingItem(filename="a.jpg", category="上衣", **fields)
+        db.add(item)
+        db.commit()
+        return item.id
+
+
+def _stored(factory, item_id: int):
+    with factory() as db:
+        item = db.get(ClothingItem, item_id)
+        return item.wear_count, item.last_worn_date
+
+
+def test_taps_coalesce_into_one_update(sessions):
+    item_id = _add_item(sessions, wear_count=2)
+    buffer = WearBuffer(flush_interval=60, max_events=100)
+    try:
+        counts = [buffer.record(item_id)[0] for _ in range(3)]
+        assert counts == [3, 4, 5]
+        # 缓冲中只有一条记录，写库前数据库不变
+        assert _stored(sessions, item_id)[0] == 2
+        assert buffer.flush() == 1
+        assert _stored(sessions, item_id)[0] == 5
+        # 写库后返回的次数仍然连续
+        assert buffer.record(item_id)[0] == 6
+    finally:
+        buffer.shutdown()
+
+
+def test_unknown_item_is_not_buffered(sessions):
+    buffer = WearBuffer(flush_interval=60, max_events=100)
+    try:
+        assert buffer.record(12345) is None
+        assert buffer.flush() == 0
+    finally:
+        buffer.shutdown()
+
+
+def test_shutdown_flushes_pending_taps(sessions):
+    item_id = _add_item(sessions)
+    buffer = WearBuffer(flush_interval=60, max_events=100)
+    buffer.record(item_id)
+    buffer.record(item_id)
+    buffer.shutdown()
+    assert _stored(sessions, item_id)[0] == 2
+    assert buffer._thread is None
+
+
+def test_flush_keeps_later_last_worn_date(sessions):
+    """补记的穿搭已写入更晚的日期时，缓冲写库不会让日期倒退"""
+    later = datetime.now() + timedelta(days=3)
+    item_id = _add_item(sessions, last_worn_date=later)
+    buffer = WearBuffer(flush_interval=60, max_events=100)
+    buffer.record(item_id)
+    buffer.shutdown()
+    assert _stored(sessions, item_id) == (1, later)
+
+
+def test_counts_stay_consistent_while_flushing(sessions):
+    """并发记录的同时频繁写库，返回的次数既不重复也不缺失"""
+    item_id = _add_item(sessions)
+    buffer = WearBuffer(flush_interval=0.01, max_events=3)
+    counts = []
+    lock = threading.Lock()
+
+    def tap():
+        for _ in range(50):
+            count, _ = buffer.record(item_id)
+            with lock:
+                counts.append(count)
+
+    threads = [threading.Thread(target=tap) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    buffer.shutdown()
+    assert sorted(counts) == list(range(1, 401))
+    assert _stored(sessions, item_id)[0] == 400